@@ -1,8 +1,14 @@
 #!/usr/bin/python
 
 from optparse import OptionParser
+import itertools
+import json
+import multiprocessing
+import os
 import re
+import string
 import sys
+import tempfile
 
 import pystache
 
@@ -13,47 +19,657 @@ ESCAPE_SEQUENCE = {
         '\t': '\\t'
         }
 
+GLSL_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+) |
+    (?P<comment>//[^\n]*|/\*.*?\*/) |
+    (?P<directive>\#[^\n]*) |
+    (?P<number>(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?|\d+[eE][+-]?\d+|
+               0[xX][0-9A-Fa-f]+|\d+) |
+    (?P<name>[A-Za-z_]\w*) |
+    (?P<op><<=|>>=|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||\^\^|[-+*/%&|^]=|.)
+''', re.DOTALL | re.VERBOSE)
+
+GLSL_TYPES = frozenset('''
+    bool bvec2 bvec3 bvec4 float int ivec2 ivec3 ivec4 mat2 mat3 mat4
+    sampler2D samplerCube vec2 vec3 vec4 void
+'''.split())
+
+# Keywords, including the reserved ones, which can be neither declared nor
+# used as short names
+GLSL_KEYWORDS = GLSL_TYPES | frozenset('''
+    attribute break const continue discard do else false for highp if in
+    inout invariant lowp mediump out precision return struct true uniform
+    varying while
+    asm cast class default double dvec2 dvec3 dvec4 enum extern external
+    fixed flat fvec2 fvec3 fvec4 goto half hvec2 hvec3 hvec4 inline input
+    interface long namespace noinline output packed public sampler1D
+    sampler1DShadow sampler2DRect sampler2DRectShadow sampler2DShadow
+    sampler3D sampler3DRect short sizeof static superp switch template this
+    typedef union unsigned using volatile
+'''.split())
+
+# Built-in functions, which are never renamed even if a shader overloads them
+GLSL_BUILTINS = frozenset('''
+    abs acos all any asin atan ceil clamp cos cross dFdx dFdy degrees
+    distance dot equal exp exp2 faceforward floor fract fwidth greaterThan
+    greaterThanEqual inversesqrt length lessThan lessThanEqual log log2
+    matrixCompMult max min mix mod normalize not notEqual pow radians reflect
+    refract sign sin smoothstep sqrt step tan texture2D texture2DLod
+    texture2DProj texture2DProjLod textureCube textureCubeLod
+'''.split())
+
+GLSL_ASSIGNMENTS = frozenset('''
+    = += -= *= /= %= <<= >>= &= |= ^= ++ --
+'''.split())
+
+# Operators that cost an ALU instruction each, counting a vector operation
+# as one instruction
+GLSL_ALU_OPERATORS = frozenset('''
+    + - * / % < > <= >= == != ! && || ^^ += -= *= /= %= ++ --
+'''.split())
+
+# Estimated ALU instructions of the built-in functions, counting a vector
+# operation as one instruction; the functions that are not listed cost one
+GLSL_ALU_COSTS = {
+    'acos': 4, 'asin': 4, 'atan': 4, 'clamp': 2, 'cross': 2, 'distance': 3,
+    'faceforward': 2, 'length': 2, 'mix': 2, 'mod': 2, 'normalize': 3,
+    'pow': 3, 'reflect': 3, 'refract': 6, 'smoothstep': 4, 'tan': 2
+}
+
+# The costs that glsl_stats adds up over the functions that main calls
+GLSL_STATS_COSTS = ('alu', 'branches', 'loops', 'textureFetches')
+
+# Tokens that bind less tightly than + and - on either side of an additive
+# expression, so that the sum of two numbers between them can be folded
+GLSL_ADDITIVE_BOUNDARIES = frozenset('''
+    ( ) [ ] { } , ; ? : = += -= *= /= == != < > <= >= && || ^^ return
+'''.split())
+
+# The pairs of characters that would be read as one operator if the tokens
+# ending and starting with them were written without a space between them
+GLSL_OPERATOR_PREFIXES = frozenset('''
+    << >> <= >= == != && || ^^ ++ -- += -= *= /= %= &= |= ^= // /*
+'''.split())
+
 
 def js_escape(s):
     return ''.join(ESCAPE_SEQUENCE.get(c, c) for c in s)
 
 
-def glsl_compress(s, shortNames):
-    # strip leading whitespace
-    s = re.sub(r'\A\s+', '', s)
-    # strip trailing whitespace
-    s = re.sub(r'\s+\Z', '', s)
-    # strip multi-line comments
-    s = re.sub(r'/\*.*?\*/', '', s)
-    # strip single line comments
-    s = re.sub(r'//.*?\n', '', s)
-    # replace multiple whitespace with a single space
-    s = re.sub(r'\s+', ' ', s)
-    # remove whitespace between non-word tokens
-    s = re.sub(r'(\S)\s+([^\w])', r'\1\2', s)
-    s = re.sub(r'([^\w])\s+(\S)', r'\1\2', s)
-    # replace original names with short names
-    for originalName, shortName in shortNames.items():
-        s = s.replace(originalName, shortName)
-    return s
+def glsl_tokenize(s):
+    # split s into (kind, value) tuples, dropping whitespace and comments
+    tokens = []
+    pos = 0
+    while pos < len(s):
+        m = GLSL_TOKEN_RE.match(s, pos)
+        if m.lastgroup not in ('space', 'comment'):
+            tokens.append((m.lastgroup, m.group()))
+        pos = m.end()
+    return tokens
 
 
-def main(argv):
-    option_parser = OptionParser()
-    option_parser.add_option('--input')
-    option_parser.add_option('--output')
-    option_parser.add_option('--template')
-    options, args = option_parser.parse_args(argv[1:])
+def glsl_is_float(value):
+    return not value.lower().startswith('0x') and \
+        ('.' in value or 'e' in value.lower())
+
+
+def glsl_shorten_number(value):
+    # shorten a float literal without changing its value, e.g. 0.50 to .5
+    m = re.match(r'(\d*)\.(\d*)(.*)\Z', value)
+    if not m:
+        return value
+    integer, fraction = m.group(1).lstrip('0'), m.group(2).rstrip('0')
+    if not integer and not fraction:
+        integer = '0'
+    return integer + '.' + fraction + m.group(3)
+
+
+def glsl_number(value, is_float):
+    # return the tokens of the literal number value, or None if it has none
+    if is_float:
+        literal = repr(abs(value))
+        if 'inf' in literal or 'nan' in literal:
+            return None
+        if '.' not in literal and 'e' not in literal:
+            literal += '.'
+        literal = glsl_shorten_number(literal)
+    else:
+        literal = str(abs(value))
+    if value < 0:
+        return [('op', '-'), ('number', literal)]
+    return [('number', literal)]
+
+
+def glsl_names(tokens):
+    # return the indexes of the tokens that are identifiers, as opposed to
+    # keywords and the fields and swizzles selected with a dot
+    return [i for i, (kind, value) in enumerate(tokens)
+            if kind == 'name' and value not in GLSL_KEYWORDS
+            if i == 0 or tokens[i - 1][1] != '.']
+
+
+def glsl_counts(tokens):
+    # return how often each identifier is used in tokens, including the uses
+    # in directives, which can refer to anything
+    counts = {}
+    for i in glsl_names(tokens):
+        counts[tokens[i][1]] = counts.get(tokens[i][1], 0) + 1
+    for kind, value in tokens:
+        if kind == 'directive':
+            for name in re.findall(r'[A-Za-z_]\w*', value):
+                counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def glsl_match(tokens, i):
+    # return the index of the bracket closing the one at tokens[i]
+    depth = 0
+    for j in xrange(i, len(tokens)):
+        if tokens[j][1] in ('(', '[', '{'):
+            depth += 1
+        elif tokens[j][1] in (')', ']', '}'):
+            depth -= 1
+            if depth == 0:
+                return j
+    return len(tokens) - 1
+
+
+def glsl_structs(tokens):
+    # return the names of the structs in tokens, the names of the variables
+    # declared together with them, and the indexes of the tokens in their
+    # bodies, which declare fields
+    names, variables, fields = set(), set(), set()
+    for i, (kind, value) in enumerate(tokens):
+        if value != 'struct' or i in fields:
+            continue
+        j = i + 1
+        if tokens[j][0] == 'name':
+            names.add(tokens[j][1])
+            j += 1
+        end = glsl_match(tokens, j)
+        fields.update(xrange(j, end + 1))
+        for kind, value in tokens[end + 1:]:
+            if value == ';':
+                break
+            if kind == 'name':
+                variables.add(value)
+    return names, variables, fields
+
+
+def glsl_declarations(tokens):
+    # return the names of the functions, variables and parameters declared in
+    # tokens, in the order of their declarations
+    structs, declared, fields = glsl_structs(tokens)
+    types = GLSL_TYPES | structs
+    declared = list(declared)
+
+    def declare(i):
+        if tokens[i][0] != 'name' or tokens[i][1] in GLSL_KEYWORDS or \
+                tokens[i][1] in types:
+            return False
+        if tokens[i][1] not in declared:
+            declared.append(tokens[i][1])
+        return True
+
+    for i in xrange(len(tokens) - 1):
+        if i in fields or tokens[i][1] not in types or \
+                (i and tokens[i - 1][1] == '.') or not declare(i + 1):
+            continue
+        # further declarators in the same declaration, as in int a = 0, b;
+        depth = 0
+        for j in xrange(i + 2, len(tokens) - 2):
+            value = tokens[j][1]
+            if value in ('(', '['):
+                depth += 1
+            elif value in (')', ']'):
+                if depth == 0:
+                    break
+                depth -= 1
+            elif value in (';', '{', '}'):
+                break
+            elif value == ',' and depth == 0:
+                if tokens[j + 2][1] not in ('=', ',', ';', '[') or \
+                        not declare(j + 1):
+                    break
+    return declared
+
+
+def glsl_items(tokens):
+    # return the (start, end) indexes of the top level declarations,
+    # function definitions and directives in tokens
+    items = []
+    start, depth, struct = 0, 0, False
+    for i, (kind, value) in enumerate(tokens):
+        if value == 'struct':
+            struct = True
+        if kind == 'directive' and depth == 0:
+            items.append((i, i + 1))
+            start = i + 1
+        elif value == '{':
+            depth += 1
+        elif value == '}':
+            depth -= 1
+            if depth == 0 and not struct:
+                items.append((start, i + 1))
+                start = i + 1
+        elif value == ';' and depth == 0:
+            items.append((start, i + 1))
+            start, struct = i + 1, False
+    return items
+
+
+def glsl_function(tokens):
+    # return the name of the function that the top level item tokens defines
+    # or declares, or None if it is not a function
+    for i, (kind, value) in enumerate(tokens):
+        if value in ('=', '{', ';'):
+            return None
+        if value == '(':
+            if i >= 2 and tokens[i - 1][0] == 'name':
+                return tokens[i - 1][1]
+            return None
+    return None
+
+
+def glsl_fold_constants(tokens):
+    # evaluate the arithmetic on literal numbers and drop the parentheses
+    # around single numbers, for as long as anything changes
+    tokens = [(kind, glsl_shorten_number(value))
+              if kind == 'number' and glsl_is_float(value) else (kind, value)
+              for kind, value in tokens]
+    i = 0
+    while i + 2 < len(tokens):
+        previous = tokens[i - 1] if i else ('op', ';')
+        following = tokens[i + 3][1] if i + 3 < len(tokens) else ';'
+        (kind1, left), (kind2, op), (kind3, right) = tokens[i:i + 3]
+        if left == '(' and kind2 == 'number' and right == ')' and \
+                previous[0] not in ('name', 'number') and \
+                previous[1] not in (')', ']'):
+            tokens[i:i + 3] = [tokens[i + 1]]
+            i = max(i - 3, 0)
+            continue
+        if kind1 != 'number' or kind3 != 'number' or \
+                op not in ('+', '-', '*', '/'):
+            i += 1
+            continue
+        is_float = glsl_is_float(left)
+        if op in ('+', '-'):
+            # the neighbouring operators must not bind the numbers first
+            foldable = previous[1] in GLSL_ADDITIVE_BOUNDARIES and \
+                (following in GLSL_ADDITIVE_BOUNDARIES or
+                 following in ('+', '-'))
+        else:
+            foldable = previous[1] not in ('*', '/', '%')
+        if not foldable or is_float != glsl_is_float(right) or \
+                (not is_float and (op == '/' or
+                                   re.match(r'0\d|0[xX]', left) or
+                                   re.match(r'0\d|0[xX]', right))):
+            i += 1
+            continue
+        a, b = (float(left), float(right)) if is_float else \
+            (int(left), int(right))
+        if op == '/' and b == 0:
+            i += 1
+            continue
+        value = {'+': a + b, '-': a - b, '*': a * b,
+                 '/': a / b if b else None}[op]
+        folded = glsl_number(value, is_float)
+        if folded is None:
+            i += 1
+            continue
+        tokens[i:i + 3] = folded
+        i = max(i - 3, 0)
+    return tokens
+
+
+def glsl_inline_constants(tokens):
+    # replace the global constants that are initialized with a number by the
+    # number, where that makes the source shorter
+    names = glsl_names(tokens)
+    counts, declarations = glsl_counts(tokens), {}
+    for i in names:
+        if tokens[i - 1][1] in GLSL_TYPES:
+            declarations[tokens[i][1]] = declarations.get(tokens[i][1], 0) + 1
+    constants = {}
+    removed = set()
+    for start, end in glsl_items(tokens):
+        values = [value for kind, value in tokens[start:end]]
+        if values[0] != 'const' or values[1] in ('lowp', 'mediump') or \
+                len(values) not in (6, 7) or values[-3] != '=' or \
+                tokens[end - 2][0] != 'number':
+            continue
+        name, number = values[-4], values[-2]
+        # a local variable with the same name would hide the constant, and a
+        # directive could use it in any way
+        if declarations.get(name) != 1 or name in glsl_reserved(tokens):
+            continue
+        uses = counts.get(name, 0) - 1
+        if uses * len(number) <= len(''.join(values)) + uses:
+            constants[name] = number
+            removed.update(xrange(start, end))
+    for i in names:
+        if tokens[i][1] in constants and i not in removed:
+            tokens[i] = ('number', constants[tokens[i][1]])
+    return [token for i, token in enumerate(tokens) if i not in removed]
+
+
+def glsl_remove_dead_code(tokens):
+    # remove the functions that are never called, the constants and uniforms
+    # that are never used, and if statements and else branches without any
+    # code, for as long as anything changes
+    changed = True
+    while changed:
+        changed = False
+        counts = glsl_counts(tokens)
+        definitions = {}
+        items = glsl_items(tokens)
+        for start, end in items:
+            name = glsl_function(tokens[start:end])
+            if name is not None:
+                definitions[name] = definitions.get(name, 0) + 1
+        for start, end in reversed(items):
+            item = tokens[start:end]
+            name = glsl_function(item)
+            if name is not None and name != 'main' and \
+                    counts[name] == definitions[name]:
+                del tokens[start:end]
+                changed = True
+            elif name is None and item[0][1] in ('const', 'uniform') and \
+                    item[-1][1] == ';' and \
+                    ',' not in [value for kind, value in item]:
+                declared = glsl_declarations(item)
+                if len(declared) == 1 and counts[declared[0]] == 1:
+                    del tokens[start:end]
+                    changed = True
+        i = 0
+        while i < len(tokens):
+            if tokens[i][1] == 'else' and tokens[i + 1][1] == '{' and \
+                    tokens[i + 2][1] == '}':
+                del tokens[i:i + 3]
+                changed = True
+                continue
+            # an if statement can only be removed where it is a statement of
+            # its own, or together with the else that it is the branch of
+            if tokens[i][1] == 'if' and i and \
+                    tokens[i - 1][1] in (';', '{', '}', 'else'):
+                end = glsl_match(tokens, i + 1)
+                condition = tokens[i + 2:end]
+                if tokens[end + 1:end + 3] == [('op', '{'), ('op', '}')] and \
+                        (end + 3 >= len(tokens) or
+                         tokens[end + 3][1] != 'else') and \
+                        '(' not in [value for kind, value in condition] and \
+                        not any(value in GLSL_ASSIGNMENTS
+                                for kind, value in condition):
+                    start = i - 1 if tokens[i - 1][1] == 'else' else i
+                    del tokens[start:end + 3]
+                    changed = True
+                    i = start
+                    continue
+            i += 1
+    return tokens
+
+
+def glsl_remove_defaults(tokens):
+    # remove the in qualifiers of parameters and the void of empty
+    # parameter lists, which are the defaults
+    result = []
+    for i, token in enumerate(tokens):
+        if token[1] == 'in' and result and result[-1][1] in ('(', ','):
+            continue
+        if token[1] == 'void' and result and result[-1][1] == '(' and \
+                tokens[i + 1][1] == ')':
+            continue
+        result.append(token)
+    return result
+
+
+def glsl_reserved(tokens):
+    # return the names in tokens that must not be renamed or used as short
+    # names: the names used but not declared, and the names in directives
+    reserved = set(GLSL_KEYWORDS) | GLSL_BUILTINS | glsl_structs(tokens)[0]
+    declared = set(glsl_declarations(tokens))
+    for i in glsl_names(tokens):
+        if tokens[i][1] not in declared:
+            reserved.add(tokens[i][1])
+    for kind, value in tokens:
+        if kind == 'directive':
+            reserved.update(re.findall(r'[A-Za-z_]\w*', value))
+    return reserved
+
+
+def glsl_short_names(reserved):
+    # generate the names a, b, ..., Z, aa, ab, ... that are not reserved
+    first = string.ascii_letters
+    rest = string.ascii_letters + string.digits
+    for length in itertools.count(1):
+        for chars in itertools.product(first, *([rest] * (length - 1))):
+            name = ''.join(chars)
+            if name not in reserved:
+                yield name
 
+
+def glsl_join(tokens):
+    parts = []
+    previous = None
+    for kind, value in tokens:
+        if kind == 'directive':
+            parts.append('\n' + value + '\n')
+            previous = None
+            continue
+        if previous is not None and (
+                (re.search(r'\w\Z', previous[1]) or
+                 previous[0] == 'number') and
+                (re.match(r'\w', value) or kind == 'number') or
+                previous[1][-1] + value[0] in GLSL_OPERATOR_PREFIXES):
+            parts.append(' ')
+        parts.append(value)
+        previous = (kind, value)
+    return ''.join(parts).strip('\n')
+
+
+def glsl_optimize(tokens):
+    # fold constant expressions and remove dead code, leaving the code that
+    # the shader actually runs
+    tokens = glsl_fold_constants(tokens)
+    tokens = glsl_inline_constants(tokens)
+    tokens = glsl_fold_constants(tokens)
+    return glsl_remove_dead_code(tokens)
+
+
+def glsl_compress(tokens, shortNames, reserved):
+    # minify the tokens of one shader: fold constant expressions, remove
+    # dead code and rename everything that the shader declares itself, using
+    # shortNames for the attributes, uniforms and varyings that are shared
+    # with the other shader and with the JavaScript code
+    tokens = glsl_remove_defaults(glsl_optimize(tokens))
+    declared = [name for name in glsl_declarations(tokens)
+                if name not in reserved and name not in shortNames
+                if name != 'main']
+    counts = glsl_counts(tokens)
+    # the most used names get the shortest short names
+    declared.sort(key=lambda name: -counts.get(name, 0))
+    names = dict(shortNames)
+    generator = glsl_short_names(reserved | set(shortNames.values()))
+    for name in declared:
+        names[name] = next(generator)
+    fields = glsl_structs(tokens)[2]
+    for i in glsl_names(tokens):
+        if i not in fields and tokens[i][1] in names:
+            tokens[i] = ('name', names[tokens[i][1]])
+    return glsl_join(tokens)
+
+
+def glsl_interface(tokens):
+    # return the (qualifier, name) tuples of the attributes, uniforms and
+    # varyings declared in tokens
+    interface = []
+    for start, end in glsl_items(tokens):
+        item = tokens[start:end]
+        qualifiers = [value for kind, value in item
+                      if value in ('attribute', 'uniform', 'varying')]
+        if qualifiers:
+            for name in glsl_declarations(item):
+                interface.append((qualifiers[0], name))
+    return interface
+
+
+def glsl_stats(tokens):
+    # return the static cost of the optimized tokens of one shader: the
+    # texture fetches, branches, loops and estimated ALU instructions of
+    # main, with every call of a function counting the cost of its body, and
+    # the number of attributes, uniforms and varyings that it uses.  Both
+    # sides of each branch and the body of each loop are counted once.
+    counts = glsl_counts(tokens)
+    stats = {'attributes': 0, 'uniforms': 0, 'varyings': 0}
+    for qualifier, name in glsl_interface(tokens):
+        if counts.get(name, 0) > 1:
+            stats[qualifier + 's'] += 1
+    bodies = {}
+    for start, end in glsl_items(tokens):
+        name = glsl_function(tokens[start:end])
+        if name is not None and tokens[end - 1][1] == '}':
+            item = tokens[start:end]
+            bodies[name] = item[[value for kind, value in item].index('{'):]
+    types = GLSL_TYPES | glsl_structs(tokens)[0]
+    costs = {}
+
+    def cost(name):
+        if name in costs:
+            return costs[name]
+        body = bodies[name]
+        total = dict.fromkeys(GLSL_STATS_COSTS, 0)
+        for i, (kind, value) in enumerate(body):
+            if value in ('if', '?'):
+                total['branches'] += 1
+            elif value in ('for', 'while'):
+                total['loops'] += 1
+            elif value == 'do':
+                total['loops'] -= 1  # counted by its while
+            elif kind == 'op' and value in GLSL_ALU_OPERATORS:
+                # a unary minus or plus is a free modifier of its operand
+                if value not in ('+', '-') or \
+                        body[i - 1][0] in ('name', 'number') or \
+                        body[i - 1][1] in (')', ']'):
+                    total['alu'] += 1
+            elif kind == 'name' and i + 1 < len(body) and \
+                    body[i + 1][1] == '(' and body[i - 1][1] != '.':
+                if value in bodies:
+                    for key, count in cost(value).iteritems():
+                        total[key] += count
+                elif value.startswith('texture'):
+                    total['textureFetches'] += 1
+                elif value in GLSL_BUILTINS:
+                    total['alu'] += GLSL_ALU_COSTS.get(value, 1)
+                elif value not in types:
+                    raise ValueError('call of undefined function %s' % value)
+        costs[name] = total
+        return total
+
+    if 'main' in bodies:
+        stats.update(cost('main'))
+    else:
+        stats.update(dict.fromkeys(GLSL_STATS_COSTS, 0))
+    return stats
+
+
+def glsl_select_variant(s, flags, defined):
+    # return the lines of s in the branches of the #ifdef, #ifndef and #else
+    # directives on flags that are selected when the flags in defined are
+    # defined, without those directives
+    lines = []
+    # one entry for each open conditional: whether its current branch is
+    # kept, or None for a conditional that is not on a flag
+    stack = []
+    for line in s.splitlines(True):
+        m = re.match(r'\s*#\s*(\w+)\s*(\w*)', line)
+        directive, name = m.groups() if m else (None, None)
+        if directive in ('ifdef', 'ifndef') and name in flags:
+            stack.append((name in defined) == (directive == 'ifdef'))
+            continue
+        if directive in ('if', 'ifdef', 'ifndef'):
+            stack.append(None)
+        elif directive == 'elif' and stack and stack[-1] is not None:
+            raise ValueError('#elif after #ifdef %s is not supported' % name)
+        elif directive == 'else' and stack and stack[-1] is not None:
+            stack[-1] = not stack[-1]
+            continue
+        elif directive == 'endif' and stack and stack.pop() is not None:
+            continue
+        if all(branch is not False for branch in stack):
+            lines.append(line)
+    return ''.join(lines)
+
+
+def glsl_variants(s, flags):
+    # return, for each of the 2 ** len(flags) variants of the shader s, the
+    # index of its source, and for each different source the flags it
+    # depends on and its code.  Flag i is defined in the variants whose bit i
+    # is set.
+    used = [flag for flag in flags if re.search(r'\b%s\b' % flag, s)]
+    indexes, defines, sources = [], [], []
+    for variant in xrange(2 ** len(flags)):
+        defined = [flag for i, flag in enumerate(flags)
+                   if variant & (1 << i) and flag in used]
+        if defined not in defines:
+            defines.append(defined)
+            sources.append(glsl_select_variant(s, flags, defined))
+        indexes.append(defines.index(defined))
+    return indexes, defines, sources
+
+
+def glsl_list(values):
+    # return the context for a template section that writes values as the
+    # items of a JavaScript array
+    return [{'value': value, 'separator': ',' if i < len(values) - 1 else ''}
+            for i, value in enumerate(values)]
+
+
+def glsl_include(name, includePath, included):
+    # return the lines of the snippet name, found in the first directory of
+    # includePath that has it, with the snippets that it includes in turn.
+    # A snippet whose filename is already in included is left out, so each
+    # snippet is included only once.
+    for directory in includePath:
+        filename = os.path.normpath(os.path.join(directory, name))
+        if os.path.exists(filename):
+            break
+    else:
+        raise ValueError('cannot find snippet %s in %s' %
+                         (name, ', '.join(includePath)))
+    if filename in included:
+        return []
+    included.add(filename)
+    lines = []
+    for line in open(filename, 'rU'):
+        m = re.match(r'//!\s+INCLUDE\s+(\S+)\s*\Z', line)
+        if m:
+            lines.extend(glsl_include(m.group(1), includePath, included))
+        elif line.startswith('//!'):
+            raise ValueError('%s: unexpected directive %s' %
+                             (filename, line.strip()))
+        else:
+            lines.append(line)
+    return lines
+
+
+def unit(filename, includePath, stats):
+    # return the template context of the shader unit filename, or its
+    # static costs if stats is true.  Snippets are included from the
+    # directory of filename and then from the directories of includePath.
     context = {}
-    nextShortName = ord('a')
-    shortNames = {}
 
     common, vertex, fragment = [], [], []
-    attributes, uniforms, varyings = {}, {}, {}
+    flags = []
     block = None
-    for line in open(options.input, 'rU'):
+    includePath = [os.path.dirname(filename)] + includePath
+    included = set()
+    for line in open(filename, 'rU'):
         if line.startswith('//!'):
+            m = re.match(r'//!\s+INCLUDE\s+(\S+)\s*\Z', line)
+            if m:
+                assert block is not None
+                block.extend(glsl_include(m.group(1), includePath, included))
+                continue
             m = re.match(r'//!\s+NAMESPACE=(\S+)\s*\Z', line)
             if m:
                 context['namespace'] = m.group(1)
@@ -62,6 +678,10 @@ def main(argv):
             if m:
                 context['className'] = m.group(1)
                 continue
+            m = re.match(r'//!\s+VARIANT\s+(\w+)\s*\Z', line)
+            if m:
+                flags.append(m.group(1))
+                continue
             m = re.match(r'//!\s+COMMON\s*\Z', line)
             if m:
                 block = common
@@ -79,42 +699,156 @@ def main(argv):
                 assert line.rstrip() == ''
             else:
                 block.append(line)
-            m = re.match(r'attribute\s+\S+\s+(\S+);\s*\Z', line)
-            if m:
-                attribute = m.group(1)
-                if attribute not in attributes:
-                    shortName = chr(nextShortName)
-                    nextShortName += 1
-                    attributes[attribute] = {'originalName': attribute, 'shortName': shortName}
-                    shortNames[attribute] = shortName
-            m = re.match(r'uniform\s+\S+\s+(\S+);\s*\Z', line)
-            if m:
-                uniform = m.group(1)
-                if uniform not in uniforms:
-                    shortName = chr(nextShortName)
-                    nextShortName += 1
-                    uniforms[uniform] = {'originalName': uniform, 'shortName': shortName}
-                    shortNames[uniform] = shortName
-            m = re.match(r'varying\s+\S+\s+(\S+);\s*\Z', line)
-            if m:
-                varying = m.group(1)
-                if varying not in varyings:
-                    shortName = chr(nextShortName)
-                    nextShortName += 1
-                    shortNames[varying] = shortName
+
+    vertexTokens = glsl_tokenize(''.join(common + vertex))
+    fragmentTokens = glsl_tokenize(''.join(common + fragment))
+    reserved = glsl_reserved(vertexTokens) | glsl_reserved(fragmentTokens)
+
+    # the attributes, uniforms and varyings get the same short names in both
+    # shaders, in the order of their declarations
+    shortNames = {}
+    attributes, uniforms = {}, {}
+    generator = glsl_short_names(reserved)
+    interface = glsl_interface(glsl_tokenize(''.join(common)))
+    interface += glsl_interface(glsl_tokenize(''.join(vertex)))
+    interface += glsl_interface(glsl_tokenize(''.join(fragment)))
+    for qualifier, name in interface:
+        if name in shortNames:
+            continue
+        shortNames[name] = next(generator)
+        if qualifier == 'attribute':
+            attributes[name] = {'originalName': name,
+                                'shortName': shortNames[name]}
+        elif qualifier == 'uniform':
+            uniforms[name] = {'originalName': name,
+                              'shortName': shortNames[name]}
+
+    if stats:
+        costs = {}
+        for name, source in (('fragment', ''.join(common + fragment)),
+                             ('vertex', ''.join(common + vertex))):
+            indexes, defines, sources = glsl_variants(source, flags)
+            costs[name] = dict(
+                ('+'.join(defined) or 'default',
+                 glsl_stats(glsl_optimize(glsl_tokenize(variant))))
+                for defined, variant in zip(defines, sources))
+        return costs
 
     context['getOriginalFragmentSource'] = js_escape(''.join(common + fragment))
     context['getOriginalVertexSource'] = js_escape(''.join(common + vertex))
-    context['getFragmentSource'] = glsl_compress(''.join(common + fragment), shortNames)
-    context['getVertexSource'] = glsl_compress(''.join(common + vertex), shortNames)
+    if flags:
+        context['hasVariants'] = True
+        context['getVariants'] = glsl_list(['%s: %d' % (flag, 1 << i)
+                                            for i, flag in enumerate(flags)])
+        for name, source in (('Fragment', ''.join(common + fragment)),
+                             ('Vertex', ''.join(common + vertex))):
+            indexes, defines, sources = glsl_variants(source, flags)
+            context['get%sVariants' % (name,)] = ', '.join(map(str, indexes))
+            context['get%sDefines' % (name,)] = glsl_list([
+                js_escape(''.join('#define %s\n' % (flag,) for flag in defined))
+                for defined in defines])
+            context['get%sSources' % (name,)] = glsl_list([
+                js_escape(glsl_compress(glsl_tokenize(variant), shortNames,
+                                        reserved))
+                for variant in sources])
+    else:
+        context['getFragmentSource'] = js_escape(
+            glsl_compress(fragmentTokens, shortNames, reserved))
+        context['getVertexSource'] = js_escape(
+            glsl_compress(vertexTokens, shortNames, reserved))
     context['getAttributes'] = [attributes[a] for a in sorted(attributes.keys())]
     context['getUniforms'] = [uniforms[u] for u in sorted(uniforms.keys())]
+    return context
+
+
+def unit_star(args):
+    return unit(*args)
+
+
+def write_if_changed(filename, content):
+    # write content to filename, leaving the file and its modification time
+    # alone if it already has that content, and return whether it was written
+    if filename is None or filename == '-':
+        sys.stdout.write(content)
+        return True
+    try:
+        with open(filename, 'rb') as f:
+            if f.read() == content:
+                return False
+    except IOError:
+        pass
+    # write to a temporary file next to filename and rename it over filename,
+    # so that a build that is interrupted never leaves a truncated shader
+    dirname = os.path.dirname(filename) or '.'
+    fd, tmp = tempfile.mkstemp(dir=dirname,
+                               prefix='.%s.' % (os.path.basename(filename),))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        # mkstemp creates private files, give filename the usual permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp, 0666 & ~umask)
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp, filename)
+    except:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
 
-    if options.output and options.output != '-':
-        output = open(options.output, 'wb')
+def main(argv):
+    option_parser = OptionParser(
+        usage='%prog [--template FILE] --input FILE [--output FILE] ...')
+    option_parser.add_option('--input', action='append', default=[],
+                             help='shader unit to compile, can be given '
+                             'several times to compile many units in parallel')
+    option_parser.add_option('--output', action='append', default=[],
+                             help='output of the preceding --input, which is '
+                             'only rewritten if its contents change')
+    option_parser.add_option('--template')
+    option_parser.add_option('--include-path', action='append', default=[],
+                             metavar='DIR',
+                             help='directory to search for the snippets of '
+                             '//! INCLUDE directives, after the directory of '
+                             'the unit')
+    option_parser.add_option('--stats', action='store_true',
+                             help='write the static cost of each stage and '
+                             'variant as JSON instead of the JavaScript')
+    options, args = option_parser.parse_args(argv[1:])
+    if not options.input or len(options.output) != len(options.input) and \
+            (len(options.input) > 1 or options.output):
+        option_parser.error('each --input needs an --output')
+    outputs = options.output or [None]
+
+    jobs = [(filename, options.include_path, options.stats)
+            for filename in options.input]
+    if len(options.input) > 1:
+        pool = multiprocessing.Pool(
+            min(len(options.input), multiprocessing.cpu_count()))
+        try:
+            results = pool.map(unit_star, jobs)
+        finally:
+            pool.close()
     else:
-        output = sys.stdout
-    output.write(pystache.render(open(options.template, 'rb').read(), context))
+        results = map(unit_star, jobs)
+
+    if not options.stats:
+        # the template is parsed once for all units
+        renderer = pystache.Renderer()
+        template = pystache.parse(
+            open(options.template, 'rb').read().decode('utf-8'))
+    for output, result in zip(outputs, results):
+        if options.stats:
+            content = json.dumps(result, indent=2, separators=(',', ': '),
+                                 sort_keys=True) + '\n'
+        else:
+            content = renderer.render(template, result).encode('utf-8')
+        write_if_changed(output, content)
 
 
 if __name__ == '__main__':
@@ -1,58 +1,28 @@
 #!/usr/bin/env python
 
-from cStringIO import StringIO
 import glob
 import gzip
+import hashlib
 import json
-import multiprocessing
+import mmap
 import os
 import re
 import shutil
+import subprocess
 import sys
+import tarfile
+import tempfile
+import time
 
-from pake import Target
-from pake import ifind, main, output, rule, target, variables, virtual, which
-from Queue import Queue
-from threading import Thread
-
-
-class ThreadPool:
-    """A basic pool of worker threads"""
-    class Worker(Thread):
-        def __init__(self, tasks):
-            Thread.__init__(self)
-            self.tasks = tasks
-            self.daemon = True # threads will be killed on exit
-            self.start()
-
-        def run(self):
-            while True:
-                # block until a task is ready to be done
-                function, args, kargs = self.tasks.get()
-                try:
-                    function(*args, **kargs)
-                except:
-                    print("ERROR")
-                    for count, thing in enumerate(args):
-                        print '{0}. {1}'.format(count, thing)
-                    print(sys.exc_info()[0])
-                    print("ERROR")
-                    self.tasks.errors = True
-                self.tasks.task_done()
-
-    def __init__(self, num_threads = multiprocessing.cpu_count() + 1):
-        self.tasks = Queue(num_threads)
-        self.tasks.errors = False
-        # create num_threads Workers, by default the number of CPUs + 1
-        for _ in range(num_threads): self.Worker(self.tasks)
-
-    def add_task(self, function, *args, **kargs):
-        self.tasks.put((function, args, kargs))
-
-    def wait_completion(self):
-        # wait for the queue to be empty
-        self.tasks.join()
-        return self.tasks.errors
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from pake import BuildError, Executor, State, Target
+from pake import atomic_open, digest, flatten_expand_list, ifind, lazy, main
+from pake import output, rule, state, target, targets, variables, virtual
+from pake import which
 
 
 if sys.platform == 'win32':
@@ -101,74 +71,188 @@ else:
     variables.PYTHON = 'python'
     variables.PHANTOMJS = './node_modules/.bin/phantomjs'
 
-variables.BRANCH = output(
-    '%(GIT)s', 'rev-parse', '--abbrev-ref', 'HEAD').strip()
+variables.BRANCH = lazy(lambda: output(
+    '%(GIT)s', 'rev-parse', '--abbrev-ref', 'HEAD').strip())
+
+variables.CLOSURE_LIB = lazy(lambda: output(
+    'node', '-e',
+    'process.stdout.write(require("closure-util").getLibraryPath())'))
+
+# URL of the live reload server started by the serve target, notified after
+# each rebuild in --watch mode
+variables.LIVERELOAD = 'http://localhost:35729/livereload'
+
+# Set EXAMPLES_BATCH=1 to compile all examples together in one batch instead
+# of each example separately
+variables.EXAMPLES_BATCH = '0'
+
+# Set NPM_CACHE to a directory to keep a tarball of node_modules there for
+# each version of package.json, and NPM_OFFLINE=1 to only restore
+# node_modules from those tarballs instead of running npm install
+variables.NPM_CACHE = ''
+variables.NPM_OFFLINE = '0'
+
+# The relative increase of a static shader cost over config/shader-stats.json
+# above which build/shader-stats.json fails
+variables.SHADER_STATS_THRESHOLD = '0.05'
 
 EXECUTABLES = [variables.CLEANCSS, variables.GIT, variables.GJSLINT,
                variables.JSDOC, variables.JSHINT, variables.PYTHON,
                variables.PHANTOMJS]
 
-EXAMPLES = [path
-            for path in ifind('examples')
-            if path.endswith('.html')
-            if path != 'examples/index.html']
+# The lists of source files below are only computed when they are needed, so
+# that pake starts quickly for targets that do not use them.
+
+EXAMPLES = lazy(lambda: [
+    path
+    for path in ifind('examples', prune=['examples/data'])
+    if path.endswith('.html')
+    if path != 'examples/index.html'])
+
+EXAMPLES_SRC = lazy(lambda: [
+    path
+    for path in ifind('examples', prune=['examples/data'])
+    if path.endswith('.js')
+    if not path.endswith('.combined.js')
+    if path != 'examples/Jugl.js'
+    if path != 'examples/example-list.js'])
+
+EXAMPLES_JSON = lazy(lambda: [
+    'build/' + example.replace('.html', '.json')
+    for example in EXAMPLES])
+
+EXAMPLES_COMBINED = lazy(lambda: [
+    'build/' + example.replace('.html', '.combined.js')
+    for example in EXAMPLES])
+
+# The directory of the snippets that shaders include with //! INCLUDE
+GLSL_INCLUDE_PATH = 'src/ol/webgl/glsl'
+
+GLSL_SRC = lazy(lambda: [
+    path
+    for path in ifind('src')
+    if path.endswith('.glsl')
+    if not path.startswith(GLSL_INCLUDE_PATH + '/')])
+
+GLSL_SNIPPETS = lazy(lambda: [
+    path
+    for path in ifind(GLSL_INCLUDE_PATH)
+    if path.endswith('.glsl')])
+
+JSDOC_SRC = lazy(lambda: [
+    path
+    for path in ifind('src')
+    if path.endswith('.jsdoc')])
+
+SHADER_SRC = lazy(lambda: [
+    path.replace('.glsl', 'shader.js')
+    for path in GLSL_SRC])
+
+SHADER_STATS = lazy(lambda: [
+    'build/' + path.replace('.glsl', '-stats.json')
+    for path in GLSL_SRC])
+
+SPEC = lazy(lambda: [
+    path
+    for path in ifind('test/spec')
+    if path.endswith('.js')])
+
+TASKS = lazy(lambda: [
+    path
+    for path in ifind('tasks')
+    if path.endswith('.js')])
+
+SRC = lazy(lambda: [
+    path
+    for path in ifind('src/ol')
+    if path.endswith('.js')
+    if path not in SHADER_SRC])
 
-EXAMPLES_SRC = [path
-                for path in ifind('examples')
-                if path.endswith('.js')
-                if not path.endswith('.combined.js')
-                if path != 'examples/Jugl.js'
-                if path != 'examples/example-list.js']
+NPM_INSTALL = 'build/npm-install-timestamp'
 
-EXAMPLES_JSON = ['build/' + example.replace('.html', '.json')
-                 for example in EXAMPLES]
+# The ol3-dem application whose use of the API decides what build/ol3dem.js
+# exports
+OL3DEM_APP = ['../ol3dem-demo/js/ol3demInit.js',
+              '../ol3dem-demo/js/ol3demUi.js']
 
-EXAMPLES_COMBINED = ['build/' + example.replace('.html', '.combined.js')
-                     for example in EXAMPLES]
 
-GLSL_SRC = [path
-            for path in ifind('src')
-            if path.endswith('.glsl')]
+class ByteCounter(object):
+    """ByteCounter is a file-like sink that only counts the bytes written to
+    it."""
 
-JSDOC_SRC = [path
-             for path in ifind('src')
-             if path.endswith('.jsdoc')]
+    def __init__(self):
+        self.size = 0
 
-SHADER_SRC = [path.replace('.glsl', 'shader.js')
-              for path in GLSL_SRC]
+    def write(self, data):
+        self.size += len(data)
 
-SPEC = [path
-        for path in ifind('test/spec')
-        if path.endswith('.js')]
+    def flush(self):
+        pass
 
-TASKS = [path
-         for path in ifind('tasks')
-         if path.endswith('.js')]
 
-SRC = [path
-       for path in ifind('src/ol')
-       if path.endswith('.js')
-       if path not in SHADER_SRC]
+# size_history keeps the sizes reported by report_sizes for each branch
+size_history = State('build/size-history.json')
+
+
+def compressed_sizes(path):
+    """compressed_sizes returns the raw, gzip and brotli sizes of the file
+    path, reading it in chunks so that neither it nor its compressed forms are
+    held in memory.  The brotli size is None if the brotli module is not
+    installed."""
+    raw = 0
+    gzip_counter = ByteCounter()
+    gzip_file = gzip.GzipFile(os.path.basename(path), 'wb', 9, gzip_counter)
+    brotli_size = None
+    if brotli is not None:
+        compressor = brotli.Compressor(quality=11)
+        brotli_size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            raw += len(chunk)
+            gzip_file.write(chunk)
+            if brotli is not None:
+                brotli_size += len(compressor.process(chunk))
+    gzip_file.close()
+    if brotli is not None:
+        brotli_size += len(compressor.finish())
+    return raw, gzip_counter.size, brotli_size
 
-NPM_INSTALL = 'build/npm-install-timestamp'
 
 def report_sizes(t):
-    stringio = StringIO()
-    gzipfile = gzip.GzipFile(t.name, 'w', 9, stringio)
-    with open(t.name, 'rb') as f:
-        shutil.copyfileobj(f, gzipfile)
-    gzipfile.close()
-    rawsize = os.stat(t.name).st_size
-    gzipsize = len(stringio.getvalue())
-    savings = '{0:.2%}'.format((rawsize - gzipsize)/float(rawsize))
-    t.info('uncompressed: %8d bytes', rawsize)
-    t.info('  compressed: %8d bytes, (saved %s)', gzipsize, savings)
+    """report_sizes logs the raw and compressed sizes of the target, records
+    them in build/size-history.json and fails the target if they exceed its
+    budgets in config/size-budgets.json."""
+    rawsize, gzipsize, brotlisize = compressed_sizes(t.name)
+    sizes = {'raw': rawsize, 'gzip': gzipsize, 'brotli': brotlisize}
+    history = size_history.get(variables.BRANCH, t.name, [])
+    previous = history[-1] if history else {}
+
+    def change(kind):
+        if previous.get(kind) is None or sizes[kind] is None:
+            return ''
+        return ', %+d bytes' % (sizes[kind] - previous[kind],)
+
+    savings = '{0:.2%}'.format((rawsize - gzipsize)/float(rawsize or 1))
+    t.info('uncompressed: %8d bytes%s', rawsize, change('raw'))
+    t.info('  compressed: %8d bytes, (saved %s)%s', gzipsize, savings,
+           change('gzip'))
+    if brotlisize is not None:
+        t.info('      brotli: %8d bytes%s', brotlisize, change('brotli'))
+    entry = dict(sizes, time=int(time.time()))
+    size_history.set(variables.BRANCH, t.name, (history + [entry])[-100:])
+    size_history.save()
+    with open('config/size-budgets.json', 'rU') as f:
+        budgets = json.load(f).get(t.name, {})
+    for kind in sorted(budgets):
+        if sizes.get(kind) is not None and sizes[kind] > budgets[kind]:
+            t.error('%s size of %d bytes exceeds the budget of %d bytes' %
+                    (kind, sizes[kind], budgets[kind]))
 
 
 virtual('default', 'build')
 
 
-virtual('ci', 'lint', 'build', 'test',
+virtual('ci', 'lint', 'build/shader-stats.json', 'build', 'test',
     'build/examples/all.combined.js', 'check-examples', 'apidoc')
 
 
@@ -176,15 +260,81 @@ virtual('build', 'build/ol.css', 'build/ol.js', 'build/ol-debug.js',
     'build/ol.js.map')
 
 
-virtual('check', 'lint', 'build/ol.js', 'test')
+virtual('check', 'lint', 'build/shader-stats.json', 'build/ol.js', 'test')
 
 
 virtual('todo', 'fixme')
 
 
+def _npm_key():
+    """_npm_key returns a digest of everything npm install depends on:
+    package.json, npm-shrinkwrap.json if there is one, and the platform and
+    version of node that the installed packages are built for."""
+    sha1 = hashlib.sha1()
+    for path in ('package.json', 'npm-shrinkwrap.json'):
+        if os.path.exists(path):
+            sha1.update(path + '\0' + digest(path) + '\0')
+    sha1.update(sys.platform + '\0' + output('node', '--version').strip())
+    return sha1.hexdigest()
+
+
+def _node_modules_tree(root='node_modules'):
+    """_node_modules_tree returns a digest of the names and versions of all
+    the packages installed in root, including nested and scoped packages, or
+    None if root does not exist."""
+    if not os.path.isdir(root):
+        return None
+    packages = []
+
+    def walk(path):
+        for name in sorted(os.listdir(path)):
+            package = os.path.join(path, name)
+            if name.startswith('.') or not os.path.isdir(package):
+                continue
+            if name.startswith('@'):
+                walk(package)
+                continue
+            try:
+                with open(os.path.join(package, 'package.json'), 'rU') as f:
+                    version = json.load(f).get('version')
+            except (IOError, ValueError):
+                version = None
+            packages.append('%s@%s' % (package, version))
+            if os.path.isdir(os.path.join(package, 'node_modules')):
+                walk(os.path.join(package, 'node_modules'))
+
+    walk(root)
+    return hashlib.sha1('\n'.join(packages)).hexdigest()
+
+
 @target(NPM_INSTALL, 'package.json')
 def npm_install(t):
-    t.run('npm', 'install')
+    key = _npm_key()
+    tarball = None
+    if variables.NPM_CACHE:
+        tarball = os.path.join(variables.NPM_CACHE, key + '.tar.gz')
+    if (state.get('npm-install', 'key') == key and
+            state.get('npm-install', 'tree') == _node_modules_tree()):
+        t.info('node_modules is up to date with package.json')
+        t.run('node', 'tasks/install.js')
+    elif tarball is not None and os.path.exists(tarball):
+        t.info('restoring node_modules from %s', tarball)
+        t.rm_rf('node_modules')
+        with tarfile.open(tarball) as tar:
+            tar.extractall()
+        t.run('node', 'tasks/install.js')
+    elif variables.NPM_OFFLINE == '1':
+        t.error('no tarball of node_modules for this package.json in %s' %
+                (variables.NPM_CACHE or 'NPM_CACHE',))
+    else:
+        t.run('npm', 'install')
+        if tarball is not None:
+            t.info('storing node_modules in %s', tarball)
+            with atomic_open(tarball) as f:
+                with tarfile.open(fileobj=f, mode='w:gz') as tar:
+                    tar.add('node_modules')
+    state.set('npm-install', 'key', key)
+    state.set('npm-install', 'tree', _node_modules_tree())
     t.touch()
 
 
@@ -194,37 +344,232 @@ def build_ol_css(t):
 
 
 def _build_js(t):
-    t.run('node', 'tasks/build.js', 'config/ol.json', 'build/ol.js')
+    with targets.get('build/ol.js').staging() as path:
+        t.run('node', 'tasks/build.js', 'config/ol.json', path)
 
 
-@target('build/ol.js', SRC, SHADER_SRC, 'config/ol.json', NPM_INSTALL)
+@target('build/ol.js', SRC, SHADER_SRC, 'config/ol.json', NPM_INSTALL,
+        cacheable=True)
 def build_ol_js(t):
     _build_js(t)
     report_sizes(t)
 
 
-@target('build/ol.js.map', SRC, SHADER_SRC, 'config/ol.json', NPM_INSTALL)
+# build/ol.js.map is written by the same compile as build/ol.js, so it only
+# depends on build/ol.js, which also stops both compiles running at once in
+# parallel builds, and only compiles again if the map is missing.  An existing
+# map may be older than build/ol.js, which is written after it, so it is
+# touched instead.
+@target('build/ol.js.map', 'build/ol.js', cacheable=True)
 def build_ol_js_map(t):
-    _build_js(t)
+    if os.path.exists(t.name):
+        t.touch()
+    else:
+        _build_js(t)
+        report_sizes(targets.get('build/ol.js'))
 
 
 @target('build/ol-debug.js', SRC, SHADER_SRC, 'config/ol-debug.json',
-        NPM_INSTALL)
+        NPM_INSTALL, cacheable=True)
 def build_ol_debug_js(t):
-    t.run('node', 'tasks/build.js', 'config/ol-debug.json', 'build/ol-debug.js')
+    with t.staging() as path:
+        t.run('node', 'tasks/build.js', 'config/ol-debug.json', path)
+    report_sizes(t)
+
+
+@target('build/info.json', SRC, 'externs/geojson.js', 'externs/olx.js',
+        NPM_INSTALL)
+def build_info_json(t):
+    t.run('node', 'tasks/generate-info.js')
+    t.touch()
+
+
+def _ol_api_use(filename):
+    """_ol_api_use returns the dotted names starting with ol. that the
+    JavaScript file filename uses, and the names of all the properties that
+    it accesses on any object, for example getView in map.getView()."""
+    with open(filename, 'rU') as f:
+        text = f.read()
+    chains = set(chain for chain in _index_js(text)['chains']
+                 if chain.startswith('ol.'))
+    members = set()
+    previous = None
+    for token in _tokenize_js(text):
+        if token[0] == 'name' and previous is not None and previous[1] == '.':
+            members.add(token[1])
+        previous = token
+    return chains, members
+
+
+def ol3dem_exports(symbols, chains, members):
+    """ol3dem_exports returns the API symbols used by an application that
+    uses the dotted names chains and accesses the properties members, and
+    the chains that are not part of the API.  A chain uses the longest API
+    symbol it starts with.  The methods and properties in members are only
+    exported from the classes the application is known to use: the classes
+    it names, the classes returned by the symbols it uses, and their base
+    classes."""
+    lookup = dict((symbol['name'], symbol) for symbol in symbols)
+    exports, classes, unknown = set(), set(), set()
+
+    def use_class(name):
+        while name in lookup and name not in classes:
+            classes.add(name)
+            name = lookup[name].get('extends')
+
+    def use(name):
+        exports.add(name)
+        symbol = lookup[name]
+        if symbol['kind'] == 'class':
+            use_class(name)
+        for types in symbol.get('returns', {}).get('types', []):
+            for returned in re.findall(r'\bol(?:\.\w+)+', types):
+                if lookup.get(returned, {}).get('kind') == 'class':
+                    use_class(returned)
+
+    for chain in chains:
+        components = chain.split('.')
+        for i in xrange(len(components), 1, -1):
+            name = '.'.join(components[:i])
+            if name in lookup:
+                use(name)
+                break
+        else:
+            unknown.add(chain)
+    while True:
+        names = set(cls + '#' + member
+                    for cls in classes
+                    for member in members
+                    if cls + '#' + member in lookup) - exports
+        if not names:
+            break
+        for name in names:
+            use(name)
+    return sorted(exports), sorted(unknown)
+
+
+@target('build/ol3dem.json', __file__, 'build/info.json', 'config/ol3dem.json',
+        OL3DEM_APP)
+def build_ol3dem_json(t):
+    chains, members = set(), set()
+    for filename in OL3DEM_APP:
+        file_chains, file_members = _ol_api_use(filename)
+        chains.update(file_chains)
+        members.update(file_members)
+    with open('build/info.json', 'rU') as f:
+        symbols = json.load(f)['symbols']
+    exports, unknown = ol3dem_exports(symbols, chains, members)
+    for chain in unknown:
+        t.info('%s is not part of the API, not exporting it', chain)
+    with open('config/ol3dem.json', 'rU') as f:
+        config = json.load(f)
+    config['exports'] = sorted(set(config['exports']) | set(exports))
+    t.info('exporting %d symbols', len(config['exports']))
+    with atomic_open(t.name) as f:
+        json.dump(config, f, indent=2, sort_keys=True)
+
+
+@target('build/ol3dem.js', SRC, SHADER_SRC, 'build/ol3dem.json', NPM_INSTALL,
+        cacheable=True)
+def build_ol3dem_js(t):
+    with t.staging() as path:
+        t.run('node', 'tasks/build.js', 'build/ol3dem.json', path)
     report_sizes(t)
 
 
-for glsl_src in GLSL_SRC:
-    def shader_src_helper(glsl_src):
-        @target(glsl_src.replace('.glsl', 'shader.js'), glsl_src,
-                'src/ol/webgl/shader.mustache', 'bin/pyglslunit.py')
-        def shader_src(t):
+virtual('ol3dem', '../ol3dem-demo/js/ol3dem.js')
+
+
+# The build used by the demo application is committed, so it is not cleaned
+@target('../ol3dem-demo/js/ol3dem.js', 'build/ol3dem.js', clean=False)
+def ol3dem_demo_js(t):
+    t.cp('build/ol3dem.js', t.name)
+
+
+# All shaders are generated in one run of pyglslunit.py, which only rewrites
+# the ones whose contents change.  The shader targets are restat targets, so
+# that the unchanged ones do not cause their dependents to be rebuilt.
+@target('build/shaders-timestamp', GLSL_SRC, GLSL_SNIPPETS,
+        'src/ol/webgl/shader.mustache', 'bin/pyglslunit.py')
+def build_shaders_timestamp(t):
+    t.run('%(PYTHON)s', 'bin/pyglslunit.py',
+          '--template', 'src/ol/webgl/shader.mustache',
+          '--include-path', GLSL_INCLUDE_PATH,
+          [('--input', glsl_src,
+            '--output', glsl_src.replace('.glsl', 'shader.js'))
+           for glsl_src in GLSL_SRC])
+    t.touch()
+
+
+@rule(r'\A(?P<base>src/.*\w)shader\.js\Z')
+def shader_src(name, match):
+    glsl_src = match.group('base') + '.glsl'
+    if not os.path.exists(glsl_src):
+        return None
+    def action(t):
+        if not os.path.exists(t.name):
             t.run('%(PYTHON)s', 'bin/pyglslunit.py',
                   '--input', glsl_src,
                   '--template', 'src/ol/webgl/shader.mustache',
+                  '--include-path', GLSL_INCLUDE_PATH,
                   '--output', t.name)
-    shader_src_helper(glsl_src)
+    dependencies = [glsl_src, 'build/shaders-timestamp']
+    return Target(name, action=action, dependencies=dependencies,
+                  restat=True)
+
+
+@rule(r'\Abuild/(?P<base>src/.*\w)-stats\.json\Z')
+def shader_stats(name, match):
+    glsl_src = match.group('base') + '.glsl'
+    if not os.path.exists(glsl_src):
+        return None
+    def action(t):
+        t.makedirs(os.path.dirname(t.name))
+        t.output('%(PYTHON)s', 'bin/pyglslunit.py', '--stats',
+                 '--include-path', GLSL_INCLUDE_PATH, '--input', glsl_src)
+    dependencies = [glsl_src, GLSL_SNIPPETS, 'bin/pyglslunit.py']
+    return Target(name, action=action, dependencies=dependencies)
+
+
+# build/shader-stats.json fails if any static cost of a shader exceeds its
+# baseline in config/shader-stats.json by more than SHADER_STATS_THRESHOLD.
+# The costs are then written to build/shader-stats-regressed.json instead,
+# which can be copied to config/shader-stats.json to accept them.
+@target('build/shader-stats.json', SHADER_STATS, 'config/shader-stats.json')
+def build_shader_stats_json(t):
+    """Compares the static costs of the shaders with their baseline."""
+    threshold = float(variables.SHADER_STATS_THRESHOLD)
+    with open('config/shader-stats.json', 'rU') as f:
+        baseline = json.load(f)
+    stats, regressions = {}, []
+    for path in SHADER_STATS:
+        glsl_src = path[len('build/'):].replace('-stats.json', '.glsl')
+        with open(path, 'rU') as f:
+            stats[glsl_src] = json.load(f)
+        for stage in sorted(stats[glsl_src]):
+            for variant, costs in sorted(stats[glsl_src][stage].iteritems()):
+                base = baseline.get(glsl_src, {}).get(stage, {}).get(variant)
+                for key in sorted(costs):
+                    if base is None or key not in base:
+                        change = 'new'
+                    else:
+                        change = '%+d' % (costs[key] - base[key],)
+                        if costs[key] > base[key] * (1 + threshold):
+                            regressions.append('%s %s %s: %s %d > %d' % (
+                                glsl_src, stage, variant, key, costs[key],
+                                base[key]))
+                    if change != '+0':
+                        t.info('%s %s %s: %s %d (%s)', glsl_src, stage,
+                               variant, key, costs[key], change)
+    path = 'build/shader-stats-regressed.json' if regressions else t.name
+    with atomic_open(path) as f:
+        json.dump(stats, f, indent=2, separators=(',', ': '), sort_keys=True)
+        f.write('\n')
+    for regression in regressions:
+        t.info(regression)
+    if regressions:
+        t.error('%d shader costs regressed beyond the threshold of %s, see %s' %
+                (len(regressions), threshold, path))
 
 
 @target('build/test/requireall.js', SPEC)
@@ -235,7 +580,7 @@ def build_test_requireall_js(t):
             match = re.match(r'goog\.provide\(\'(.*)\'\);', line)
             if match:
                 requires.add(match.group(1))
-    with open(t.name, 'wb') as f:
+    with atomic_open(t.name) as f:
         for require in sorted(requires):
             f.write('goog.require(\'%s\');\n' % (require,))
 
@@ -258,10 +603,11 @@ def examples_examples_list_js(t):
 
 
 @target('build/examples/all.combined.js', 'build/examples/all.js',
-        SRC, SHADER_SRC, 'config/examples-all.json', NPM_INSTALL)
+        SRC, SHADER_SRC, 'config/examples-all.json', NPM_INSTALL,
+        cacheable=True)
 def build_examples_all_combined_js(t):
-    t.run('node', 'tasks/build.js', 'config/examples-all.json',
-          'build/examples/all.combined.js')
+    with t.staging() as path:
+        t.run('node', 'tasks/build.js', 'config/examples-all.json', path)
     report_sizes(t)
 
 
@@ -270,119 +616,183 @@ def build_examples_all_js(t):
     t.output('%(PYTHON)s', 'bin/combine-examples.py', t.dependencies)
 
 
-@rule(r'\Abuild/examples/(?P<id>.*).json\Z')
+def example_config(sources):
+    """example_config returns the build configuration for compiling the
+    library together with the example sources."""
+    # When compiling the ol3 code and the application code together it is
+    # better to use oli.js and olx.js files as "input" files rather than
+    # "externs" files. Indeed, externs prevent renaming, which is neither
+    # necessary nor desirable in this case.
+    #
+    # oli.js and olx.js do not provide or require namespaces (using
+    # "goog.provide" or "goog.require"). For that reason, if they are
+    # specified as input files through the "src" property, then
+    # closure-util will exclude them when creating the dependencies graph.
+    # So the compile "js" property is used instead. With that property the
+    # oli.js and olx.js files are passed directly to the compiler. And by
+    # setting "manage_closure_dependencies" to "true" the compiler will not
+    # exclude them from its dependencies graph.
+    return {
+      "exports": [],
+      "src": ["src/**/*.js", "build/ol.ext/*.js"] + sources,
+      "compile": {
+        "js": [
+          "externs/olx.js",
+          "externs/oli.js",
+        ],
+        "externs": [
+          "externs/bingmaps.js",
+          "externs/bootstrap.js",
+          "externs/closure-compiler.js",
+          "externs/example.js",
+          "externs/fastclick.js",
+          "externs/geojson.js",
+          "externs/jquery-1.9.js",
+          "externs/proj4js.js",
+          "externs/tilejson.js",
+          "externs/topojson.js",
+          "externs/vbarray.js"
+        ],
+        "define": [
+          "goog.array.ASSUME_NATIVE_FUNCTIONS=true",
+          "goog.dom.ASSUME_STANDARDS_MODE=true",
+          "goog.json.USE_NATIVE_JSON=true",
+          "goog.DEBUG=false"
+        ],
+        "jscomp_error": [
+          "accessControls",
+          "ambiguousFunctionDecl",
+          "checkDebuggerStatement",
+          "checkEventfulObjectDisposal",
+          "checkProvides",
+          "checkRegExp",
+          "checkStructDictInheritance",
+          "checkTypes",
+          "checkVars",
+          "const",
+          "constantProperty",
+          "deprecated",
+          "duplicate",
+          "duplicateMessage",
+          "es3",
+          "es5Strict",
+          "externsValidation",
+          "fileoverviewTags",
+          "globalThis",
+          "internetExplorerChecks",
+          "invalidCasts",
+          "misplacedTypeAnnotation",
+          "missingProperties",
+          "nonStandardJsDocs",
+          "strictModuleDepCheck",
+          "suspiciousCode",
+          "typeInvalidation",
+          "tweakValidation",
+          "undefinedNames",
+          "undefinedVars",
+          "uselessCode",
+          "violatedModuleDep",
+          "visibility"
+        ],
+        "jscomp_off": [
+          "unknownDefines"
+        ],
+        "extra_annotation_name": [
+          "api", "observable"
+        ],
+        "compilation_level": "ADVANCED",
+        "warning_level": "VERBOSE",
+        "output_wrapper": "(function(){%output%})();",
+        "use_types_for_optimization": True,
+        "manage_closure_dependencies": True
+      }
+    }
+
+
+@rule(r'\Abuild/examples/(?P<id>.*)\.json\Z')
 def examples_star_json(name, match):
     def action(t):
-
-        # When compiling the ol3 code and the application code together it is
-        # better to use oli.js and olx.js files as "input" files rather than
-        # "externs" files. Indeed, externs prevent renaming, which is neither
-        # necessary nor desirable in this case.
-        #
-        # oli.js and olx.js do not provide or require namespaces (using
-        # "goog.provide" or "goog.require"). For that reason, if they are
-        # specified as input files through the "src" property, then
-        # closure-util will exclude them when creating the dependencies graph.
-        # So the compile "js" property is used instead. With that property the
-        # oli.js and olx.js files are passed directly to the compiler. And by
-        # setting "manage_closure_dependencies" to "true" the compiler will not
-        # exclude them from its dependencies graph.
-
-        content = json.dumps({
-          "exports": [],
-          "src": [
-            "src/**/*.js",
-            "build/ol.ext/*.js",
-            "examples/%(id)s.js" % match.groupdict()],
-          "compile": {
-            "js": [
-              "externs/olx.js",
-              "externs/oli.js",
-            ],
-            "externs": [
-              "externs/bingmaps.js",
-              "externs/bootstrap.js",
-              "externs/closure-compiler.js",
-              "externs/example.js",
-              "externs/fastclick.js",
-              "externs/geojson.js",
-              "externs/jquery-1.9.js",
-              "externs/proj4js.js",
-              "externs/tilejson.js",
-              "externs/topojson.js",
-              "externs/vbarray.js"
-            ],
-            "define": [
-              "goog.array.ASSUME_NATIVE_FUNCTIONS=true",
-              "goog.dom.ASSUME_STANDARDS_MODE=true",
-              "goog.json.USE_NATIVE_JSON=true",
-              "goog.DEBUG=false"
-            ],
-            "jscomp_error": [
-              "accessControls",
-              "ambiguousFunctionDecl",
-              "checkDebuggerStatement",
-              "checkEventfulObjectDisposal",
-              "checkProvides",
-              "checkRegExp",
-              "checkStructDictInheritance",
-              "checkTypes",
-              "checkVars",
-              "const",
-              "constantProperty",
-              "deprecated",
-              "duplicate",
-              "duplicateMessage",
-              "es3",
-              "es5Strict",
-              "externsValidation",
-              "fileoverviewTags",
-              "globalThis",
-              "internetExplorerChecks",
-              "invalidCasts",
-              "misplacedTypeAnnotation",
-              "missingProperties",
-              "nonStandardJsDocs",
-              "strictModuleDepCheck",
-              "suspiciousCode",
-              "typeInvalidation",
-              "tweakValidation",
-              "undefinedNames",
-              "undefinedVars",
-              "uselessCode",
-              "violatedModuleDep",
-              "visibility"
-            ],
-            "jscomp_off": [
-              "unknownDefines"
-            ],
-            "extra_annotation_name": [
-              "api", "observable"
-            ],
-            "compilation_level": "ADVANCED",
-            "warning_level": "VERBOSE",
-            "output_wrapper": "(function(){%output%})();",
-            "use_types_for_optimization": True,
-            "manage_closure_dependencies": True
-          }
-        })
-        with open(t.name, 'wb') as f:
+        content = json.dumps(example_config(
+            ['examples/%(id)s.js' % match.groupdict()]))
+        with atomic_open(t.name) as f:
             f.write(content)
     return Target(name, action=action,
                   dependencies=[__file__, NPM_INSTALL])
 
 
-@rule(r'\Abuild/examples/(?P<id>.*).combined.js\Z')
+def is_nocompile(example_js):
+    """is_nocompile returns True if the example example_js is marked as not
+    compilable by a // NOCOMPILE first line."""
+    return open(example_js, 'rU').readline().startswith('// NOCOMPILE')
+
+
+def wrap_example(example_js):
+    """wrap_example returns the source of example_js with its goog.require
+    lines first and the rest of the code in a function scope, as
+    bin/combine-examples.py does, so that the examples do not share their top
+    level variables when they are compiled together."""
+    lines = open(example_js, 'rU').readlines()
+    requires = [line for line in lines if line.startswith('goog.require')]
+    code = [line for line in lines if not line.startswith('goog.require')]
+    return ''.join(requires + ['(function(){\n'] + code + ['})();\n'])
+
+
+EXAMPLES_BATCH_JS = lazy(lambda: [
+    example.replace('.html', '.js')
+    for example in sorted(EXAMPLES)
+    if not is_nocompile(example.replace('.html', '.js'))])
+
+
+# The wrapped sources of the batched examples are written to
+# build/examples/batch/src/<id>.js alongside the configuration
+@target('build/examples/batch.json', __file__, EXAMPLES, EXAMPLES_BATCH_JS,
+        NPM_INSTALL)
+def build_examples_batch_json(t):
+    config = example_config([])
+    config['examples'] = []
+    for example_js in EXAMPLES_BATCH_JS:
+        example_id = example_js[len('examples/'):-len('.js')]
+        path = 'build/examples/batch/src/%s.js' % (example_id,)
+        write_if_changed(path, wrap_example(example_js))
+        config['examples'].append({'id': example_id, 'path': path})
+    with atomic_open(t.name) as f:
+        json.dump(config, f)
+
+
+# All examples are compiled together with the library in one compiler run by
+# tasks/build-examples.js, which writes build/examples/batch/<id>.combined.js
+@target('build/examples/batch-timestamp', SRC, SHADER_SRC, EXAMPLES_BATCH_JS,
+        'build/examples/batch.json', 'tasks/build-examples.js', NPM_INSTALL)
+def build_examples_batch_timestamp(t):
+    t.run('node', 'tasks/build-examples.js', 'build/examples/batch.json',
+          'build/examples/batch')
+    t.touch()
+
+
+@rule(r'\Abuild/examples/(?P<id>.*)\.combined\.js\Z')
 def examples_star_combined_js(name, match):
+    # Examples marked // NOCOMPILE are not in the batch, and are compiled
+    # separately
+    if variables.EXAMPLES_BATCH not in ('', '0') and \
+            not is_nocompile('examples/%(id)s.js' % match.groupdict()):
+        batch_js = 'build/examples/batch/%(id)s.combined.js' % match.groupdict()
+        def action(t):
+            with t.staging() as path:
+                shutil.copyfile(batch_js, path)
+            report_sizes(t)
+        return Target(name, action=action,
+                      dependencies=['build/examples/batch-timestamp'])
     def action(t):
         config = 'build/examples/%(id)s.json' % match.groupdict()
-        t.run('node', 'tasks/build.js', config, name)
+        with t.staging() as path:
+            t.run('node', 'tasks/build.js', config, path)
         report_sizes(t)
     dependencies = [SRC, SHADER_SRC,
                     'examples/%(id)s.js' % match.groupdict(),
                     'build/examples/%(id)s.json' % match.groupdict(),
                     NPM_INSTALL]
-    return Target(name, action=action, dependencies=dependencies)
+    return Target(name, action=action, cacheable=True,
+                  dependencies=dependencies)
 
 
 @target('serve', 'examples', NPM_INSTALL)
@@ -394,13 +804,70 @@ virtual('lint', 'build/lint-timestamp', 'build/check-requires-timestamp',
     'build/check-whitespace-timestamp', 'jshint')
 
 
+# lint_cache remembers the files that passed each lint check, by the digest of
+# their contents and of the check's command line, so that only changed files
+# are checked again
+lint_cache = State('build/lint-cache.json')
+
+
+def _lint_key(args, filename):
+    return hashlib.sha1(repr(args) + '\0' + digest(filename)).hexdigest()
+
+
+def lint_files(t, section, args, filenames):
+    """lint_files runs the lint command args on those of filenames that have
+    not passed it before, and fails the target if any of them has errors.
+    The files are checked in batches in parallel.  If a batch fails, its
+    files are checked again one at a time, so that the files without errors
+    are still remembered, and only the output for the failing files is
+    shown."""
+    args = flatten_expand_list(args)
+    keys = dict((filename, _lint_key(args, filename))
+                for filename in filenames)
+    dirty = sorted(filename for filename in filenames
+                   if not lint_cache.get(section, keys[filename]))
+    t.info('%d of %d files to check', len(dirty), len(filenames))
+
+    def check(batch):
+        with tempfile.TemporaryFile() as f:
+            try:
+                t.run(args, batch, stdout=f, stderr=subprocess.STDOUT)
+            except BuildError:
+                if len(batch) == 1:
+                    f.seek(0)
+                    return [], [(batch[0], f.read())]
+                clean, failed = [], []
+                for filename in batch:
+                    file_clean, file_failed = check([filename])
+                    clean.extend(file_clean)
+                    failed.extend(file_failed)
+                return clean, failed
+        return batch, []
+
+    failed = []
+    with Executor() as executor:
+        size = max(1, min(32, -(-len(dirty) // executor.jobs)))
+        for i in xrange(0, len(dirty), size):
+            executor.submit(check, dirty[i:i + size])
+        for clean, batch_failed in executor.wait():
+            for filename in clean:
+                lint_cache.set(section, keys[filename], True)
+            for filename, output in batch_failed:
+                sys.stdout.write(output)
+                failed.append(filename)
+    lint_cache.retain(section, set(keys.values()))
+    lint_cache.save()
+    if failed:
+        t.error('%d files failed %s' % (len(failed), section))
+
+
 @target('build/lint-timestamp', SRC, EXAMPLES_SRC, SPEC, precious=True)
 def build_lint_src_timestamp(t):
-    t.run('%(GJSLINT)s',
-          '--jslint_error=all',
-          '--custom_jsdoc_tags=event,fires,function,classdesc,api,observable',
-          '--strict',
-          t.newer(t.dependencies))
+    lint_files(t, 'gjslint', [
+        '%(GJSLINT)s',
+        '--jslint_error=all',
+        '--custom_jsdoc_tags=event,fires,function,classdesc,api,observable',
+        '--strict'], t.dependencies)
     t.touch()
 
 virtual('jshint', 'build/jshint-timestamp')
@@ -408,154 +875,192 @@ virtual('jshint', 'build/jshint-timestamp')
 @target('build/jshint-timestamp', SRC, EXAMPLES_SRC, SPEC, TASKS,
         NPM_INSTALL, precious=True)
 def build_jshint_timestamp(t):
-    t.run(variables.JSHINT, '--verbose', t.newer(t.dependencies))
+    lint_files(t, 'jshint', [variables.JSHINT, '--verbose'],
+               [filename for filename in t.dependencies
+                if filename.endswith('.js')])
     t.touch()
 
 
-def _strip_comments(lines):
-    # FIXME this is a horribe hack, we should use a proper JavaScript parser
-    # here
-    in_multiline_comment = False
-    lineno = 0
-    for line in lines:
-        lineno += 1
-        if in_multiline_comment:
-            index = line.find('*/')
-            if index != -1:
-                in_multiline_comment = False
-                line = line[index + 2:]
-        if not in_multiline_comment:
-            line = re.sub(r'//[^\n]*', '', line)
-            line = re.sub(r'/\*.*?\*/', '', line)
-            index = line.find('/*')
-            if index != -1:
-                yield lineno, line[:index]
-                in_multiline_comment = True
+JS_TOKEN_RE = re.compile(r'''
+    (?P<space>\s+) |
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z)) |
+    (?P<string>'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*") |
+    (?P<name>[A-Za-z_$][\w$]*) |
+    (?P<number>\.?\d[\w.]*)
+''', re.DOTALL | re.VERBOSE)
+JS_REGEXP_RE = re.compile(r'/(?:[^/\\\n\[]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+# Keywords after which a / starts a regular expression literal rather than a
+# division
+JS_REGEXP_KEYWORDS = frozenset((
+    'case', 'delete', 'do', 'else', 'in', 'instanceof', 'new', 'return',
+    'throw', 'typeof', 'void'))
+
+
+def _tokenize_js(text):
+    """_tokenize_js splits JavaScript source code into (kind, value, lineno,
+    start, end) tuples, where kind is 'name', 'string', 'number', 'regexp' or
+    'punct'.  Whitespace and comments are skipped.  Whether a / starts a
+    regular expression literal is decided by the previous token."""
+    pos, lineno, length = 0, 1, len(text)
+    previous = None
+    while pos < length:
+        m = JS_TOKEN_RE.match(text, pos)
+        if m:
+            kind, value = m.lastgroup, m.group()
+        elif text[pos] == '/' and (
+                previous is None or
+                (previous[0] == 'punct' and previous[1] not in ')]}') or
+                (previous[0] == 'name' and
+                 previous[1] in JS_REGEXP_KEYWORDS)):
+            m = JS_REGEXP_RE.match(text, pos)
+            if m:
+                kind, value = 'regexp', m.group()
+            else:
+                kind, value = 'punct', '/'
+        else:
+            kind, value = 'punct', text[pos]
+        end = pos + len(value)
+        if kind not in ('space', 'comment'):
+            previous = (kind, value, lineno, pos, end)
+            yield previous
+        lineno += value.count('\n')
+        pos = end
+
+
+def _index_js(text):
+    """_index_js returns the goog.provides and goog.requires of the
+    JavaScript source code text, with the line numbers of the requires, and
+    the dotted names that it uses, with the line number of their last use.
+    Requires that are not mentioned anywhere else in text, not even in
+    comments, are returned as unused."""
+    provides, requires, chains = set(), {}, {}
+    require_spans = []
+    tokens = list(_tokenize_js(text))
+    i = 0
+    while i < len(tokens):
+        kind, value, lineno, start, end = tokens[i]
+        if kind != 'name' or (i and tokens[i - 1][1] == '.'):
+            i += 1
+            continue
+        chain = [value]
+        i += 1
+        while (i + 1 < len(tokens) and tokens[i][1] == '.' and
+               tokens[i + 1][0] == 'name'):
+            chain.append(tokens[i + 1][1])
+            i += 2
+        name = '.'.join(chain)
+        if (name in ('goog.provide', 'goog.require') and
+                [token[0] for token in tokens[i:i + 3]] ==
+                ['punct', 'string', 'punct'] and
+                tokens[i][1] == '(' and tokens[i + 2][1] == ')'):
+            argument = tokens[i + 1][1][1:-1]
+            if name == 'goog.provide':
+                provides.add(argument)
             else:
-                yield lineno, line
+                requires[argument] = lineno
+                require_spans.append((start, tokens[i + 2][4]))
+            i += 3
+            continue
+        chains[name] = lineno
+    remainder = []
+    pos = 0
+    for start, end in require_spans:
+        remainder.append(text[pos:start])
+        pos = end
+    remainder.append(text[pos:])
+    remainder = ''.join(remainder)
+    unused = dict((require, lineno)
+                  for require, lineno in requires.iteritems()
+                  if require not in remainder)
+    return {
+        'provides': sorted(provides),
+        'requires': requires,
+        'unused': unused,
+        'chains': chains,
+    }
+
+
+def _index_js_file(filename):
+    with open(filename, 'rU') as f:
+        return _index_js(f.read())
+
+
+def _use(chain, class_provides, namespace_provides):
+    """_use returns the provide used by the dotted name chain, or None.  A
+    class such as ol.Map is used by any name that starts with it, for example
+    ol.Map.prototype.render.  A namespace such as ol.extent is only used by
+    calling one of its functions, as in ol.extent.extend, but not by
+    ol.extent.Corner, which is provided separately."""
+    components = chain.split('.')
+    for i in xrange(len(components), 0, -1):
+        name = '.'.join(components[:i])
+        if name in class_provides:
+            return name
+        if (name in namespace_provides and i == len(components) - 1 and
+                re.match(r'[a-z]', components[i])):
+            return name
+    return None
 
 
 @target('build/check-requires-timestamp', SRC, EXAMPLES_SRC, SHADER_SRC, SPEC)
 def build_check_requires_timestamp(t):
-    unused_count = 0
+    # The index of each file is kept by the digest of its contents, so only
+    # files that have changed since the last run are read and tokenized
+    index = State('build/check-requires-index.json')
+    library = dict((filename, digest(filename))
+                   for filename in ifind(variables.CLOSURE_LIB +
+                                         '/closure/goog')
+                   if filename.endswith('.js'))
+    files = dict((filename, digest(filename)) for filename in t.dependencies)
+    dirty = sorted(filename for filename, key in library.iteritems()
+                   if index.get('library', key) is None)
+    dirty.extend(sorted(filename for filename, key in files.iteritems()
+                        if index.get('files', key) is None))
+    if dirty:
+        t.info('indexing %d files', len(dirty))
+        with Executor(processes=True) as executor:
+            results = executor.map(_index_js_file, dirty)
+        for filename, file_index in zip(dirty, results):
+            if filename in files:
+                index.set('files', files[filename], file_index)
+            else:
+                index.set('library', library[filename],
+                          file_index['provides'])
     all_provides = set()
-    closure_lib_path = output('node', '-e',
-        'process.stdout.write(require("closure-util").getLibraryPath())')
-    for filename in ifind(closure_lib_path):
-        if filename.endswith('.js'):
-            if not re.match(r'.*/closure/goog/', filename):
-                continue
-            # Skip goog.i18n because it contains so many modules that it causes
-            # the generated regular expression to exceed Python's limits
-            if re.match(r'.*/closure/goog/i18n/', filename):
-                continue
-            for line in open(filename, 'rU'):
-                m = re.match(r'goog.provide\(\'(.*)\'\);', line)
-                if m:
-                    all_provides.add(m.group(1))
-    for filename in sorted(t.dependencies):
-        require_linenos = {}
-        uses = set()
-        lines = open(filename, 'rU').readlines()
-        for lineno, line in _strip_comments(lines):
-            m = re.match(r'goog.provide\(\'(.*)\'\);', line)
-            if m:
-                all_provides.add(m.group(1))
-                continue
-            m = re.match(r'goog.require\(\'(.*)\'\);', line)
-            if m:
-                require_linenos[m.group(1)] = lineno
-                continue
-        ignore_linenos = require_linenos.values()
-        for lineno, line in enumerate(lines):
-            if lineno in ignore_linenos:
-                continue
-            for require in require_linenos.iterkeys():
-                if require in line:
-                    uses.add(require)
-        for require in sorted(set(require_linenos.keys()) - uses):
-            t.info('%s:%d: unused goog.require: %r' % (
-                filename, require_linenos[require], require))
-            unused_count += 1
+    for key in library.itervalues():
+        all_provides.update(index.get('library', key))
+    indexes = {}
+    for filename, key in files.iteritems():
+        indexes[filename] = index.get('files', key)
+        all_provides.update(indexes[filename]['provides'])
+    library_digests = set(library.itervalues())
+    file_digests = set(files.itervalues())
+    index.retain('library', library_digests)
+    index.retain('files', file_digests)
+    index.save()
     all_provides.discard('ol')
     all_provides.discard('ol.MapProperty')
-
-    class Node(object):
-
-        def __init__(self):
-            self.present = False
-            self.children = {}
-
-        def _build_re(self, key):
-            if key == '*':
-                assert len(self.children) == 0
-                # We want to match `.doIt` but not `.SomeClass` or `.more.stuff`
-                return '(?=\\.[a-z]\\w*\\b(?!\\.))'
-            elif len(self.children) == 1:
-                child_key, child = next(self.children.iteritems())
-                child_re = child._build_re(child_key)
-                if child_key != '*':
-                    child_re = '\\.' + child_re
-                if self.present:
-                    return key + '(' + child_re + ')?'
-                else:
-                    return key + child_re
-            elif self.children:
-                children_re = '(?:' + '|'.join(
-                    ('\\.' if k != '*' else '') + self.children[k]._build_re(k)
-                    for k in sorted(self.children.keys())) + ')'
-                if self.present:
-                    return key + children_re + '?'
-                else:
-                    return key + children_re
-            else:
-                assert self.present
-                return key
-
-        def build_re(self, key):
-            return re.compile('\\b' + self._build_re(key) + '\\b')
-    root = Node()
+    class_provides = set()
+    namespace_provides = set()
     for provide in all_provides:
-        node = root
-        for component in provide.split('.'):
-            if component not in node.children:
-                node.children[component] = Node()
-            node = node.children[component]
-        if component[0].islower():
-            # We've arrived at a namespace provide like `ol.foo`.
-            # In this case, we want to match uses like `ol.foo.doIt()` but
-            # not match things like `new ol.foo.SomeClass()`.
-            # For this purpose, we use the special wildcard key for the child.
-            node.children['*'] = Node()
+        if provide.split('.')[-1][:1].islower():
+            namespace_provides.add(provide)
         else:
-            node.present = True
-    provide_res = [child.build_re(key)
-                   for key, child in root.children.iteritems()]
+            class_provides.add(provide)
+    unused_count = 0
     missing_count = 0
-    for filename in sorted(t.dependencies):
-        provides = set()
-        requires = set()
-        uses = set()
+    for filename in sorted(indexes):
+        file_index = indexes[filename]
+        for require, lineno in sorted(file_index['unused'].iteritems()):
+            t.info("%s:%d: unused goog.require: '%s'" % (
+                filename, lineno, require))
+            unused_count += 1
         uses_linenos = {}
-        for lineno, line in _strip_comments(open(filename, 'rU')):
-            m = re.match(r'goog.provide\(\'(.*)\'\);', line)
-            if m:
-                provides.add(m.group(1))
-                continue
-            m = re.match(r'goog.require\(\'(.*)\'\);', line)
-            if m:
-                requires.add(m.group(1))
-                continue
-            while True:
-                for provide_re in provide_res:
-                    m = provide_re.search(line)
-                    if m:
-                        uses.add(m.group())
-                        uses_linenos[m.group()] = lineno
-                        line = line[:m.start()] + line[m.end():]
-                        break
-                else:
-                    break
+        for chain, lineno in file_index['chains'].iteritems():
+            use = _use(chain, class_provides, namespace_provides)
+            if use is not None:
+                uses_linenos[use] = max(lineno, uses_linenos.get(use, 0))
+        uses = set(uses_linenos)
         if filename == 'src/ol/renderer/layerrenderer.js':
             uses.discard('ol.renderer.Map')
         m = re.match(
@@ -563,62 +1068,107 @@ def build_check_requires_timestamp(t):
         if m:
             uses.discard('ol.renderer.Map')
             uses.discard('ol.renderer.%s.Map' % (m.group(1),))
-        missing_requires = uses - requires - provides
-        if missing_requires:
-            for missing_require in sorted(missing_requires):
-                t.info("%s:%d missing goog.require('%s')" %
-                       (filename, uses_linenos[missing_require], missing_require))
-                missing_count += 1
+        missing_requires = (uses - set(file_index['requires']) -
+                            set(file_index['provides']))
+        for missing_require in sorted(missing_requires):
+            t.info("%s:%d missing goog.require('%s')" %
+                   (filename, uses_linenos[missing_require], missing_require))
+            missing_count += 1
     if unused_count or missing_count:
         t.error('%d unused goog.requires, %d missing goog.requires' %
                 (unused_count, missing_count))
     t.touch()
 
 
+# A line ending in a whitespace character other than a newline, not counting
+# the carriage return of a CRLF line ending, which is reported on its own
+TRAILING_WHITESPACE_RE = re.compile(r'[ \t\v\f]\r?\n')
+ALL_WHITESPACE_RE = re.compile(r'\s*\Z')
+
+
+def _check_whitespace(filename):
+    """_check_whitespace returns the whitespace errors in filename.  The file
+    is memory-mapped and scanned for each kind of error in bulk, and line
+    numbers are only computed for the errors found."""
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        size = len(data)
+        # (offset, order, message) tuples, where order is the order of the
+        # checks within a line
+        found = []
+        if data[0].isspace():
+            found.append((0, 0, 'leading whitespace'))
+        pos = data.find('\r')
+        while pos != -1:
+            found.append((pos, 1, 'carriage return character in line'))
+            # report each line once
+            pos = data.find('\n', pos)
+            if pos == -1:
+                break
+            pos = data.find('\r', pos)
+        for match in TRAILING_WHITESPACE_RE.finditer(data):
+            found.append((match.start(), 2, 'trailing whitespace'))
+        if data[size - 1] != '\n':
+            found.append((size - 1, 3, 'no newline at end of file'))
+        found.sort()
+        lines = []
+        lineno, offset = 1, 0
+        for pos, order, message in found:
+            lineno += data[offset:pos].count('\n')
+            offset = pos
+            lines.append((lineno, order, message))
+        errors = ['%s:%d: %s' % (filename, lineno, message)
+                  for lineno, order, message in sorted(lines)]
+        last_line = data.rfind('\n', 0, size - 1) + 1
+        if ALL_WHITESPACE_RE.match(data, last_line):
+            errors.append('%s: trailing whitespace at end of file' %
+                          (filename,))
+        return errors
+    finally:
+        data.close()
+
+
 @target('build/check-whitespace-timestamp', SRC, EXAMPLES_SRC,
         SPEC, JSDOC_SRC, precious=True)
 def build_check_whitespace_timestamp(t):
-    CR_RE = re.compile(r'\r')
-    LEADING_WHITESPACE_RE = re.compile(r'\s+')
-    TRAILING_WHITESPACE_RE = re.compile(r'\s+\n\Z')
-    NO_NEWLINE_RE = re.compile(r'[^\n]\Z')
-    ALL_WHITESPACE_RE = re.compile(r'\s+\Z')
+    keys = dict((filename, _lint_key(['whitespace'], filename))
+                for filename in t.dependencies)
+    dirty = sorted(filename for filename in t.dependencies
+                   if not lint_cache.get('whitespace', keys[filename]))
     errors = 0
-    for filename in sorted(t.newer(t.dependencies)):
-        whitespace = False
-        for lineno, line in enumerate(open(filename, 'rU')):
-            if lineno == 0 and LEADING_WHITESPACE_RE.match(line):
-                t.info('%s:%d: leading whitespace', filename, lineno + 1)
-                errors += 1
-            if CR_RE.search(line):
-                t.info('%s:%d: carriage return character in line', filename, lineno + 1)
-                errors += 1
-            if TRAILING_WHITESPACE_RE.search(line):
-                t.info('%s:%d: trailing whitespace', filename, lineno + 1)
-                errors += 1
-            if NO_NEWLINE_RE.search(line):
-                t.info('%s:%d: no newline at end of file', filename, lineno + 1)
-                errors += 1
-            whitespace = ALL_WHITESPACE_RE.match(line)
-        if whitespace:
-            t.info('%s: trailing whitespace at end of file', filename)
-            errors += 1
+    with Executor(processes=True) as executor:
+        results = executor.map(_check_whitespace, dirty)
+    for filename, file_errors in zip(dirty, results):
+        for error in file_errors:
+            t.info(error)
+        if file_errors:
+            errors += len(file_errors)
+        else:
+            lint_cache.set('whitespace', keys[filename], True)
+    lint_cache.retain('whitespace', set(keys.values()))
+    lint_cache.save()
     if errors:
         t.error('%d whitespace errors' % (errors,))
     t.touch()
 
 
-virtual('apidoc', 'build/jsdoc-%(BRANCH)s-timestamp' % vars(variables))
+virtual('apidoc',
+        lazy(lambda: 'build/jsdoc-%(BRANCH)s-timestamp' % vars(variables)))
 
 
-@target('build/jsdoc-%(BRANCH)s-timestamp' % vars(variables), 'host-resources',
-        SRC, SHADER_SRC, ifind('config/jsdoc/api/template'),
-        NPM_INSTALL)
-def jsdoc_BRANCH_timestamp(t):
-    t.run('%(JSDOC)s', 'config/jsdoc/api/index.md',
-          '-c', 'config/jsdoc/api/conf.json',
-          '-d', 'build/hosted/%(BRANCH)s/apidoc')
-    t.touch()
+@rule(r'\Abuild/jsdoc-(?P<branch>.*)-timestamp\Z')
+def jsdoc_BRANCH_timestamp(name, match):
+    def action(t):
+        t.run('%(JSDOC)s', 'config/jsdoc/api/index.md',
+              '-c', 'config/jsdoc/api/conf.json',
+              '-d', 'build/hosted/%(branch)s/apidoc' % match.groupdict())
+        t.touch()
+    dependencies = ['host-resources', SRC, SHADER_SRC,
+                    ifind('config/jsdoc/api/template'), NPM_INSTALL]
+    return Target(name, action=action, dependencies=dependencies)
 
 
 def split_example_file(example, dst_dir):
@@ -639,63 +1189,93 @@ def split_example_file(example, dst_dir):
                 found_code = True
                 target_lines.append(line)
 
-    target = open(
-        os.path.join(dst_dir, os.path.basename(example)), 'wb')
-    target_require = open(
-        os.path.join(dst_dir, os.path.basename(example)
-          .replace('.js', '-require.js')),
-        'wb')
+    basename = os.path.basename(example)
+    write_if_changed(os.path.join(dst_dir, basename), ''.join(target_lines))
+    write_if_changed(
+        os.path.join(dst_dir, basename.replace('.js', '-require.js')),
+        ''.join(target_require_lines))
+
 
-    target.writelines(target_lines)
-    target.close()
+def tree(path, prefix=''):
+    """tree returns the sources for Target.sync that copy all the files below
+    path into the directory prefix."""
+    return dict((prefix + os.path.relpath(filename, path).replace(os.sep, '/'),
+                 filename)
+                for filename in ifind(path) if os.path.isfile(filename))
 
-    target_require.writelines(target_require_lines)
-    target_require.close()
+
+def write_if_changed(path, content):
+    """write_if_changed writes content to path unless path already contains
+    it, so that the modification time of path only changes with its content.
+    It returns True if path was written."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return False
+    except IOError:
+        pass
+    with atomic_open(path) as f:
+        f.write(content)
+    return True
 
 
 @target('host-resources', phony=True)
 def host_resources(t):
-    resources_dir = 'build/hosted/%(BRANCH)s/resources'
-    t.rm_rf(resources_dir)
-    t.cp_r('resources', resources_dir)
+    t.sync('build/hosted/%(BRANCH)s/resources', tree('resources'))
 
 
 @target('host-examples', 'build', 'host-resources', 'examples', phony=True)
 def host_examples(t):
-    examples_dir = 'build/hosted/%(BRANCH)s/examples'
-    build_dir = 'build/hosted/%(BRANCH)s/build'
-    css_dir = 'build/hosted/%(BRANCH)s/css'
-    closure_lib_path = output('node', '-e',
-        'process.stdout.write(require("closure-util").getLibraryPath())')
-    t.rm_rf(examples_dir)
-    t.makedirs(examples_dir)
-    t.rm_rf(build_dir)
-    t.makedirs(build_dir)
-    t.rm_rf(css_dir)
-    t.makedirs(css_dir)
-    t.cp(EXAMPLES, examples_dir)
+    hosted_dir = 'build/hosted/%(BRANCH)s'
+    closure_lib_path = variables.CLOSURE_LIB
+    split_dir = 'build/split-examples'
+    t.makedirs(split_dir)
+    examples = {}
+    for example in EXAMPLES:
+        examples[os.path.basename(example)] = example
     for example in [path.replace('.html', '.js') for path in EXAMPLES]:
-        split_example_file(example, examples_dir % vars(variables))
-    t.cp_r('examples/data', examples_dir + '/data')
-    t.cp('bin/loader_hosted_examples.js', examples_dir + '/loader.js')
-    t.cp('build/ol.js', 'build/ol-debug.js', build_dir)
-    t.cp('build/ol.css', css_dir)
-    t.cp('examples/index.html', 'examples/example-list.js',
-         'examples/example-list.xml', 'examples/Jugl.js', examples_dir)
-    t.rm_rf('build/hosted/%(BRANCH)s/closure-library')
-    t.cp_r(closure_lib_path, 'build/hosted/%(BRANCH)s/closure-library')
-    t.rm_rf('build/hosted/%(BRANCH)s/ol')
-    t.makedirs('build/hosted/%(BRANCH)s/ol')
-    t.cp_r('src/ol', 'build/hosted/%(BRANCH)s/ol/ol')
-    t.rm_rf('build/hosted/%(BRANCH)s/ol.ext')
-    t.cp_r('build/ol.ext', 'build/hosted/%(BRANCH)s/ol.ext')
-    t.run('%(PYTHON)s', closure_lib_path + '/closure/bin/build/depswriter.py',
-          '--root_with_prefix', 'src ../../../ol',
-          '--root_with_prefix', 'build/ol.ext ../../../ol.ext',
-          '--root', 'build/hosted/%(BRANCH)s/closure-library/closure/goog',
-          '--root_with_prefix', 'build/hosted/%(BRANCH)s/closure-library/'
-          'third_party ../../third_party',
-          '--output_file', 'build/hosted/%(BRANCH)s/build/ol-deps.js')
+        split_example_file(example, split_dir)
+        for name in (os.path.basename(example),
+                     os.path.basename(example).replace('.js', '-require.js')):
+            examples[name] = os.path.join(split_dir, name)
+    examples.update(tree('examples/data', 'data/'))
+    examples['loader.js'] = 'bin/loader_hosted_examples.js'
+    for path in ('examples/index.html', 'examples/example-list.js',
+                 'examples/example-list.xml', 'examples/Jugl.js'):
+        examples[os.path.basename(path)] = path
+    t.sync(hosted_dir + '/examples', examples)
+    t.sync(hosted_dir + '/css', {'ol.css': 'build/ol.css'})
+    t.sync(hosted_dir + '/closure-library', tree(closure_lib_path))
+    t.sync(hosted_dir + '/ol', tree('src/ol', 'ol/'))
+    t.sync(hosted_dir + '/ol.ext', tree('build/ol.ext'))
+    # depswriter only reads the sources, so it is run on the originals and
+    # skipped if none of them has changed since it was last run
+    deps_file = 'build/ol-deps-hosted.js'
+    deps_args = [
+        '%(PYTHON)s', closure_lib_path + '/closure/bin/build/depswriter.py',
+        '--root_with_prefix', 'src ../../../ol',
+        '--root_with_prefix', 'build/ol.ext ../../../ol.ext',
+        '--root', closure_lib_path + '/closure/goog',
+        '--root_with_prefix', closure_lib_path + '/third_party '
+        '../../third_party',
+        '--output_file', deps_file]
+    sha1 = hashlib.sha1(repr(deps_args))
+    for path in sorted(ifind('src', 'build/ol.ext',
+                             closure_lib_path + '/closure/goog',
+                             closure_lib_path + '/third_party')):
+        if path.endswith('.js'):
+            stat = os.stat(path)
+            sha1.update('%s\0%d\0%r\0' % (path, stat.st_size, stat.st_mtime))
+    signature = sha1.hexdigest()
+    if (not os.path.exists(deps_file) or
+            state.get('depswriter', deps_file) != signature):
+        t.run(*deps_args)
+        state.set('depswriter', deps_file, signature)
+    t.sync(hosted_dir + '/build', {
+        'ol.js': 'build/ol.js',
+        'ol-debug.js': 'build/ol-debug.js',
+        'ol-deps.js': deps_file,
+    })
 
 
 @target('check-examples', 'host-examples', phony=True)
@@ -705,12 +1285,11 @@ def check_examples(t):
                 if not open(e.replace('.html', '.js'), 'rU').readline().startswith('// NOCOMPILE')]
     all_examples = [e + '?mode=advanced' for e in examples]
     # Run the examples checks in a pool of threads
-    pool = ThreadPool()
-    for example in all_examples:
-        pool.add_task(t.run, '%(PHANTOMJS)s', 'bin/check-example.js', example)
-    errors = pool.wait_completion()
-    if errors:
-        sys.exit(1)
+    with Executor() as executor:
+        for example in all_examples:
+            executor.submit(t.run, '%(PHANTOMJS)s', 'bin/check-example.js',
+                            example)
+        executor.wait()
 
 
 @target('test', NPM_INSTALL, phony=True)
@@ -772,8 +1351,36 @@ Usage:
   ./build.py [options] [target]                         (on Unix-based machines)
   <python-executable.exe> build.py [options] [target]   (on Windows machines)
 
-There is one option:
+The most common options are:
   -c               - Cleans up the repository from previous builds.
+  -d               - Only rebuilds targets whose inputs have changed content,
+                     instead of comparing file modification times only.
+  --cache=DIR|URL  - Restores the compiled builds and examples from a shared
+                     cache instead of compiling them, if their inputs have not
+                     changed.  Defaults to the PAKE_CACHE environment variable.
+  -j N             - Builds independent targets in N parallel jobs.
+  -w               - Rebuilds the given targets whenever their sources change,
+                     and reloads the pages served by the serve target that
+                     include http://localhost:35729/livereload.js.
+  --timeout=SECS   - Fails any command run by a target that takes longer.
+  -p               - Profiles the build, printing the slowest steps and the
+                     critical path and writing a Chrome trace (see
+                     chrome://tracing) to build/pake-profile.json.
+  -g               - Prints the dependency graph of the target in Graphviz
+                     format, with the time each step last took, the sizes of
+                     the files, and the steps that would run in red.
+  --why=TARGET     - Explains why TARGET would be rebuilt.
+  --what-if=FILE   - Lists the steps that a change to FILE would rerun.
+  EXAMPLES_BATCH=1 - Compiles all examples together in one batch instead of
+                     compiling each example separately.
+  NPM_CACHE=DIR    - Keeps a tarball of node_modules in DIR for each version
+                     of package.json and restores node_modules from it instead
+                     of running npm install.
+  NPM_OFFLINE=1    - Fails instead of running npm install if there is no
+                     tarball of node_modules in NPM_CACHE.
+  SHADER_STATS_THRESHOLD=X
+                   - Fails build/shader-stats.json if a shader cost exceeds
+                     its baseline by more than the fraction X (0.05).
 
 The most common targets are:
   serve            - Serves files, on port 3000.
@@ -785,10 +1392,18 @@ The most common targets are:
   check            - Runs the lint-target, builds some OpenLayers files, and
                      then runs test. Many developers call this target often
                      while working on the code.
+  ol3dem           - Builds the OpenLayers JavaScript used by the ol3-dem demo,
+                     exporting only the API that its application code uses
+                     and leaving out the Canvas, DOM, image and vector code.
+                     The build is copied to ../ol3dem-demo/js/ol3dem.js.
   help             - Shows this help.
 
 Other less frequently used targets are:
   apidoc           - Builds the API-Documentation using JSDoc3.
+  build/shader-stats.json
+                   - Estimates the texture fetches, branches, ALU instructions
+                     and inputs of every shader and variant, and fails if any
+                     of them regressed against config/shader-stats.json.
   ci               - Builds all examples in various modes and usually takes a
                      long time to finish. This target calls the following
                      targets: lint, build, build-all, test, build-examples,
@@ -1,4 +1,3 @@
-goog.require('ol.Feature');
 goog.require('ol.Map');
 goog.require('ol.View');
 goog.require('ol.layer.Tile');
@@ -2,20 +2,38 @@
 
 import collections
 import contextlib
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
 import hashlib
+import json
 import logging
+import multiprocessing
+import multiprocessing.pool
 import optparse
 import os
+import Queue
 import re
+import select
 import shutil
+import sre_constants
+import sre_parse
+import struct
 import subprocess
 import tempfile
 import sys
+import threading
 import time
+import traceback
+import types
 import urllib2
+import urlparse
 
 
 logger = logging.getLogger(__name__)
+umask = os.umask(0)
+os.umask(umask)
 
 
 if hasattr(subprocess, 'check_output'):
@@ -71,6 +89,17 @@ class DuplicateTargetError(PakeError):
         return 'duplicate target %r' % (self.target.name,)
 
 
+class TaskError(PakeError):
+
+    def __init__(self, failures):
+        self.failures = failures
+
+    def __str__(self):
+        return '%d tasks failed: %s' % (
+            len(self.failures),
+            ', '.join(description for description, _ in self.failures))
+
+
 class UnknownTargetError(PakeError):
 
     def __init__(self, name):
@@ -80,6 +109,629 @@ class UnknownTargetError(PakeError):
         return 'unknown target %r' % (self.name,)
 
 
+class ArtifactCache(object):
+    """ArtifactCache is the interface of the stores that pake uses to share the
+    outputs of cacheable targets between builds and machines.  Artifacts are
+    addressed by the signature of the target that produced them, so an
+    artifact can be reused whenever the action and the contents of the
+    dependencies are the same.  fetch restores the artifact stored under key
+    to path and returns whether it was found, and store saves the file at path
+    under key.  Neither should raise an error just because the cache is
+    unavailable: a build without the cache is slower, but still correct."""
+
+    def fetch(self, key, path):
+        """fetch writes the artifact stored under key to path, replacing path
+        in a single step, and returns True, or returns False without touching
+        path if there is no such artifact or the cache cannot be read."""
+        raise NotImplementedError
+
+    def store(self, key, path):
+        """store saves the file at path as the artifact under key.  Failures
+        to write to the cache are logged as warnings and not raised."""
+        raise NotImplementedError
+
+
+class DirectoryArtifactCache(ArtifactCache):
+    """DirectoryArtifactCache stores artifacts in a local directory, as files
+    called <key[:2]>/<key>.  Any static HTTP server serving the same directory
+    can act as an HTTPArtifactCache for other machines, for example:
+        python -m SimpleHTTPServer 8000"""
+
+    def __init__(self, directory):
+        if directory.startswith('file:'):
+            directory = urllib2.url2pathname(urlparse.urlparse(directory).path)
+        self.directory = directory
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def fetch(self, key, path):
+        try:
+            f = open(self._path(key), 'rb')
+        except IOError:
+            return False
+        with f:
+            with atomic_open(path) as dest:
+                shutil.copyfileobj(f, dest)
+        return True
+
+    def store(self, key, path):
+        try:
+            with open(path, 'rb') as f:
+                with atomic_open(self._path(key)) as dest:
+                    shutil.copyfileobj(f, dest)
+        except (IOError, OSError) as e:
+            logger.warning('cannot store %s in %s: %s', path, self.directory,
+                           e)
+
+
+class Executor(object):
+    """Executor runs the tasks of a build action in parallel on a pool of
+    worker threads or, if processes is True, worker processes.  Threads suit
+    tasks that mostly wait for commands, processes suit CPU-bound Python code
+    that would otherwise be serialized by the GIL.  Tasks run in processes
+    must be module-level functions with picklable arguments and results.  A
+    task that raises an error does not stop the others; wait reports all
+    failures together with their tracebacks.  If timeout is given, a task
+    whose result is not available timeout seconds after wait starts waiting
+    for it fails, and the workers are terminated.  For example:
+        with Executor(processes=True) as executor:
+            for filename in filenames:
+                executor.submit(check, filename)
+            results = executor.wait()"""
+
+    def __init__(self, jobs=None, processes=False, timeout=None):
+        self.jobs = jobs or multiprocessing.cpu_count()
+        self.processes = processes
+        self.timeout = timeout
+        self._pool = None
+        self._tasks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close(terminate=exc_type is not None)
+
+    def close(self, terminate=False):
+        """close shuts the workers down, terminating running tasks if
+        terminate is True."""
+        if self._pool is not None:
+            if terminate:
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def map(self, function, iterable):
+        """map calls function with each item of iterable and returns the
+        list of results."""
+        for item in iterable:
+            self.submit(function, item)
+        return self.wait()
+
+    def submit(self, function, *args, **kwargs):
+        """submit schedules function to be called with args and kwargs."""
+        if self._pool is None:
+            if self.processes:
+                self._pool = multiprocessing.Pool(self.jobs)
+            else:
+                self._pool = multiprocessing.pool.ThreadPool(self.jobs)
+        description = '%s(%s)' % (
+            function.__name__, ', '.join(repr(arg) for arg in args))
+        if len(description) > 200:
+            description = description[:197] + '...'
+        self._tasks.append((description, self._pool.apply_async(
+            run_task, (function, args, kwargs))))
+
+    def wait(self):
+        """wait waits for all submitted tasks and returns their results in
+        the order in which they were submitted.  If any task failed, it logs
+        the failures and raises TaskError."""
+        start = time.time()
+        results, failures = [], []
+        timed_out = False
+        for description, async_result in self._tasks:
+            try:
+                ok, value = async_result.get(self.timeout or 86400)
+            except multiprocessing.TimeoutError:
+                ok, value = False, 'timed out after %gs\n' % (self.timeout,)
+                timed_out = True
+            if ok:
+                results.append(value)
+            else:
+                results.append(None)
+                failures.append((description, value))
+                logger.error('%s failed:\n%s', description, value.rstrip())
+        elapsed = time.time() - start
+        if self._tasks:
+            logger.info('%d tasks in %.2fs (%.1f tasks/s, %d %s)',
+                        len(self._tasks), elapsed,
+                        len(self._tasks) / max(elapsed, 1e-3), self.jobs,
+                        'processes' if self.processes else 'threads')
+        self._tasks = []
+        if timed_out:
+            self.close(terminate=True)
+        if failures:
+            raise TaskError(failures)
+        return results
+
+
+class HTTPArtifactCache(ArtifactCache):
+    """HTTPArtifactCache fetches artifacts with GET requests for
+    <url>/<key[:2]>/<key> and stores them with PUT requests to the same URLs.
+    Servers that do not accept PUT requests act as read-only caches."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def _url(self, key):
+        return '%s/%s/%s' % (self.url, key[:2], key)
+
+    def fetch(self, key, path):
+        try:
+            response = urllib2.urlopen(self._url(key))
+        except urllib2.HTTPError as e:
+            if e.code != 404:
+                logger.warning('cannot fetch %s: %s', self._url(key), e)
+            return False
+        except urllib2.URLError as e:
+            logger.warning('cannot fetch %s: %s', self._url(key), e)
+            return False
+        with atomic_open(path) as dest:
+            shutil.copyfileobj(response, dest)
+        return True
+
+    def store(self, key, path):
+        with open(path, 'rb') as f:
+            request = urllib2.Request(self._url(key), data=f.read())
+        request.add_header('Content-Type', 'application/octet-stream')
+        request.get_method = lambda: 'PUT'
+        try:
+            urllib2.urlopen(request).close()
+        except urllib2.URLError as e:
+            logger.debug('cannot store %s: %s', self._url(key), e)
+
+
+class InotifyWatcher(object):
+    """InotifyWatcher waits for changes to a set of files using the Linux
+    inotify API.  It watches the directories containing the files, so that
+    files replaced by editors that save to a temporary file and rename it are
+    still noticed."""
+
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_TO = 0x80
+    IN_DELETE = 0x200
+    MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE
+
+    def __init__(self, paths):
+        self.paths = set(os.path.normpath(path) for path in paths)
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init failed')
+        self._dirnames = {}
+        for dirname in set(os.path.dirname(path) for path in self.paths):
+            wd = self._libc.inotify_add_watch(self._fd, dirname or '.',
+                                              self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(),
+                              'cannot watch %s' % (dirname,))
+            self._dirnames[wd] = dirname
+
+    def _read(self, timeout):
+        changed = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return changed
+        buffer = os.read(self._fd, 65536)
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = struct.unpack_from('iIII', buffer,
+                                                          offset)
+            name = buffer[offset + 16:offset + 16 + length].rstrip('\0')
+            offset += 16 + length
+            path = os.path.join(self._dirnames.get(wd, ''), name)
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+    def wait(self):
+        """wait blocks until at least one of the files changes, and returns
+        the set of changed files.  Changes that follow each other within a
+        short time, such as the files written by a checkout, are collected
+        together."""
+        changed = set()
+        while not changed:
+            changed |= self._read(None)
+        while True:
+            more = self._read(0.2)
+            if not more:
+                return changed
+            changed |= more
+
+
+class Journal(object):
+    """Journal records which target actions are running, so that the targets
+    of an interrupted run can be recognised by the next one.  An action that
+    is killed may leave a partially written target with a fresh modification
+    time, which would otherwise be taken to be up to date.  Each action is
+    recorded in an append-only file before it starts and again when it
+    finishes, and every record is flushed to disk before continuing.  Targets
+    that were started but never finished, in this or any earlier run, are
+    interrupted.  Journal is safe to use from several threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._running = None
+
+    def _load(self):
+        if self._running is None:
+            self._running = set()
+            try:
+                with open(self.path, 'rb') as f:
+                    for line in f:
+                        if not line.endswith('\n'):
+                            break
+                        record, _, name = line[:-1].partition(' ')
+                        if record == 'begin':
+                            self._running.add(name)
+                        elif record == 'end':
+                            self._running.discard(name)
+            except IOError:
+                pass
+        return self._running
+
+    def _write(self, record, name):
+        if self._file is None:
+            dirname = os.path.dirname(self.path)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            self._file = open(self.path, 'ab')
+        self._file.write('%s %s\n' % (record, name))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def begin(self, name):
+        """begin records that the action of the target called name is about
+        to start."""
+        with self._lock:
+            self._load().add(name)
+            self._write('begin', name)
+
+    def end(self, name):
+        """end records that the action of the target called name has
+        completed successfully."""
+        with self._lock:
+            self._load().discard(name)
+            self._write('end', name)
+
+    def interrupted(self, name):
+        """interrupted returns True if the action of the target called name
+        was started but did not complete."""
+        with self._lock:
+            return name in self._load()
+
+    def close(self):
+        """close compacts the journal file so that it only lists the
+        interrupted targets, and removes it if there are none."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self._running is None:
+                return
+            if self._running:
+                with atomic_open(self.path) as f:
+                    for name in sorted(self._running):
+                        f.write('begin %s\n' % (name,))
+            elif os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class Lazy(object):
+    """Lazy wraps a function that computes a value which is expensive to
+    compute and may not be needed at all, for example the output of a
+    command or the files found by ifind.  The function is called the first
+    time the value is needed, and its result is remembered.  Lazy values can
+    be stored in variables, where they are computed when the variable is read
+    or substituted, and they can be used as lists, for example as
+    dependencies of targets, which are only flattened when they are first
+    needed.  See lazy below."""
+
+    def __init__(self, function):
+        self._function = function
+        self._lock = threading.Lock()
+        self._computed = False
+        self._value = None
+
+    def value(self):
+        with self._lock:
+            if not self._computed:
+                self._value = self._function()
+                self._computed = True
+                self._function = None
+            return self._value
+
+    def __contains__(self, item):
+        return item in self.value()
+
+    def __getitem__(self, index):
+        return self.value()[index]
+
+    def __iter__(self):
+        return iter(self.value())
+
+    def __len__(self):
+        return len(self.value())
+
+    def __str__(self):
+        return str(self.value())
+
+
+class PollingWatcher(object):
+    """PollingWatcher waits for changes to a set of files by checking their
+    modification times every interval seconds.  It is used where
+    InotifyWatcher is not available."""
+
+    def __init__(self, paths, interval=1.0):
+        self.interval = interval
+        self.mtimes = dict((os.path.normpath(path), self._mtime(path))
+                           for path in paths)
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def wait(self):
+        """wait blocks until at least one of the files changes, and returns
+        the set of changed files."""
+        while True:
+            time.sleep(self.interval)
+            changed = set()
+            for path, mtime in self.mtimes.iteritems():
+                new_mtime = self._mtime(path)
+                if new_mtime != mtime:
+                    self.mtimes[path] = new_mtime
+                    changed.add(path)
+            if changed:
+                return changed
+
+
+class Profiler(object):
+    """Profiler records how long target actions and the commands that they run
+    take.  Each event has a wall clock start and end time and, where
+    available, the CPU time used.  For commands this is the CPU time of the
+    child process.  For actions it is the CPU time of pake and of all
+    commands that finished during the action, which includes other actions
+    when targets are built in parallel."""
+
+    def __init__(self):
+        self.events = []
+        self.start = time.time()
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def record(self, name, category, start, end, cpu=None, **args):
+        with self._lock:
+            thread = threading.current_thread().ident
+            tid = self._threads.setdefault(thread, len(self._threads))
+            self.events.append({
+                'name': name,
+                'cat': category,
+                'start': start,
+                'end': end,
+                'cpu': cpu,
+                'tid': tid,
+                'args': args,
+            })
+
+    def durations(self):
+        """durations returns a dict mapping the names of targets to the wall
+        clock time taken by their actions."""
+        return dict((event['name'], event['end'] - event['start'])
+                    for event in self.events if event['cat'] == 'action')
+
+    def critical_path(self, names):
+        """critical_path returns the chain of targets, starting at one of the
+        targets called names and following dependencies, whose actions took
+        the longest time in total.  No amount of parallelism can make the
+        build faster than this chain.  It returns a pair of the total time and
+        the list of (name, duration) pairs along the chain."""
+        durations = self.durations()
+        costs = {}
+
+        def cost(target):
+            if target.name not in costs:
+                costs[target.name] = (0, None)  # guards against cycles
+                best = (0, None)
+                for dependency in target.dependencies:
+                    dependency = targets.get(dependency)
+                    best = max(best, (cost(dependency), dependency))
+                costs[target.name] = (
+                    durations.get(target.name, 0) + best[0], best[1])
+            return costs[target.name][0]
+
+        root = max((cost(targets.get(name)), targets.get(name))
+                   for name in names)[1]
+        path = []
+        while root is not None:
+            path.append((root.name, durations.get(root.name, 0)))
+            root = costs[root.name][1]
+        return sum(duration for name, duration in path), path
+
+    def write_trace(self, path):
+        """write_trace writes the events in the Chrome trace event format, as
+        understood by chrome://tracing, to the file at path."""
+        pid = os.getpid()
+        events = []
+        for event in self.events:
+            args = dict(event['args'])
+            if event['cpu'] is not None:
+                args['cpu'] = round(event['cpu'], 6)
+            events.append({
+                'name': event['name'],
+                'cat': event['cat'],
+                'ph': 'X',
+                'ts': int((event['start'] - self.start) * 1e6),
+                'dur': int((event['end'] - event['start']) * 1e6),
+                'pid': pid,
+                'tid': event['tid'],
+                'args': args,
+            })
+        with atomic_open(path) as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def summarize(self, names):
+        """summarize logs the total time and the slowest actions and commands,
+        followed by the critical path through the targets called names."""
+        events = sorted(self.events, key=lambda e: e['start'] - e['end'])
+        logger.info('profile: %.2fs wall clock, %d actions, %d commands',
+                    time.time() - self.start,
+                    sum(1 for e in events if e['cat'] == 'action'),
+                    sum(1 for e in events if e['cat'] == 'run'))
+        for event in events[:10]:
+            cpu = event['cpu']
+            logger.info('profile: %8.2fs wall %8s cpu  %s %s',
+                        event['end'] - event['start'],
+                        '%.2fs' % (cpu,) if cpu is not None else '-',
+                        event['cat'], event['name'])
+        total, path = self.critical_path(names)
+        logger.info('profile: critical path %.2fs', total)
+        for name, duration in reversed(path):
+            if duration:
+                logger.info('profile: %8.2fs  %s', duration, name)
+
+
+class RuleCollection(object):
+    """RuleCollection holds the regular expressions registered with @rule and
+    finds the rules matching a name without trying every regular expression.
+    The literal text that an anchored pattern must start or end with is
+    extracted when the rule is added, and rules are indexed by the text that
+    they start with.  Looking up a name then only tries the rules whose
+    literal prefix and suffix fit the name.  Patterns without a literal
+    prefix, for example patterns that are not anchored with \\A or that start
+    with an alternation, are tried for every name."""
+
+    def __init__(self):
+        self._rules = []
+        self._by_prefix = collections.defaultdict(list)
+        self._prefix_lengths = []
+
+    def __len__(self):
+        return len(self._rules)
+
+    def add(self, pattern, function):
+        regexp = re.compile(pattern)
+        prefix, suffix = '', ''
+        if not regexp.flags & re.IGNORECASE:
+            items = list(sre_parse.parse(pattern))
+            if items[:1] == [(sre_constants.AT,
+                              sre_constants.AT_BEGINNING_STRING)]:
+                prefix = self._literal(items[1:])
+            if items[-1:] == [(sre_constants.AT,
+                               sre_constants.AT_END_STRING)]:
+                suffix = self._literal(reversed(items[:-1]), reverse=True)
+        self._rules.append((regexp, function))
+        self._by_prefix[prefix].append((suffix, regexp, function))
+        if len(prefix) not in self._prefix_lengths:
+            self._prefix_lengths.append(len(prefix))
+            self._prefix_lengths.sort()
+
+    def _literal(self, items, reverse=False):
+        """_literal returns the literal characters at the start of items,
+        which are the parsed elements of a regular expression, or the end of
+        items if they are reversed."""
+        chars = []
+        for op, av in items:
+            if op == sre_constants.LITERAL and av < 128:
+                chars.append(chr(av))
+            elif op == sre_constants.SUBPATTERN:
+                subitems = list(av[-1])
+                if reverse:
+                    subitems.reverse()
+                literal = self._literal(subitems, reverse)
+                chars.extend(reversed(literal) if reverse else literal)
+                if len(literal) < len(subitems):
+                    break
+            else:
+                break
+        if reverse:
+            chars.reverse()
+        return ''.join(chars)
+
+    def match(self, name):
+        """match yields a (match object, function) pair for every rule
+        matching name."""
+        for length in self._prefix_lengths:
+            if length > len(name):
+                break
+            for suffix, regexp, function in self._by_prefix.get(name[:length],
+                                                                 ()):
+                if not name.endswith(suffix):
+                    continue
+                match = regexp.search(name)
+                if match:
+                    yield match, function
+
+
+class State(object):
+    """State is a small persistent store for information that pake keeps
+    between invocations, such as the digests of files and the signatures of
+    targets.  It is organised in sections of keys and values, loaded from a
+    JSON file on first use and written back atomically by save.  State is safe
+    to use from several threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._data = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._data is None:
+            try:
+                with open(self.path, 'rb') as f:
+                    self._data = json.load(f)
+            except (IOError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, section, key, default=None):
+        with self._lock:
+            return self._load().get(section, {}).get(key, default)
+
+    def set(self, section, key, value):
+        with self._lock:
+            data = self._load()
+            if data.get(section, {}).get(key) != value:
+                data.setdefault(section, {})[key] = value
+                self._dirty = True
+
+    def retain(self, section, keys):
+        """retain removes the keys of section that are not in keys."""
+        with self._lock:
+            values = self._load().get(section, {})
+            for key in values.keys():
+                if key not in keys:
+                    del values[key]
+                    self._dirty = True
+
+    def save(self):
+        """save writes the state back to its file, if it has changed."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with atomic_open(self.path) as f:
+                json.dump(self._data, f, sort_keys=True)
+            self._dirty = False
+
+
 class Target(object):
     """Target is the core object of pake.  It includes all of the target's name
     (which may or may not correspond to a real file in the filesystem, see the
@@ -87,44 +739,161 @@ class Target(object):
     when this target is to be rebuilt, its dependencies, and various other
     metadata."""
 
-    def __init__(self, name, action=None, clean=True, dependencies=(),
-                 help=None, help_group=None, makedirs=True, phony=False,
-                 precious=False):
+    def __init__(self, name, action=None, cacheable=False, clean=True,
+                 dependencies=(), help=None, help_group=None, makedirs=True,
+                 phony=False, precious=False, restat=False):
         self.name = name
         self.action = action
+        self.cacheable = cacheable
         self._clean = clean
-        self.dependencies = list(flatten(dependencies))
+        self._dependencies = dependencies
+        self._flat_dependencies = None
         self.help = help
         self.help_group = help_group
         self._makedirs = makedirs
         self.phony = phony
         self.precious = precious
+        self.restat = restat
         self.logger = logging.getLogger(self.name)
         self.timestamp = None
+        self.unchanged = None
+        self._signature = None
+        self._inputs = None
+
+    @property
+    def dependencies(self):
+        """dependencies is the flattened list of the names of the target's
+        dependencies.  It is only computed when it is first used, so that
+        Lazy lists of dependencies are not evaluated for targets that are not
+        built."""
+        if self._flat_dependencies is None:
+            self._flat_dependencies = list(flatten(self._dependencies))
+        return self._flat_dependencies
 
     def build(self, dry_run=False):
         timestamp = 0
         for dependency in self.dependencies:
             target = targets.get(dependency)
             timestamp = max(timestamp, target.build(dry_run=dry_run))
+        return self.update(timestamp, dry_run=dry_run)
+
+    def update(self, timestamp, dry_run=False):
+        """update brings the target itself up to date, given the newest
+        timestamp of its dependencies, and returns the target's timestamp.
+        Unlike build, it does not build the dependencies, which must already
+        be up to date.  This lets build_parallel schedule the dependencies
+        itself."""
         self.debug('build')
         if self.timestamp is None:
-            if not self.phony and os.path.exists(self.name):
-                self.timestamp = os.stat(self.name).st_mtime
-            else:
+            if self.phony or not os.path.exists(self.name):
+                self.timestamp = -1
+            elif journal.interrupted(self.name):
+                self.info('interrupted by an earlier run')
                 self.timestamp = -1
-        if self.timestamp < timestamp:
+            else:
+                self.timestamp = os.stat(self.name).st_mtime
+                if self.restat:
+                    self.unchanged = self.restated()
+        if self.timestamp < timestamp and self.unchanged < timestamp:
+            cache = artifact_cache if self.cacheable else None
+            signature = None
+            if (use_digests or cache) and not dry_run:
+                signature = self.signature()
+            if (signature is not None and os.path.exists(self.name) and
+                    state.get('signatures', self.name) == signature and
+                    not journal.interrupted(self.name)):
+                # The contents of the dependencies and the action are
+                # unchanged, so the target keeps its own, older timestamp and
+                # does not cause its dependents to be rebuilt either.
+                self.debug('unchanged %s', signature)
+                self.unchanged = timestamp
+                return self.timestamp
             self.debug('action')
             if self._makedirs and not dry_run:
                 self.makedirs(os.path.dirname(self.name))
-            if self.action:
+            if (cache and signature is not None and
+                    cache.fetch(signature, self.name)):
+                self.info('restored from cache %s', signature)
+            elif self.action:
                 if self.action.__doc__:
                     self.info(self.action.__doc__)
                 if not dry_run:
+                    if not self.phony:
+                        journal.begin(self.name)
+                    start, cpu = time.time(), cpu_time()
                     self.action(self)
+                    end = time.time()
+                    if profiler is not None:
+                        profiler.record(self.name, 'action', start, end,
+                                        cpu_time() - cpu)
+                    state.set('durations', self.name, round(end - start, 3))
+                    if cache and signature is not None:
+                        cache.store(signature, self.name)
+            if (not dry_run and not self.phony and
+                    journal.interrupted(self.name)):
+                journal.end(self.name)
+            if signature is not None:
+                state.set('signatures', self.name, signature)
+                input_index.set('inputs', self.name, self._inputs)
+            if (self.restat and not dry_run and self.timestamp != -1 and
+                    os.path.exists(self.name) and
+                    os.stat(self.name).st_mtime == self.timestamp):
+                # The action left the target as it was, so it keeps its
+                # older timestamp and its dependents are not rebuilt.  The
+                # timestamp of the dependencies is recorded so that the
+                # action does not run again in the next invocation either.
+                self.debug('restat unchanged')
+                self.unchanged = timestamp
+                state.set('restat', self.name, [self.timestamp, timestamp])
+                return self.timestamp
             self.timestamp = timestamp or time.time()
         return self.timestamp
 
+    def restated(self):
+        """restated returns the newest timestamp of the dependencies for
+        which the action of a restat target last left the target unchanged,
+        or None if the target has changed since."""
+        record = state.get('restat', self.name)
+        if record is None or record[0] != os.stat(self.name).st_mtime:
+            return None
+        return record[1]
+
+    def _call(self, args, timeout=None, **kwargs):
+        """_call runs the command args with the keyword arguments of
+        subprocess.Popen, records it in the profiler and raises
+        subprocess.CalledProcessError if it fails.  If the command is still
+        running after timeout seconds, or after the time set with the
+        --timeout option, it is killed and the target fails."""
+        if timeout is None:
+            timeout = default_timeout
+        start = time.time()
+        process = subprocess.Popen(args, **kwargs)
+        timer = None
+        timed_out = []
+        if timeout:
+            def kill():
+                timed_out.append(True)
+                try:
+                    process.kill()
+                except OSError:  # the process has just exited
+                    pass
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+        try:
+            returncode, cpu = wait(process)
+        finally:
+            if timer is not None:
+                timer.cancel()
+                timer.join()
+        if profiler is not None:
+            profiler.record(' '.join(args), 'run', start, time.time(), cpu,
+                            target=self.name)
+        if timed_out:
+            self.clean(recurse=False)
+            self.error('%s timed out after %gs' % (' '.join(args), timeout))
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, args)
+
     @contextlib.contextmanager
     def chdir(self, dir):
         cwd = os.getcwd()
@@ -171,20 +940,36 @@ class Target(object):
             raise BuildError(self, 'corrupt download')
         if sha1 and hashlib.sha1(content).hexdigest() != sha1:
             raise BuildError(self, 'corrupt download')
-        with open(self.name, 'wb') as f:
+        with atomic_open(self.name) as f:
             f.write(content)
 
     def error(self, message):
         raise BuildError(self, message)
 
-    def graph(self, f, visited):
+    def graph(self, f, visited, reasons=None):
+        """graph writes the target and its dependencies in Graphviz format
+        to f.  Each target is labelled with the time its action took when it
+        last ran and with its size.  The targets that would be rebuilt, given
+        by the reasons returned by stale, are drawn in red with the reason as
+        their tooltip."""
         if self in visited:
             return
         visited.add(self)
+        label = self.name
+        duration = state.get('durations', self.name)
+        if duration is not None:
+            label += '\\n%.2fs' % (duration,)
+        if not self.phony and os.path.isfile(self.name):
+            label += '\\n%d bytes' % (os.path.getsize(self.name),)
+        attributes = 'label="%s"' % (label,)
+        if reasons and reasons.get(self):
+            attributes += ', color=red, tooltip="%s"' % (
+                reasons[self][0].replace('"', '\\"'),)
+        f.write('\t"%s" [%s];\n' % (self.name, attributes))
         for dependency in self.dependencies:
             target = targets.get(dependency)
             f.write('\t"%s" -> "%s";\n' % (self.name, target.name))
-            target.graph(f, visited)
+            target.graph(f, visited, reasons)
 
     def info(self, *args, **kwargs):
         self.logger.info(*args, **kwargs)
@@ -193,7 +978,12 @@ class Target(object):
         path = path % vars(variables)
         if path and not os.path.exists(path):
             self.info('mkdir -p %s', path)
-            os.makedirs(path)
+            try:
+                os.makedirs(path)
+            except OSError:
+                # another job may have created it in the meantime
+                if not os.path.isdir(path):
+                    raise
 
     def newer(self, *args):
         args = flatten_expand_list(args)
@@ -207,16 +997,28 @@ class Target(object):
             def ofile(t):
                 t.output('echo', '123')
         After this target's action is executed, ofile will contain the string
-        "123"."""
+        "123".  The output of the command is streamed to a temporary file,
+        which replaces the target only if the command succeeds, so the target
+        is never left half written.  Like run, output accepts a timeout in
+        seconds."""
         args = flatten_expand_list(args)
         self.info(' '.join(args))
         try:
-            output = check_output(args, **kwargs)
-            with open(self.name, 'wb') as f:
-                f.write(output)
+            with atomic_open(self.name) as f:
+                self._call(args, stdout=f, **kwargs)
+                size = os.fstat(f.fileno()).st_size
         except subprocess.CalledProcessError as e:
             self.clean(recurse=False)
             self.error(e)
+        self.info('wrote %d bytes', size)
+
+    def reset(self):
+        """reset forgets everything that the target has learned about itself
+        during this invocation, so that the next build checks it again."""
+        self.timestamp = None
+        self.unchanged = None
+        self._signature = None
+        self._inputs = None
 
     def rm_rf(self, *args):
         """rm_rf recursively deletes the files and/or directories passed to
@@ -227,14 +1029,138 @@ class Target(object):
             shutil.rmtree(arg, ignore_errors=True)
 
     def run(self, *args, **kwargs):
+        """run runs the command passed to it, failing the target if the
+        command fails.  The keyword arguments are passed to subprocess.Popen,
+        except for timeout, which kills the command and fails the target if
+        it runs for longer than the given number of seconds."""
         args = flatten_expand_list(args)
         self.info(' '.join(args))
         try:
-            subprocess.check_call(args, **kwargs)
+            self._call(args, **kwargs)
         except subprocess.CalledProcessError as e:
             self.clean(recurse=False)
             self.error(e)
 
+    def signature(self):
+        """signature returns a digest of everything that determines the
+        result of the target's action: the target's name, the fingerprint of
+        the action, the contents of all dependencies and, for dependencies
+        that are built by actions themselves, their signatures.  The latter
+        means that timestamp files such as build/npm-install-timestamp stand
+        for the inputs of their actions.  signature returns None if the target
+        cannot be described by the contents of files, for example because it
+        or one of its dependencies is phony.  The signature only depends on
+        the inputs of the target, so it is computed once per invocation."""
+        if self._signature is None:
+            self._signature = self._compute_signature() or ''
+        return self._signature or None
+
+    def _compute_signature(self):
+        if self.phony:
+            return None
+        # _inputs records what went into the signature, so that --why can
+        # tell which input changed
+        inputs = {}
+        sha1 = hashlib.sha1()
+        sha1.update(self.name)
+        action_fingerprint = fingerprint(self.action)
+        sha1.update(action_fingerprint)
+        inputs[''] = hashlib.sha1(action_fingerprint).hexdigest()[:12]
+        for dependency in self.dependencies:
+            target = targets.get(dependency)
+            if target.phony or not os.path.isfile(target.name):
+                return None
+            sha1.update('\0%s\0%s' % (target.name, digest(target.name)))
+            inputs[target.name] = digest(target.name)[:12]
+            if target.action:
+                signature = target.signature()
+                if signature is None:
+                    return None
+                sha1.update(signature)
+                inputs[target.name] += signature[:12]
+        self._inputs = inputs
+        return sha1.hexdigest()
+
+    @contextlib.contextmanager
+    def staging(self):
+        """staging yields a temporary path next to the target for commands
+        that write the target themselves, for example:
+            with t.staging() as path:
+                t.run('node', 'tasks/build.js', config, path)
+        When the nested block of code completes the temporary file is renamed
+        to the target, so the target is replaced in a single step and is
+        never left partially written.  However the nested block of code
+        exits, the temporary file is removed."""
+        dirname, basename = os.path.split(self.name)
+        path = os.path.join(dirname, '.%s.staging' % (basename,))
+        if os.path.exists(path):
+            os.remove(path)  # left behind by an interrupted run
+        try:
+            yield path
+            self.debug('mv %s %s', path, self.name)
+            if os.name == 'nt' and os.path.exists(self.name):
+                os.remove(self.name)
+            os.rename(path, self.name)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def sync(self, dest, sources):
+        """sync makes the directory dest contain exactly the files in
+        sources, a dict mapping paths relative to dest to the files that
+        should be there.  Files that are already up to date, because they are
+        hard links to their source or have the same size and modification
+        time, are left alone.  The others are hard linked to their source if
+        both are on the same filesystem, and copied otherwise.  Files in dest
+        that are not in sources are deleted.  This makes republishing a large
+        tree after a small change cheap, for example:
+            t.sync('build/hosted/%(BRANCH)s/ol', {'ol.js': 'build/ol.js'})"""
+        dest, = flatten_expand_list(dest)
+        wanted = set(os.path.normpath(os.path.join(dest, relpath))
+                     for relpath in sources)
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(dest, topdown=False):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if os.path.normpath(path) not in wanted:
+                    os.remove(path)
+                    removed += 1
+            if dirpath != dest and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+        linked = copied = 0
+        for relpath in sorted(sources):
+            source = sources[relpath]
+            path = os.path.join(dest, relpath)
+            source_stat = os.stat(source)
+            try:
+                path_stat = os.stat(path)
+            except OSError:
+                pass
+            else:
+                if ((path_stat.st_dev, path_stat.st_ino) ==
+                        (source_stat.st_dev, source_stat.st_ino)):
+                    continue
+                if (path_stat.st_size == source_stat.st_size and
+                        abs(path_stat.st_mtime - source_stat.st_mtime) < 1e-3):
+                    continue
+            self.makedirs(os.path.dirname(path))
+            tmp = os.path.join(os.path.dirname(path),
+                               '.%s.sync' % (os.path.basename(path),))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            try:
+                os.link(source, tmp)
+                linked += 1
+            except (AttributeError, OSError):
+                shutil.copy2(source, tmp)
+                copied += 1
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp, path)
+        self.info('sync %s: %d linked, %d copied, %d removed, %d unchanged',
+                  dest, linked, copied, removed,
+                  len(sources) - linked - copied)
+
     @contextlib.contextmanager
     def tempdir(self):
         """tempdir creates a temporary directory, changes to it, and runs the
@@ -268,10 +1194,11 @@ class Target(object):
 class TargetCollection(object):
     """TargetCollection implements a namespace for looking up build targets.
     TargetCollection will first look for rules that match exactly, and then
-    - if no match is found - search through a list of regular expression-based
-    rules.  As soon as a regular expression match is found, that rule is added
-    to the list of rules that match exactly.  Typically, an invocation of pake
-    will only create a single TargetCollection."""
+    - if no match is found - search through the regular expression-based
+    rules, which are kept in a RuleCollection.  As soon as a regular
+    expression match is found, that rule is added to the list of rules that
+    match exactly.  Typically, an invocation of pake will only create a single
+    TargetCollection."""
 
     def __init__(self):
         self.default = None
@@ -291,18 +1218,19 @@ class TargetCollection(object):
         """get searches for a target.  If it already exists, it is returned.
         Otherwise, get searches through the defined rules, trying to find a
         rule that matches.  If it finds a matching rule, a concrete target is
-        instantiated, cached, and returned.  If no match is found, a virtual
+        instantiated, cached, and returned.  A rule may also decline a name
+        that it matches by returning None.  If no match is found, a virtual
         precious target is instantiated and returned."""
         if name in self.targets:
             return self.targets[name]
         target = None
-        for regexp, f in rules.iteritems():
-            match = regexp.search(name)
-            if not match:
+        for match, f in rules.match(name):
+            rule_target = f(name, match)
+            if rule_target is None:
                 continue
             if target is not None:
                 raise AmbiguousRuleError(name)
-            target = f(name, match)
+            target = rule_target
         if target is None:
             if os.path.exists(name):
                 target = Target(name, precious=True)
@@ -339,25 +1267,66 @@ class VariableCollection(object):
         vc.FOO = 2    # Further sets of the property FOO are ignored, and do
                       # not raise an error.  After this statement, vc.FOO is
                       # still 1.
-        print vc.FOO  # Prints "1" """
+        print vc.FOO  # Prints "1"
+    Values can be Lazy, in which case they are computed the first time that
+    they are read, either as attributes or through vars(vc):
+        vc.BAR = lazy(lambda: output('uname', '-a'))
+        print '%(BAR)s' % vars(vc)  # Only now runs uname -a """
 
     def __init__(self, **kwargs):
         for key, value in kwargs.iteritems():
             setattr(self, key, value)
 
+    def __getattribute__(self, key):
+        value = object.__getattribute__(self, key)
+        if isinstance(value, Lazy):
+            value = value.value()
+        return value
+
     def __setattr__(self, key, value):
         """Only set an attribute if it has not already been set.  First to set
         the value is the winner."""
-        if not hasattr(self, key):
+        if key not in vars(self):
             object.__setattr__(self, key, value)
 
 
 # targets is the single TargetCollection instance created for this invokation
 # of pake
 targets = TargetCollection()
-# rules is a dict of regular expressions to @rules where dynamically created
-# rules are registered.
-rules = {}
+# artifact_cache is the ArtifactCache for cacheable targets, set by the --cache
+# option, or None
+artifact_cache = None
+# artifact_cache_types maps URL schemes to the ArtifactCache classes that
+# open_artifact_cache uses for them
+artifact_cache_types = {
+    '': DirectoryArtifactCache,
+    'file': DirectoryArtifactCache,
+    'http': HTTPArtifactCache,
+    'https': HTTPArtifactCache,
+}
+# profiler is the Profiler enabled by the --profile option, or None
+profiler = None
+# rules is the RuleCollection where dynamically created rules are registered
+# by @rule
+rules = RuleCollection()
+# state is the persistent state of pake, shared by all invocations in the same
+# directory
+state = State('build/pake-state.json')
+# input_index records the digests of the inputs of each target with a
+# signature, so that --why can tell which of them changed
+input_index = State('build/pake-inputs.json')
+# journal records the target actions that are running, so that targets left
+# partially written by an interrupted run are rebuilt
+journal = Journal('build/pake-journal')
+# default_timeout is the number of seconds after which commands run by
+# Target.run and Target.output are killed, set by the --timeout option
+default_timeout = None
+# directory_index caches the listings of the directories walked by ifind
+directory_index = State('build/pake-directories.json')
+# use_digests is set by the --digest option.  When it is set, targets whose
+# dependencies are newer than themselves are only rebuilt if the contents of
+# their dependencies or their actions have changed since the last build.
+use_digests = False
 # variables is the global set of substitution variables, where the first setter
 # takes priority.  The priority order is:
 # 1. Environment variables
@@ -366,6 +1335,176 @@ rules = {}
 variables = VariableCollection(**os.environ)
 
 
+@contextlib.contextmanager
+def atomic_open(path):
+    """atomic_open opens a temporary file next to path for writing, and
+    renames it to path when the nested block of code completes.  If the block
+    raises an error the temporary file is removed and path is left untouched,
+    so readers never see a partially written file."""
+    dirname = os.path.dirname(path)
+    if dirname and not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            if not os.path.isdir(dirname):
+                raise
+    fd, tmp = tempfile.mkstemp(dir=dirname or '.',
+                               prefix='.%s.' % (os.path.basename(path),))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            yield f
+        # mkstemp creates private files, give path the usual permissions
+        os.chmod(tmp, 0666 & ~umask)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+    except:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def build_parallel(names, jobs, dry_run=False):
+    """build_parallel builds the targets called names, and all of their
+    dependencies, using a pool of jobs worker threads.  The target graph is
+    resolved up front and each target is started as soon as all of its
+    dependencies are up to date, so independent targets such as build/ol.js
+    and build/ol-debug.js are built concurrently.  When an action fails no new
+    targets are started, the actions that are already running are allowed to
+    finish, and then the first error is re-raised.
+    Actions run concurrently, so they must not rely on process-wide state
+    such as the current directory changed by Target.chdir."""
+    dependencies, dependents = graph(names)
+    waiting = dict((target, len(dependencies[target]))
+                   for target in dependencies)
+    ready = [target for target, count in waiting.iteritems() if count == 0]
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+
+    def worker():
+        while True:
+            target = tasks.get()
+            if target is None:
+                return
+            timestamp = 0
+            for dependency in dependencies[target]:
+                timestamp = max(timestamp, dependency.timestamp)
+            try:
+                target.update(timestamp, dry_run=dry_run)
+            except Exception:
+                results.put((target, sys.exc_info()))
+            else:
+                results.put((target, None))
+
+    threads = [threading.Thread(target=worker, name='pake-%d' % (i,))
+               for i in xrange(jobs)]
+    for thread in threads:
+        thread.start()
+    exc_info = None
+    remaining = len(dependencies)
+    running = 0
+    try:
+        while True:
+            while ready and exc_info is None:
+                tasks.put(ready.pop())
+                running += 1
+            if not running:
+                break
+            # A timeout keeps the wait interruptible by Ctrl-C
+            try:
+                target, error = results.get(True, 1)
+            except Queue.Empty:
+                continue
+            running -= 1
+            remaining -= 1
+            if error is not None:
+                if exc_info is None:
+                    exc_info = error
+                continue
+            for dependent in dependents[target]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    ready.append(dependent)
+    finally:
+        for thread in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+    if exc_info is not None:
+        raise exc_info[0], exc_info[1], exc_info[2]
+    if remaining:
+        raise PakeError('dependency cycle between %s' % (', '.join(
+            sorted(target.name for target in waiting if waiting[target])),))
+
+
+def cpu_time():
+    """cpu_time returns the CPU time used by pake and its finished child
+    processes so far."""
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+def digest(path):
+    """digest returns the SHA-1 digest of the contents of the file at path.
+    Digests are cached in state by modification time and size, so files that
+    have not changed since the last invocation are not read again."""
+    st = os.stat(path)
+    cached = state.get('digests', path)
+    if cached and cached[:2] == [st.st_mtime, st.st_size]:
+        return cached[2]
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            sha1.update(chunk)
+    hexdigest = sha1.hexdigest()
+    state.set('digests', path, [st.st_mtime, st.st_size, hexdigest])
+    return hexdigest
+
+
+def fingerprint(function):
+    """fingerprint returns a digest that identifies the code of function: its
+    bytecode, its constants, the values captured in its closure, and the
+    current values of all variables that its strings substitute with
+    %(NAME)s.  Changing any of these, for example a command line argument in
+    a target's action, changes the fingerprint."""
+    parts = []
+    names = set()
+    visited = set()
+
+    def visit(value):
+        if id(value) in visited:
+            return
+        visited.add(id(value))
+        if isinstance(value, types.CodeType):
+            parts.append(value.co_code)
+            parts.append(repr(value.co_names))
+            for const in value.co_consts:
+                visit(const)
+        elif isinstance(value, types.FunctionType):
+            visit(value.func_code)
+            for cell in value.func_closure or ():
+                try:
+                    visit(cell.cell_contents)
+                except ValueError:  # empty cell
+                    pass
+        elif isinstance(value, (list, tuple)):
+            for element in value:
+                visit(element)
+        elif isinstance(value, basestring):
+            parts.append(repr(value))
+            names.update(re.findall(r'%\((\w+)\)s', value))
+        elif isinstance(value, (bool, float, int, long, types.NoneType)):
+            parts.append(repr(value))
+        else:
+            # Other objects have no stable representation
+            parts.append(type(value).__name__)
+
+    visit(function)
+    for name in sorted(names):
+        parts.append('%s=%r' % (name, getattr(variables, name, None)))
+    return hashlib.sha1('\0'.join(parts)).hexdigest()
+
+
 def flatten(*args):
     """flatten takes a variable number of arguments, each of which may or may
     be not be a collection.Iterable, and yields the elements of each in
@@ -373,6 +1512,8 @@ def flatten(*args):
     collection.  For example, flatten(1, [2, (3, 4), 5], 6) yields 1, 2, 3, 4,
     5, 6."""
     for arg in args:
+        if isinstance(arg, Lazy):
+            arg = arg.value()
         if (isinstance(arg, collections.Iterable) and
                 not isinstance(arg, basestring)):
             for element in flatten(*arg):
@@ -387,31 +1528,126 @@ def flatten_expand_list(*args):
     return list(arg % vars(variables) for arg in flatten(args))
 
 
-def ifind(*paths):
+def graph(names):
+    """graph resolves the targets called names and all of their dependencies,
+    and returns a pair of dicts.  The first maps each target to the set of
+    its dependencies, the second maps each target to the list of targets that
+    depend on it."""
+    dependencies = {}
+    dependents = collections.defaultdict(list)
+    stack = [targets.get(name) for name in names]
+    while stack:
+        target = stack.pop()
+        if target in dependencies:
+            continue
+        dependencies[target] = set(targets.get(dependency)
+                                   for dependency in target.dependencies)
+        for dependency in dependencies[target]:
+            dependents[dependency].append(target)
+            stack.append(dependency)
+    return dependencies, dependents
+
+
+def ifind(*paths, **kwargs):
     """ifind is an iterative version of os.walk, yielding all walked paths and
-    normalizing paths to use forward slashes."""
+    normalizing paths to use forward slashes.  Directories are listed with
+    listdir, so unchanged directories are read from directory_index instead of
+    the filesystem.  The optional prune keyword argument is a list of glob
+    patterns; directories whose name or path matches any of them are not
+    walked.  For example:
+        ifind('.', prune=['node_modules', 'build/hosted'])"""
+    prune = kwargs.pop('prune', ())
+    if kwargs:
+        raise TypeError('unexpected keyword arguments %r' % (kwargs.keys(),))
     for path in paths:
-        for dirpath, dirnames, names in os.walk(path):
+        stack = [path]
+        while stack:
+            dirpath = stack.pop()
+            dirnames, names = listdir(dirpath)
             for name in names:
                 if os.sep == '/':
                     yield os.path.join(dirpath, name)
                 else:
                     yield '/'.join(dirpath.split(os.sep) + [name])
+            for dirname in reversed(dirnames):
+                subdir = os.path.join(dirpath, dirname)
+                normpath = os.path.normpath(subdir).replace(os.sep, '/')
+                if any(fnmatch.fnmatch(dirname, pattern) or
+                       fnmatch.fnmatch(normpath, pattern)
+                       for pattern in prune):
+                    continue
+                stack.append(subdir)
+
+
+def lazy(function):
+    """lazy returns a Lazy value computed by calling function without
+    arguments when it is first needed.  For example:
+        SRC = lazy(lambda: [path for path in ifind('src')
+                            if path.endswith('.js')])
+    Nothing is walked until a target that depends on SRC is built."""
+    return Lazy(function)
+
+
+def listdir(path):
+    """listdir returns the sorted names of the subdirectories and of the other
+    entries of the directory path, as a pair of lists.  Like os.walk, it does
+    not report symbolic links to directories as subdirectories.  Listings are
+    cached in directory_index by the modification time of the directory,
+    which changes whenever an entry is added, removed or renamed."""
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return [], []
+    cached = directory_index.get('directories', path)
+    if cached and cached[0] == mtime:
+        return cached[1], cached[2]
+    dirnames, names = [], []
+    for name in sorted(os.listdir(path)):
+        fullname = os.path.join(path, name)
+        if not os.path.isdir(fullname):
+            names.append(name)
+        elif not os.path.islink(fullname):
+            dirnames.append(name)
+    # A directory modified in the last moments may be modified again without
+    # its modification time changing, so only cache older directories.
+    if time.time() - mtime > 2:
+        directory_index.set('directories', path, [mtime, dirnames, names])
+    return dirnames, names
 
 
 def main(argv=sys.argv):
+    global artifact_cache, default_timeout, profiler, use_digests
     option_parser = optparse.OptionParser()
     option_parser.add_option('-c', '--clean',
                              action='store_true')
+    option_parser.add_option('--cache',
+                             metavar='DIRECTORY|URL')
+    option_parser.add_option('-d', '--digest',
+                             action='store_true')
     option_parser.add_option('-g', '--graph',
                              action='store_true')
+    option_parser.add_option('-j', '--jobs',
+                             type='int')
+    option_parser.add_option('--livereload',
+                             metavar='URL')
     option_parser.add_option('-n', '--dry-run', '--just-print', '--recon',
                              action='store_true')
+    option_parser.add_option('-p', '--profile',
+                             action='store_true')
     option_parser.add_option('-r', '--really',
                              action='store_true')
+    option_parser.add_option('--timeout',
+                             metavar='SECONDS', type='float')
     option_parser.add_option('-v', '--verbose',
                              action='count', dest='logging_level')
-    option_parser.set_defaults(logging_level=0)
+    option_parser.add_option('-w', '--watch',
+                             action='store_true')
+    option_parser.add_option('--what-if',
+                             metavar='FILE')
+    option_parser.add_option('--why',
+                             metavar='TARGET')
+    option_parser.set_defaults(cache=os.environ.get('PAKE_CACHE'), jobs=1,
+                               logging_level=0)
     option_parser.format_epilog = targets.format_epilog
     options, args = option_parser.parse_args(argv[1:])
     logging.basicConfig(format='%(asctime)s %(name)s: %(message)s',
@@ -421,7 +1657,7 @@ def main(argv=sys.argv):
         match = re.match(r'(?P<key>\w+)=(?P<value>.*)\Z', arg)
         if match:
             key, value = match.group('key', 'value')
-            if not hasattr(variables, key):
+            if key not in vars(variables):
                 logger.error('%s is not a variable', key)
             logger.debug('%s=%r', key, value)
             object.__setattr__(variables, key, value)
@@ -429,20 +1665,68 @@ def main(argv=sys.argv):
         targets_.append(arg)
     if not targets_:
         targets_ = (targets.default.name,)
+    use_digests = options.digest
+    default_timeout = options.timeout
+    if options.cache:
+        artifact_cache = open_artifact_cache(options.cache)
+    if options.profile:
+        profiler = Profiler()
     try:
-        for target in targets_:
-            target = targets.get(target)
-            if options.clean:
-                target.clean(really=options.really, recurse=True)
-            elif options.graph:
-                sys.stdout.write('digraph "%s" {\n' % (target.name,))
-                target.graph(sys.stdout, set())
-                sys.stdout.write('}\n')
-            else:
-                target.build(dry_run=options.dry_run)
-    except BuildError as e:
+        if options.watch:
+            watch(targets_, jobs=options.jobs, livereload=(
+                options.livereload or getattr(variables, 'LIVERELOAD', None)))
+        elif options.why:
+            why(options.why)
+        elif options.what_if:
+            what_if(options.what_if, targets_)
+        elif options.jobs > 1 and not (options.clean or options.graph):
+            build_parallel(targets_, options.jobs, dry_run=options.dry_run)
+        else:
+            for target in targets_:
+                target = targets.get(target)
+                if options.clean:
+                    target.clean(really=options.really, recurse=True)
+                elif options.graph:
+                    sys.stdout.write('digraph "%s" {\n' % (target.name,))
+                    target.graph(sys.stdout, set(), stale([target.name]))
+                    sys.stdout.write('}\n')
+                else:
+                    target.build(dry_run=options.dry_run)
+    except (BuildError, TaskError) as e:
         logger.error(e)
         sys.exit(1)
+    finally:
+        journal.close()
+        state.save()
+        directory_index.save()
+        input_index.save()
+        if profiler is not None:
+            profiler.write_trace('build/pake-profile.json')
+            profiler.summarize(targets_)
+            logger.info('profile: trace written to build/pake-profile.json')
+
+
+def notify(url, message):
+    """notify POSTs message as JSON to url.  Errors are only logged, since
+    nobody may be listening."""
+    request = urllib2.Request(url, json.dumps(message),
+                              {'Content-Type': 'application/json'})
+    try:
+        urllib2.urlopen(request, timeout=2).close()
+    except (IOError, urllib2.URLError) as e:
+        logger.debug('cannot notify %s: %s', url, e)
+
+
+def open_artifact_cache(location):
+    """open_artifact_cache returns the ArtifactCache for location, which is
+    either a local directory or a URL whose scheme is registered in
+    artifact_cache_types."""
+    scheme = urlparse.urlparse(location).scheme
+    if len(scheme) == 1:  # a Windows drive letter
+        scheme = ''
+    if scheme not in artifact_cache_types:
+        raise PakeError('unsupported artifact cache %r' % (location,))
+    return artifact_cache_types[scheme](location)
 
 
 def output(*args):
@@ -457,11 +1741,106 @@ def output(*args):
 
 
 def rule(pattern):
+    """The @rule decorator registers a function that creates targets for
+    all names matching the regular expression pattern.  The function is
+    called with the name and the match object, and returns a new Target, or
+    None if it does not apply to the name after all.  For example:
+        @rule(r'\A(?P<base>.*)\.o\Z')
+        def object_file(name, match):
+            source = match.group('base') + '.c'
+            if not os.path.exists(source):
+                return None
+            def action(t):
+                t.run('gcc', '-c', '-o', t.name, source)
+            return Target(name, action=action, dependencies=[source])"""
     def f(targetmaker):
-        rules[re.compile(pattern)] = targetmaker
+        rules.add(pattern, targetmaker)
     return f
 
 
+def run_task(function, args, kwargs):
+    """run_task calls function in an Executor worker.  It returns a pair of
+    True and the function's result, or of False and the formatted traceback
+    if the function raises an error, so that errors reach the Executor
+    intact even from another process."""
+    try:
+        return True, function(*args, **kwargs)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+def stale(names):
+    """stale works out, without running any actions, which of the targets
+    called names and their dependencies would be rebuilt.  It returns a dict
+    mapping each target to None if it is up to date, or otherwise to a pair
+    of the reason why it would be rebuilt and the dependency that causes it,
+    if that dependency would be rebuilt itself."""
+    dependencies, _ = graph(names)
+    reasons = {}
+    timestamps = {}
+
+    def visit(target):
+        if target in reasons:
+            return
+        reasons[target] = None
+        timestamps[target] = -1
+        dependencies_ = sorted(dependencies[target], key=lambda t: t.name)
+        for dependency in dependencies_:
+            visit(dependency)
+        if target.phony and target.action is not None:
+            reasons[target] = ('is phony, so its action always runs', None)
+            return
+        for dependency in dependencies_:
+            if reasons[dependency] is not None:
+                reasons[target] = ('%s will be rebuilt' % (dependency.name,),
+                                   dependency)
+                return
+        newest = max([timestamps[d] for d in dependencies_] or [-1])
+        if target.phony:
+            timestamps[target] = newest
+            return
+        if not os.path.exists(target.name):
+            if target.action is not None:
+                reasons[target] = ('does not exist', None)
+            return
+        if journal.interrupted(target.name):
+            reasons[target] = ('was not completed by an earlier run', None)
+            return
+        timestamps[target] = os.stat(target.name).st_mtime
+        if newest <= timestamps[target] or target.action is None:
+            return
+        if target.restat and newest <= target.restated():
+            return
+        signature = target.signature() if use_digests else None
+        if signature is not None:
+            if state.get('signatures', target.name) == signature:
+                return
+            old = input_index.get('inputs', target.name)
+            if old is None:
+                reasons[target] = ('has no record of its inputs', None)
+                return
+            new = target._inputs
+            changed = sorted(name or 'the action'
+                             for name in set(old) | set(new)
+                             if old.get(name) != new.get(name))
+            reasons[target] = ('the contents of %s changed' %
+                               (', '.join(changed),), None)
+            return
+        for dependency in dependencies_:
+            if timestamps[dependency] > timestamps[target]:
+                reasons[target] = ('%s is newer (%s > %s)' % (
+                    dependency.name,
+                    time.strftime('%Y-%m-%d %H:%M:%S',
+                                  time.localtime(timestamps[dependency])),
+                    time.strftime('%Y-%m-%d %H:%M:%S',
+                                  time.localtime(timestamps[target]))), None)
+                return
+
+    for name in names:
+        visit(targets.get(name))
+    return reasons
+
+
 def target(name, *dependencies, **kwargs):
     """The @target decorator describes the action needed to build a single
     target file when its dependencies are out of date.  For example:
@@ -490,6 +1869,113 @@ def virtual(name, *dependencies, **kwargs):
     targets.add(target)
 
 
+def wait(process):
+    """wait waits for the subprocess.Popen process to exit and returns a pair
+    of its exit status and the CPU time that it used, or None for the CPU time
+    on platforms where it is not available."""
+    if not hasattr(os, 'wait4'):
+        return process.wait(), None
+    while True:
+        try:
+            pid, status, rusage = os.wait4(process.pid, 0)
+            break
+        except OSError as e:
+            if e.errno != errno.EINTR:
+                raise
+    if os.WIFSIGNALED(status):
+        process.returncode = -os.WTERMSIG(status)
+    else:
+        process.returncode = os.WEXITSTATUS(status)
+    return process.returncode, rusage.ru_utime + rusage.ru_stime
+
+
+def watch(names, jobs=1, livereload=None):
+    """watch keeps the target graph for the targets called names in memory and
+    rebuilds them whenever one of their source files changes, until it is
+    interrupted.  Only the targets that depend on the changed files are
+    checked again, everything else is remembered from the previous build.
+    After each successful rebuild the list of changed files is POSTed as JSON
+    to the URL livereload, if given, so that a development server can reload
+    its pages.  Files added after watch has started are not noticed."""
+    def build():
+        try:
+            if jobs > 1:
+                build_parallel(names, jobs)
+            else:
+                for name in names:
+                    targets.get(name).build()
+        except (BuildError, TaskError) as e:
+            logger.error(e)
+            return False
+        finally:
+            journal.close()
+            state.save()
+            input_index.save()
+        return True
+
+    build()
+    dependencies, dependents = graph(names)
+    sources = [target.name for target in dependencies
+               if target.action is None and not target.phony and
+               os.path.isfile(target.name)]
+    try:
+        watcher = InotifyWatcher(sources)
+    except (AttributeError, OSError, TypeError) as e:
+        logger.debug('inotify is not available (%s), polling', e)
+        watcher = PollingWatcher(sources)
+    logger.info('watching %d files', len(sources))
+    by_path = dict((os.path.normpath(target.name), target)
+                   for target in dependencies)
+    while True:
+        try:
+            changed = watcher.wait()
+        except KeyboardInterrupt:
+            return
+        logger.info('changed: %s', ' '.join(sorted(changed)))
+        stack = [by_path[path] for path in changed]
+        stale = set()
+        while stack:
+            target = stack.pop()
+            if target not in stale:
+                stale.add(target)
+                stack.extend(dependents[target])
+        for target in stale:
+            target.reset()
+        if build() and livereload:
+            notify(livereload, {'changed': sorted(changed)})
+
+
+def what_if(path, names):
+    """what_if prints the targets, among the targets called names and their
+    dependencies, that a change to the file path would cause to be rebuilt,
+    with the time that their actions took when they last ran."""
+    dependencies, dependents = graph(names)
+    by_path = dict((os.path.normpath(target.name), target)
+                   for target in dependencies)
+    changed = by_path.get(os.path.normpath(path))
+    if changed is None:
+        logger.error('%s is not used by %s', path, ' '.join(names))
+        return
+    affected = set()
+    stack = list(dependents[changed])
+    while stack:
+        target = stack.pop()
+        if target not in affected:
+            affected.add(target)
+            stack.extend(dependents[target])
+    total = 0
+    for target in sorted(affected, key=lambda target: target.name):
+        if target.action is None:
+            continue
+        duration = state.get('durations', target.name)
+        if duration is None:
+            sys.stdout.write('       ?  %s\n' % (target.name,))
+        else:
+            total += duration
+            sys.stdout.write('%7.2fs  %s\n' % (duration, target.name))
+    sys.stdout.write('%7.2fs  total, run serially\n' % (total,))
+
+
 def which(program):
     """Returns the full path of a given argument or `None`.
     See:
@@ -507,3 +1993,19 @@ def which(program):
             if is_exe(exe_file):
                 return exe_file
     return None
+
+
+def why(name):
+    """why prints why the target called name would be rebuilt, following the
+    chain of dependencies that would be rebuilt before it down to the first
+    one that is out of date itself."""
+    reasons = stale([name])
+    target = targets.get(name)
+    if reasons[target] is None:
+        sys.stdout.write('%s is up to date\n' % (target.name,))
+    while target is not None and reasons[target] is not None:
+        reason, cause = reasons[target]
+        sys.stdout.write('%s: %s\n' % (target.name, reason))
+        target = cause
+
+
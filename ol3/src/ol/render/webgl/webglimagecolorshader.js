@@ -28,7 +28,7 @@ ol.render.webgl.imagereplay.shader.ColorFragment.DEBUG_SOURCE = 'precision highp
  * @const
  * @type {string}
  */
-ol.render.webgl.imagereplay.shader.ColorFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;varying float b;uniform mat4 k;uniform float l;uniform sampler2D m;void main(void){vec4 texColor=texture2D(m,a);float alpha=texColor.a*b*l;if(alpha==0.0){discard;}gl_FragColor.a=alpha;gl_FragColor.rgb=(k*vec4(texColor.rgb,1.)).rgb;}';
+ol.render.webgl.imagereplay.shader.ColorFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;varying float b;uniform mat4 k;uniform float l;uniform sampler2D m;void main(){vec4 n=texture2D(m,a);float o=n.a*b*l;if(o==0.){discard;}gl_FragColor.a=o;gl_FragColor.rgb=(k*vec4(n.rgb,1.)).rgb;}';
 
 
 /**
@@ -64,7 +64,7 @@ ol.render.webgl.imagereplay.shader.ColorVertex.DEBUG_SOURCE = 'varying vec2 v_te
  * @const
  * @type {string}
  */
-ol.render.webgl.imagereplay.shader.ColorVertex.OPTIMIZED_SOURCE = 'varying vec2 a;varying float b;attribute vec2 c;attribute vec2 d;attribute vec2 e;attribute float f;attribute float g;uniform mat4 h;uniform mat4 i;uniform mat4 j;void main(void){mat4 offsetMatrix=i;if(g==1.0){offsetMatrix=i*j;}vec4 offsets=offsetMatrix*vec4(e,0.,0.);gl_Position=h*vec4(c,0.,1.)+offsets;a=d;b=f;}';
+ol.render.webgl.imagereplay.shader.ColorVertex.OPTIMIZED_SOURCE = 'varying vec2 a;varying float b;attribute vec2 c;attribute vec2 d;attribute vec2 e;attribute float f;attribute float g;uniform mat4 h;uniform mat4 i;uniform mat4 j;void main(){mat4 n=i;if(g==1.){n=i*j;}vec4 o=n*vec4(e,0.,0.);gl_Position=h*vec4(c,0.,1.)+o;a=d;b=f;}';
 
 
 /**
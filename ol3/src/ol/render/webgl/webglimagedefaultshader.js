@@ -28,7 +28,7 @@ ol.render.webgl.imagereplay.shader.DefaultFragment.DEBUG_SOURCE = 'precision hig
  * @const
  * @type {string}
  */
-ol.render.webgl.imagereplay.shader.DefaultFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;varying float b;uniform float k;uniform sampler2D l;void main(void){vec4 texColor=texture2D(l,a);gl_FragColor.rgb=texColor.rgb;float alpha=texColor.a*b*k;if(alpha==0.0){discard;}gl_FragColor.a=alpha;}';
+ol.render.webgl.imagereplay.shader.DefaultFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;varying float b;uniform float k;uniform sampler2D l;void main(){vec4 m=texture2D(l,a);gl_FragColor.rgb=m.rgb;float n=m.a*b*k;if(n==0.){discard;}gl_FragColor.a=n;}';
 
 
 /**
@@ -64,7 +64,7 @@ ol.render.webgl.imagereplay.shader.DefaultVertex.DEBUG_SOURCE = 'varying vec2 v_
  * @const
  * @type {string}
  */
-ol.render.webgl.imagereplay.shader.DefaultVertex.OPTIMIZED_SOURCE = 'varying vec2 a;varying float b;attribute vec2 c;attribute vec2 d;attribute vec2 e;attribute float f;attribute float g;uniform mat4 h;uniform mat4 i;uniform mat4 j;void main(void){mat4 offsetMatrix=i;if(g==1.0){offsetMatrix=i*j;}vec4 offsets=offsetMatrix*vec4(e,0.,0.);gl_Position=h*vec4(c,0.,1.)+offsets;a=d;b=f;}';
+ol.render.webgl.imagereplay.shader.DefaultVertex.OPTIMIZED_SOURCE = 'varying vec2 a;varying float b;attribute vec2 c;attribute vec2 d;attribute vec2 e;attribute float f;attribute float g;uniform mat4 h;uniform mat4 i;uniform mat4 j;void main(){mat4 m=i;if(g==1.){m=i*j;}vec4 n=m*vec4(e,0.,0.);gl_Position=h*vec4(c,0.,1.)+n;a=d;b=f;}';
 
 
 /**
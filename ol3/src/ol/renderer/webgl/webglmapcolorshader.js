@@ -28,7 +28,7 @@ ol.renderer.webgl.map.shader.ColorFragment.DEBUG_SOURCE = 'precision highp float
  * @const
  * @type {string}
  */
-ol.renderer.webgl.map.shader.ColorFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;uniform mat4 f;uniform float g;uniform sampler2D h;void main(void){vec4 texColor=texture2D(h,a);gl_FragColor.rgb=(f*vec4(texColor.rgb,1.)).rgb;gl_FragColor.a=texColor.a*g;}';
+ol.renderer.webgl.map.shader.ColorFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;uniform mat4 f;uniform float g;uniform sampler2D h;void main(){vec4 i=texture2D(h,a);gl_FragColor.rgb=(f*vec4(i.rgb,1.)).rgb;gl_FragColor.a=i.a*g;}';
 
 
 /**
@@ -64,7 +64,7 @@ ol.renderer.webgl.map.shader.ColorVertex.DEBUG_SOURCE = 'varying vec2 v_texCoord
  * @const
  * @type {string}
  */
-ol.renderer.webgl.map.shader.ColorVertex.OPTIMIZED_SOURCE = 'varying vec2 a;attribute vec2 b;attribute vec2 c;uniform mat4 d;uniform mat4 e;void main(void){gl_Position=e*vec4(b,0.,1.);a=(d*vec4(c,0.,1.)).st;}';
+ol.renderer.webgl.map.shader.ColorVertex.OPTIMIZED_SOURCE = 'varying vec2 a;attribute vec2 b;attribute vec2 c;uniform mat4 d;uniform mat4 e;void main(){gl_Position=e*vec4(b,0.,1.);a=(d*vec4(c,0.,1.)).st;}';
 
 
 /**
@@ -28,7 +28,7 @@ ol.renderer.webgl.map.shader.DefaultFragment.DEBUG_SOURCE = 'precision highp flo
  * @const
  * @type {string}
  */
-ol.renderer.webgl.map.shader.DefaultFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;uniform float f;uniform sampler2D g;void main(void){vec4 texColor=texture2D(g,a);gl_FragColor.rgb=texColor.rgb;gl_FragColor.a=texColor.a*f;}';
+ol.renderer.webgl.map.shader.DefaultFragment.OPTIMIZED_SOURCE = 'precision highp float;varying vec2 a;uniform float f;uniform sampler2D g;void main(){vec4 h=texture2D(g,a);gl_FragColor.rgb=h.rgb;gl_FragColor.a=h.a*f;}';
 
 
 /**
@@ -64,7 +64,7 @@ ol.renderer.webgl.map.shader.DefaultVertex.DEBUG_SOURCE = 'varying vec2 v_texCoo
  * @const
  * @type {string}
  */
-ol.renderer.webgl.map.shader.DefaultVertex.OPTIMIZED_SOURCE = 'varying vec2 a;attribute vec2 b;attribute vec2 c;uniform mat4 d;uniform mat4 e;void main(void){gl_Position=e*vec4(b,0.,1.);a=(d*vec4(c,0.,1.)).st;}';
+ol.renderer.webgl.map.shader.DefaultVertex.OPTIMIZED_SOURCE = 'varying vec2 a;attribute vec2 b;attribute vec2 c;uniform mat4 d;uniform mat4 e;void main(){gl_Position=e*vec4(b,0.,1.);a=(d*vec4(c,0.,1.)).st;}';
 
 
 /**
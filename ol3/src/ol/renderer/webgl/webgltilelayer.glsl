@@ -1,6 +1,10 @@
 //! NAMESPACE=ol.renderer.webgl.tilelayer.shader
 //! CLASS=ol.renderer.webgl.tilelayer.shader.
 
+//! VARIANT WATER_BODIES
+//! VARIANT HILL_SHADING
+//! VARIANT TESTING
+
 //! COMMON
 
 // texture with encoded elevation values
@@ -12,68 +16,7 @@ uniform float u_tileSizeM;
 // temporary values for transfer to fragment shader
 varying vec2 v_texCoord;
 
-float decodeElevation(in vec4 colorChannels) {
-	// decode input data elevation value
- 	float elevationM = ((colorChannels.r*255.0 + (colorChannels.g*255.0)*256.0)-11000.0)/10.0;
-    return elevationM;
-}
-
-vec4 decodeTextureColor(in vec4 colorChannels) {
-		// decode input data color value
-		int i1 = int(colorChannels.b*255.0);
-		int i2 = int(colorChannels.a*255.0);
-
-        int r = 0;
-        int g = 0;
-        int b = 0;
-        
-        if (i1 >= 128) {
-            i1 -= 128;
-            r += 16;
-        }
-        if (i1 >= 64) {
-            i1 -= 64;
-            r += 8;
-        }
-        if (i1 >= 32) {
-            i1 -= 32;
-            r += 4;
-        }
-        if (i1 >= 16) {
-            i1 -= 16;
-            r += 2;
-        }
-        if (i1 >= 8) {
-            i1 -= 8;
-            r += 1;
-        }      
-        // read bits 3 to 1
-        if (i1 >= 4) {
-            i1 -= 4;
-            g += 32;
-        }
-        if (i1 >= 2) {
-            i1 -= 2;
-            g += 16;
-        }
-        if (i1 >= 1) {
-            g += 8;
-        }  
-        if (i2 >= 128) {
-            i2 -= 128;
-            g += 4;
-        }
-        if (i2 >= 64) {
-            i2 -= 64;
-            g += 2;
-        }
-        if (i2 >= 32) {
-            i2 -= 32;
-            g += 1;
-        }
-        b = i2;
-        return vec4(float(r*8)/255.0,float(g*4)/255.0,float(b*8)/255.0,1.0);
-}
+//! INCLUDE dem.glsl
 
 
 //! VERTEX
@@ -122,21 +65,12 @@ uniform sampler2D u_colorRamp;
 // u_colorScale.x is lower threshold, u_colorScale.y is upper threshold
 uniform vec2 u_colorScale;
 
-// flag for coloring inland waterbodies
-uniform bool u_waterBodies; 
-
-// flag for coloring inland waterbodies
-uniform bool u_hillShading; 
-
 // direction of light source
 uniform vec3 u_light; 
 
 // intensity of ambient light
 uniform float u_ambient_light; 
 
-// flag for testing mode
-uniform bool u_testing; 
-
 const float MAX_ELEVATION = 4900.0; // assumed to be the highest elevation in the eu-dem
 // mesh cellsize for tile resolution of 256x256 pixel
 const highp float CELLSIZE = 0.00390625; // =1.0/256.0
@@ -192,8 +126,10 @@ void main(void) {
 		if(absElevation <= 0.0){
 			hypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0);	// set color to blue
 
+		}
+#ifdef WATER_BODIES
 		// if not on sea-level and inland waterBody flag is true	
-		} else if(u_waterBodies) {
+		else {
 
 			// doublecheck if this pixel really belongs to a larger surface with help of remaining two neighbours
 			//vec3 neighbourAbove = vec3(v_texCoord.x,v_texCoord.y-CELLSIZE/2.0,0.0);  
@@ -202,14 +138,16 @@ void main(void) {
 				hypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0); 	// set color to blue
 			//}
 		}
+#endif
 	} 
 
-	if(u_testing){
-		//hypsoColor = decodeTextureColor(texture2D(u_texture, m_texCoord.xy));
-	}
+#ifdef TESTING
+	//hypsoColor = decodeTextureColor(texture2D(u_texture, m_texCoord.xy));
+#endif
 
 // computation of hillshading
-	if(u_hillShading){
+#ifdef HILL_SHADING
+	{
 		// transform to meter coordinates for normal computation
 		neighbourRight.xy *= u_tileSizeM;
 		neighbourBelow.xy *= u_tileSizeM;
@@ -220,15 +158,17 @@ void main(void) {
 		// compute hillShade with help of u_light and normal and blend hypsocolor with hillShade
 		float hillShade = clamp(u_ambient_light * 1.0+ max(dot(normal,normalize(u_light)),0.0),0.0,1.0);
 		gl_FragColor = hypsoColor * vec4(hillShade,hillShade,hillShade,1.0);
-	} else {
-		// apply only hypsometric color
-		gl_FragColor = hypsoColor;
 	}
+#else
+	// apply only hypsometric color
+	gl_FragColor = hypsoColor;
+#endif
 
 
 
 // testing mode
-	if(u_testing){
+#ifdef TESTING
+	{
 
 		float lineWidth = 3.0 * CELLSIZE;
 		if(m_texCoord.x >= 1.0-lineWidth){
@@ -253,4 +193,5 @@ void main(void) {
 		}
 
 	}
+#endif
 }
@@ -33,23 +33,11 @@ ol.renderer.webgl.TileLayer = function(mapRenderer, tileLayer) {
   goog.base(this, mapRenderer, tileLayer);
 
   /**
+   * Locations of the program of each shader variant.
    * @private
-   * @type {ol.webgl.shader.Fragment}
+   * @type {Array.<ol.renderer.webgl.tilelayer.shader.Locations>}
    */
-  this.fragmentShader_ =
-      ol.renderer.webgl.tilelayer.shader.Fragment.getInstance();
-
-  /**
-   * @private
-   * @type {ol.webgl.shader.Vertex}
-   */
-  this.vertexShader_ = ol.renderer.webgl.tilelayer.shader.Vertex.getInstance();
-
-  /**
-   * @private
-   * @type {ol.renderer.webgl.tilelayer.shader.Locations}
-   */
-  this.locations_ = null;
+  this.locations_ = [];
 
   
   // //
@@ -185,7 +173,7 @@ ol.renderer.webgl.TileLayer.prototype.disposeInternal = function() {
  */
 ol.renderer.webgl.TileLayer.prototype.handleWebGLContextLost = function() {
   goog.base(this, 'handleWebGLContextLost');
-  this.locations_ = null;
+  this.locations_ = [];
 };
 
 
@@ -259,39 +247,35 @@ ol.renderer.webgl.TileLayer.prototype.prepareFrame =
     gl.clearDepth(1.0);
     gl.clear(goog.webgl.DEPTH_BUFFER_BIT);
 
-    var program = context.getProgram(this.fragmentShader_, this.vertexShader_);
+    // select the shader variant compiled for the active DEM features
+    var Variant = ol.renderer.webgl.tilelayer.shader.Variant;
+    var variant = (layerState.waterBodies === true ? Variant.WATER_BODIES : 0) |
+        (layerState.hillShading === true ? Variant.HILL_SHADING : 0) |
+        (layerState.testing === true ? Variant.TESTING : 0);
+    var program = context.getProgram(
+        ol.renderer.webgl.tilelayer.shader.Fragment.getVariant(variant),
+        ol.renderer.webgl.tilelayer.shader.Vertex.getVariant(variant));
     context.useProgram(program);
-    if (goog.isNull(this.locations_)) {
-      this.locations_ =
-          new ol.renderer.webgl.tilelayer.shader.Locations(gl, program);
+    var locations = this.locations_[variant];
+    if (!goog.isDef(locations)) {
+      locations = new ol.renderer.webgl.tilelayer.shader.Locations(gl, program);
+      this.locations_[variant] = locations;
     }
 
           // UNIFORM definition: u_tileSizeM
       // estimated size of one tile in meter at the equator (dependend of current zoomlevel z)
       var tileSizeM = 40000000.0 / Math.pow(2.0, z);
-      gl.uniform1f(this.locations_.u_tileSizeM, tileSizeM);
+      gl.uniform1f(locations.u_tileSizeM, tileSizeM);
 
       // UNIFORM definition: u_scaleFactor
       // compute direction for oblique Shifting from current rotation and obliqueInclination Angle
       var scaleFactor = 1.0 / Math.tan(goog.math.toRadians(layerState.obliqueInclination));
-      gl.uniform2f(this.locations_.u_scaleFactor, scaleFactor*Math.sin(-viewState.rotation), scaleFactor*Math.cos(-viewState.rotation));
+      gl.uniform2f(locations.u_scaleFactor, scaleFactor*Math.sin(-viewState.rotation), scaleFactor*Math.cos(-viewState.rotation));
 
       // UNIFORM definition: u_colorScale
       // pass colorScale factor to adapt color ramp dynamically
-      gl.uniform2f(this.locations_.u_colorScale, layerState.colorScale[0],layerState.colorScale[1]);
+      gl.uniform2f(locations.u_colorScale, layerState.colorScale[0],layerState.colorScale[1]);
    
-      // UNIFORM definition: u_waterBodies
-      // pass waterBodies to toggle rendering of inland waterBodies
-      gl.uniform1f(this.locations_.u_waterBodies, layerState.waterBodies === true ? 1.0 : 0.0);
-
-      // UNIFORM definition: u_testing
-      // pass flag to activate testing mode
-      gl.uniform1f(this.locations_.u_testing, layerState.testing === true ? 1.0 : 0.0);
-
-      // UNIFORM definition: u_hillShading
-      // pass flag to activate hillShading
-      gl.uniform1f(this.locations_.u_hillShading, layerState.hillShading === true ? 1.0 : 0.0);
-
       // UNIFORM definition: u_light
       // compute light direction from Zenith and Azimuth and dependend of current map rotation
       var zenithRad = goog.math.toRadians(90.0-layerState.lightZenith),
@@ -299,11 +283,11 @@ ol.renderer.webgl.TileLayer.prototype.prepareFrame =
            lightZ = Math.cos(zenithRad),
            lightX = Math.sin(zenithRad) * Math.cos(azimuthRad),
            lightY = Math.sin(zenithRad) * Math.sin(azimuthRad);
-      gl.uniform3f(this.locations_.u_light, lightX, lightY, lightZ);
+      gl.uniform3f(locations.u_light, lightX, lightY, lightZ);
 
       // UNIFORM definition: u_ambient_light
       // pass intensity for an ambient light source
-      gl.uniform1f(this.locations_.u_ambient_light, layerState.ambientLight);
+      gl.uniform1f(locations.u_ambient_light, layerState.ambientLight);
 
       // COLOR TEXTURE
       // Create lookup texture for hyposometric tints from arrayColorRamp  
@@ -317,12 +301,12 @@ ol.renderer.webgl.TileLayer.prototype.prepareFrame =
       gl.texParameteri(goog.webgl.TEXTURE_2D, goog.webgl.TEXTURE_MAG_FILTER, goog.webgl.LINEAR);
       gl.texParameteri(goog.webgl.TEXTURE_2D, goog.webgl.TEXTURE_WRAP_S, goog.webgl.CLAMP_TO_EDGE);
       gl.texParameteri(goog.webgl.TEXTURE_2D, goog.webgl.TEXTURE_WRAP_T, goog.webgl.CLAMP_TO_EDGE);
-      gl.uniform1i(this.locations_.u_colorRamp, 1);
+      gl.uniform1i(locations.u_colorRamp, 1);
       
       // TILE TEXTURE
       // pass current tile image as u_texture to shader
       gl.activeTexture(goog.webgl.TEXTURE0);
-      gl.uniform1i(this.locations_.u_texture, 0);
+      gl.uniform1i(locations.u_texture, 0);
 
 
       if(!goog.isObject(this.tileMesh_) ||  this.tileMesh_.resolution!=layerState.resolution){
@@ -339,9 +323,9 @@ ol.renderer.webgl.TileLayer.prototype.prepareFrame =
       // Write the vertex coordinates to the buffer object
       context.bindBuffer(goog.webgl.ARRAY_BUFFER, this.tileMesh_.vertexBuffer);
       // enables generic vertex attribute array
-      gl.enableVertexAttribArray(this.locations_.a_position);
+      gl.enableVertexAttribArray(locations.a_position);
       // define an array of generic vertex attribute data
-      gl.vertexAttribPointer(this.locations_.a_position, 2, goog.webgl.FLOAT, false, 0, 0);
+      gl.vertexAttribPointer(locations.a_position, 2, goog.webgl.FLOAT, false, 0, 0);
       // Write the indices to the buffer object
       context.bindBuffer(goog.webgl.ELEMENT_ARRAY_BUFFER, this.tileMesh_.indexBuffer);
 
@@ -423,7 +407,7 @@ ol.renderer.webgl.TileLayer.prototype.prepareFrame =
         ty = 2 * (tileExtent[1] - framebufferExtent[1]) /
             framebufferExtentDimension - 1;
         goog.vec.Vec4.setFromValues(u_tileOffset, sx, sy, tx, ty);
-        gl.uniform4fv(this.locations_.u_tileOffset, u_tileOffset);
+        gl.uniform4fv(locations.u_tileOffset, u_tileOffset);
 
         mapRenderer.bindTileTexture(tile, tilePixelSize,
             tileGutter * pixelRatio, goog.webgl.NEAREST, goog.webgl.NEAREST);
@@ -4,76 +4,173 @@ goog.provide('ol.renderer.webgl.tilelayer.shader');
 goog.require('ol.webgl.shader');
 
 
+/**
+ * The flags that select a variant of the shaders.  A variant is a
+ * combination of flags, and each flag that is set defines a macro of the same
+ * name in the shaders of the variant.
+ * @enum {number}
+ */
+ol.renderer.webgl.tilelayer.shader.Variant = {
+  WATER_BODIES: 1,
+  HILL_SHADING: 2,
+  TESTING: 4
+};
+
+
 
 /**
  * @constructor
  * @extends {ol.webgl.shader.Fragment}
+ * @param {number} index Index of the source of the variant.
  * @struct
  */
-ol.renderer.webgl.tilelayer.shader.Fragment = function() {
-  goog.base(this, ol.renderer.webgl.tilelayer.shader.Fragment.SOURCE);
+ol.renderer.webgl.tilelayer.shader.Fragment = function(index) {
+  goog.base(this, goog.DEBUG ?
+      ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_DEFINES[index] +
+          ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_SOURCE :
+      ol.renderer.webgl.tilelayer.shader.Fragment.OPTIMIZED_SOURCES[index]);
 };
 goog.inherits(ol.renderer.webgl.tilelayer.shader.Fragment, ol.webgl.shader.Fragment);
-goog.addSingletonGetter(ol.renderer.webgl.tilelayer.shader.Fragment);
 
 
 /**
+ * @param {number} variant Variant, a combination of
+ *     ol.renderer.webgl.tilelayer.shader.Variant flags.
+ * @return {ol.webgl.shader.Fragment} Fragment shader of the variant.
+ */
+ol.renderer.webgl.tilelayer.shader.Fragment.getVariant = function(variant) {
+  var index = ol.renderer.webgl.tilelayer.shader.Fragment.VARIANTS[variant];
+  var instances = ol.renderer.webgl.tilelayer.shader.Fragment.instances_;
+  if (!goog.isDef(instances[index])) {
+    instances[index] = new ol.renderer.webgl.tilelayer.shader.Fragment(index);
+  }
+  return instances[index];
+};
+
+
+/**
+ * @private
+ * @type {Array.<ol.webgl.shader.Fragment>}
+ */
+ol.renderer.webgl.tilelayer.shader.Fragment.instances_ = [];
+
+
+/**
+ * The index of the source of each variant.
  * @const
- * @type {string}
+ * @type {Array.<number>}
  */
-ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_SOURCE = 'precision highp float;\n\n// texture with encoded elevation values\nuniform sampler2D u_texture;\n\n// length of one tile in meter at equator\nuniform float u_tileSizeM;\n\n// temporary values for transfer to fragment shader\nvarying vec2 v_texCoord;\n\nfloat decodeElevation(in vec4 colorChannels) {\n\t// decode input data elevation value\n \tfloat elevationM = ((colorChannels.r*255.0 + (colorChannels.g*255.0)*256.0)-11000.0)/10.0;\n    return elevationM;\n}\n\nvec4 decodeTextureColor(in vec4 colorChannels) {\n\t\t// decode input data color value\n\t\tint i1 = int(colorChannels.b*255.0);\n\t\tint i2 = int(colorChannels.a*255.0);\n\n        int r = 0;\n        int g = 0;\n        int b = 0;\n        \n        if (i1 >= 128) {\n            i1 -= 128;\n            r += 16;\n        }\n        if (i1 >= 64) {\n            i1 -= 64;\n            r += 8;\n        }\n        if (i1 >= 32) {\n            i1 -= 32;\n            r += 4;\n        }\n        if (i1 >= 16) {\n            i1 -= 16;\n            r += 2;\n        }\n        if (i1 >= 8) {\n            i1 -= 8;\n            r += 1;\n        }      \n        // read bits 3 to 1\n        if (i1 >= 4) {\n            i1 -= 4;\n            g += 32;\n        }\n        if (i1 >= 2) {\n            i1 -= 2;\n            g += 16;\n        }\n        if (i1 >= 1) {\n            g += 8;\n        }  \n        if (i2 >= 128) {\n            i2 -= 128;\n            g += 4;\n        }\n        if (i2 >= 64) {\n            i2 -= 64;\n            g += 2;\n        }\n        if (i2 >= 32) {\n            i2 -= 32;\n            g += 1;\n        }\n        b = i2;\n        return vec4(float(r*8)/255.0,float(g*4)/255.0,float(b*8)/255.0,1.0);\n}\n\n\n\n// color ramp texture to look up hypsometric tints\nuniform sampler2D u_colorRamp;\n\n// scale threshold values to adapt color ramp \n// u_colorScale.x is lower threshold, u_colorScale.y is upper threshold\nuniform vec2 u_colorScale;\n\n// flag for coloring inland waterbodies\nuniform bool u_waterBodies; \n\n// flag for coloring inland waterbodies\nuniform bool u_hillShading; \n\n// direction of light source\nuniform vec3 u_light; \n\n// intensity of ambient light\nuniform float u_ambient_light; \n\n// flag for testing mode\nuniform bool u_testing; \n\nconst float MAX_ELEVATION = 4900.0; // assumed to be the highest elevation in the eu-dem\n// mesh cellsize for tile resolution of 256x256 pixel\nconst highp float CELLSIZE = 0.00390625; // =1.0/256.0\n\nvoid main(void) {\n  \n    // When on eastern or southern tile border, take not current cells elevation\n    // but use (northern / western) neighbour cell to avoid stronger artefacts.\n    // The values on each adjacent tile border is the same so without this filter\n    // there would be a two pixel wide line visible.\n    vec2 m_texCoord = v_texCoord;\n\n\n\tif(m_texCoord.y <= CELLSIZE){ // southern border of tile\n\t\tm_texCoord = vec2(m_texCoord.x,m_texCoord.y+CELLSIZE);\n\t}\n\tif(m_texCoord.x >= 1.0-CELLSIZE){ // eastern border of tile\n\t\tm_texCoord = vec2(m_texCoord.x-0.8*CELLSIZE,m_texCoord.y);\n\t}\n\n\t// compute neighbouring vertices\n\tvec3 neighbourRight = vec3(m_texCoord.x+CELLSIZE, 1.0 - m_texCoord.y,0.0);\n\tvec3 neighbourBelow = vec3(m_texCoord.x, 1.0 - m_texCoord.y+CELLSIZE,0.0);\n    \n\t// read encoded values from dem tile texture and decode elevation values\n    float absElevation = decodeElevation(texture2D(u_texture, m_texCoord.xy));\n    neighbourRight.z = decodeElevation(texture2D(u_texture, vec2(m_texCoord.x+CELLSIZE, m_texCoord.y)));\n    neighbourBelow.z = decodeElevation(texture2D(u_texture, vec2(m_texCoord.x, m_texCoord.y-CELLSIZE)));\n  \n\t// transform x and y to meter coordinates for normal computation and add elevation value\n\tvec3 currentV = vec3(m_texCoord.x*u_tileSizeM,(1.0 - m_texCoord.y)*u_tileSizeM,absElevation);\n\n\n    // computation of hypsometric color\n\t// scaling of color ramp\n\tfloat colorMin = u_colorScale.x/MAX_ELEVATION;\n\tfloat colorMax = u_colorScale.y/MAX_ELEVATION;\n\tfloat relativeElevation = absElevation/MAX_ELEVATION;\n\tif(relativeElevation<=colorMin){\n\t\trelativeElevation = 0.0;\n\t} else if(relativeElevation>=colorMax){\n\t\trelativeElevation = 1.0;\n\t} else {\n\t\trelativeElevation = (relativeElevation - colorMin) / (colorMax - colorMin);\n\t}\n\t// read corresponding value from color ramp texture\n\tvec4 hypsoColor = abs(texture2D(u_colorRamp,vec2(0.5,relativeElevation)));\n\n\t// color for water surfaces in flat terrain\n\tif(currentV.z == absElevation && neighbourRight.z == absElevation && neighbourBelow.z == absElevation){\n\t\t\n\t\t// sealevel (0.0m) or below (i.e. negative no data values)\n\t\tif(absElevation <= 0.0){\n\t\t\thypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0);\t// set color to blue\n\n\t\t// if not on sea-level and inland waterBody flag is true\t\n\t\t} else if(u_waterBodies) {\n\n\t\t\t// doublecheck if this pixel really belongs to a larger surface with help of remaining two neighbours\n\t\t\t//vec3 neighbourAbove = vec3(v_texCoord.x,v_texCoord.y-CELLSIZE/2.0,0.0);  \n\t\t\t//vec3 neighbourLeft = vec3(v_texCoord.x+CELLSIZE/2.0,v_texCoord.y,0.0);  \n\t\t\t//if(decodeElevation(texture2D(u_texture, neighbourAbove.xy)) == absElevation && decodeElevation(texture2D(u_texture, neighbourLeft.xy)) == absElevation){\n\t\t\t\thypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0); \t// set color to blue\n\t\t\t//}\n\t\t}\n\t} \n\n\tif(u_testing){\n\t\t//hypsoColor = decodeTextureColor(texture2D(u_texture, m_texCoord.xy));\n\t}\n\n// computation of hillshading\n\tif(u_hillShading){\n\t\t// transform to meter coordinates for normal computation\n\t\tneighbourRight.xy *= u_tileSizeM;\n\t\tneighbourBelow.xy *= u_tileSizeM;\n\n\t\t// normal computation\n\t\tvec3 normal = normalize(cross(neighbourRight -currentV,neighbourBelow-currentV));\n\n\t\t// compute hillShade with help of u_light and normal and blend hypsocolor with hillShade\n\t\tfloat hillShade = clamp(u_ambient_light * 1.0+ max(dot(normal,normalize(u_light)),0.0),0.0,1.0);\n\t\tgl_FragColor = hypsoColor * vec4(hillShade,hillShade,hillShade,1.0);\n\t} else {\n\t\t// apply only hypsometric color\n\t\tgl_FragColor = hypsoColor;\n\t}\n\n\n\n// testing mode\n\tif(u_testing){\n\n\t\tfloat lineWidth = 3.0 * CELLSIZE;\n\t\tif(m_texCoord.x >= 1.0-lineWidth){\n\t        gl_FragColor = vec4(0.0,0.0,1.0,1.0);\n\t\t}\n\t\tif(m_texCoord.x <= lineWidth){\n\t        gl_FragColor = vec4(1.0,0.0,0.0,1.0);\n\t\t}\n\t\tif(m_texCoord.y <= lineWidth){\n\t        gl_FragColor = vec4(0.0,1.0,0.0,1.0);\n\t\t}\n\t\tif(m_texCoord.y >= 1.0-lineWidth){\n\t        gl_FragColor = vec4(0.0,0.5,0.5,1.0);\n\t\t} \n\n\t\tif(mod(m_texCoord.x,65.0*CELLSIZE) < CELLSIZE){\n\t       gl_FragColor = vec4(0.9,0.9,0.9,0.1);\n\t\t}\n\n\t\tif(mod(m_texCoord.y,65.0*CELLSIZE) < CELLSIZE){\n\t       gl_FragColor = vec4(0.9,0.9,0.9,0.1);\n\t\t}\n\n\t}\n}\n';
+ol.renderer.webgl.tilelayer.shader.Fragment.VARIANTS = [0, 1, 2, 3, 4, 5, 6, 7];
 
 
 /**
  * @const
- * @type {string}
+ * @type {Array.<string>}
  */
-ol.renderer.webgl.tilelayer.shader.Fragment.OPTIMIZED_SOURCE = 'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float decodeElevation(in vec4 colorChannels){float elevationM=((colorChannels.r*255.0+(colorChannels.g*255.0)*256.0)-11000.0)/10.0;return elevationM;}vec4 decodeTextureColor(in vec4 colorChannels){int i1=int(colorChannels.b*255.0);int i2=int(colorChannels.a*255.0);int r=0;int g=0;int b=0;if(i1>=128){i1-=128;r+=16;}if(i1>=64){i1-=64;r+=8;}if(i1>=32){i1-=32;r+=4;}if(i1>=16){i1-=16;r+=2;}if(i1>=8){i1-=8;r+=1;}if(i1>=4){i1-=4;g+=32;}if(i1>=2){i1-=2;g+=16;}if(i1>=1){g+=8;}if(i2>=128){i2-=128;g+=4;}if(i2>=64){i2-=64;g+=2;}if(i2>=32){i2-=32;g+=1;}b=i2;return vec4(float(r*8)/255.0,float(g*4)/255.0,float(b*8)/255.0,1.0);}uniform sampler2D g;uniform vec2 h;uniform bool i;uniform bool j;uniform vec3 k;uniform float l;uniform bool m;const float MAX_ELEVATION=4900.0;const highp float CELLSIZE=0.00390625;void main(void){vec2 m_texCoord=c;if(m_texCoord.y<=CELLSIZE){m_texCoord=vec2(m_texCoord.x,m_texCoord.y+CELLSIZE);}if(m_texCoord.x>=1.0-CELLSIZE){m_texCoord=vec2(m_texCoord.x-0.8*CELLSIZE,m_texCoord.y);}vec3 neighbourRight=vec3(m_texCoord.x+CELLSIZE,1.0-m_texCoord.y,0.0);vec3 neighbourBelow=vec3(m_texCoord.x,1.0-m_texCoord.y+CELLSIZE,0.0);float absElevation=decodeElevation(texture2D(a,m_texCoord.xy));neighbourRight.z=decodeElevation(texture2D(a,vec2(m_texCoord.x+CELLSIZE,m_texCoord.y)));neighbourBelow.z=decodeElevation(texture2D(a,vec2(m_texCoord.x,m_texCoord.y-CELLSIZE)));vec3 currentV=vec3(m_texCoord.x*b,(1.0-m_texCoord.y)*b,absElevation);float colorMin=h.x/MAX_ELEVATION;float colorMax=h.y/MAX_ELEVATION;float relativeElevation=absElevation/MAX_ELEVATION;if(relativeElevation<=colorMin){relativeElevation=0.0;}else if(relativeElevation>=colorMax){relativeElevation=1.0;}else{relativeElevation=(relativeElevation-colorMin)/(colorMax-colorMin);}vec4 hypsoColor=abs(texture2D(g,vec2(0.5,relativeElevation)));if(currentV.z==absElevation&&neighbourRight.z==absElevation&&neighbourBelow.z==absElevation){if(absElevation<=0.0){hypsoColor=vec4(0.5058823529,0.7725490196,0.8470588235,1.0);}else if(i){hypsoColor=vec4(0.5058823529,0.7725490196,0.8470588235,1.0);}} if(m){}if(j){neighbourRight.xy*=b;neighbourBelow.xy*=b;vec3 normal=normalize(cross(neighbourRight-currentV,neighbourBelow-currentV));float hillShade=clamp(l*1.0+max(dot(normal,normalize(k)),0.0),0.0,1.0);gl_FragColor=hypsoColor*vec4(hillShade,hillShade,hillShade,1.0);}else{gl_FragColor=hypsoColor;}if(m){float lineWidth=3.0*CELLSIZE;if(m_texCoord.x>=1.0-lineWidth){gl_FragColor=vec4(0.0,0.0,1.0,1.0);}if(m_texCoord.x<=lineWidth){gl_FragColor=vec4(1.0,0.0,0.0,1.0);}if(m_texCoord.y<=lineWidth){gl_FragColor=vec4(0.0,1.0,0.0,1.0);}if(m_texCoord.y>=1.0-lineWidth){gl_FragColor=vec4(0.0,0.5,0.5,1.0);}if(mod(m_texCoord.x,65.0*CELLSIZE)<CELLSIZE){gl_FragColor=vec4(0.9,0.9,0.9,0.1);}if(mod(m_texCoord.y,65.0*CELLSIZE)<CELLSIZE){gl_FragColor=vec4(0.9,0.9,0.9,0.1);}}}';
+ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_DEFINES = [
+    '',
+    '#define WATER_BODIES\n',
+    '#define HILL_SHADING\n',
+    '#define WATER_BODIES\n#define HILL_SHADING\n',
+    '#define TESTING\n',
+    '#define WATER_BODIES\n#define TESTING\n',
+    '#define HILL_SHADING\n#define TESTING\n',
+    '#define WATER_BODIES\n#define HILL_SHADING\n#define TESTING\n'
+];
 
 
 /**
  * @const
  * @type {string}
  */
-ol.renderer.webgl.tilelayer.shader.Fragment.SOURCE = goog.DEBUG ?
-    ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_SOURCE :
-    ol.renderer.webgl.tilelayer.shader.Fragment.OPTIMIZED_SOURCE;
+ol.renderer.webgl.tilelayer.shader.Fragment.DEBUG_SOURCE = 'precision highp float;\n\n// texture with encoded elevation values\nuniform sampler2D u_texture;\n\n// length of one tile in meter at equator\nuniform float u_tileSizeM;\n\n// temporary values for transfer to fragment shader\nvarying vec2 v_texCoord;\n\n// Decoders of the DEM tiles.  The R and G channels of a tile hold the\n// elevation in decimetres above -1100 m, and the B and A channels a colour\n// packed as RGB 565.  Both decoders run for every fragment, so they use only\n// arithmetic and no branches.\n\n// decode the elevation in meters from the R and G channels,\n// (r * 255 + g * 255 * 256 - 11000) / 10\nfloat decodeElevation(in vec4 colorChannels) {\n    return dot(colorChannels.rg, vec2(25.5, 6528.0)) - 1100.0;\n}\n\n// decode the colour packed as RGB 565 in the B and A channels\nvec4 decodeTextureColor(in vec4 colorChannels) {\n    // the bytes of the B and A channels, rounded to whole numbers\n    vec2 bytes = floor(colorChannels.ba * 255.0 + 0.5);\n    // red is in the upper 5 bits of B, green in the lower 3 bits of B and\n    // the upper 3 bits of A, and blue in the lower 5 bits of A\n    vec2 high = floor(bytes / vec2(8.0, 32.0));\n    vec2 low = bytes - high * vec2(8.0, 32.0);\n    vec3 color = vec3(high.x, low.x * 8.0 + high.y, low.y);\n    return vec4(color * vec3(8.0, 4.0, 8.0) / 255.0, 1.0);\n}\n\n\n\n// color ramp texture to look up hypsometric tints\nuniform sampler2D u_colorRamp;\n\n// scale threshold values to adapt color ramp \n// u_colorScale.x is lower threshold, u_colorScale.y is upper threshold\nuniform vec2 u_colorScale;\n\n// direction of light source\nuniform vec3 u_light; \n\n// intensity of ambient light\nuniform float u_ambient_light; \n\nconst float MAX_ELEVATION = 4900.0; // assumed to be the highest elevation in the eu-dem\n// mesh cellsize for tile resolution of 256x256 pixel\nconst highp float CELLSIZE = 0.00390625; // =1.0/256.0\n\nvoid main(void) {\n  \n    // When on eastern or southern tile border, take not current cells elevation\n    // but use (northern / western) neighbour cell to avoid stronger artefacts.\n    // The values on each adjacent tile border is the same so without this filter\n    // there would be a two pixel wide line visible.\n    vec2 m_texCoord = v_texCoord;\n\n\n\tif(m_texCoord.y <= CELLSIZE){ // southern border of tile\n\t\tm_texCoord = vec2(m_texCoord.x,m_texCoord.y+CELLSIZE);\n\t}\n\tif(m_texCoord.x >= 1.0-CELLSIZE){ // eastern border of tile\n\t\tm_texCoord = vec2(m_texCoord.x-0.8*CELLSIZE,m_texCoord.y);\n\t}\n\n\t// compute neighbouring vertices\n\tvec3 neighbourRight = vec3(m_texCoord.x+CELLSIZE, 1.0 - m_texCoord.y,0.0);\n\tvec3 neighbourBelow = vec3(m_texCoord.x, 1.0 - m_texCoord.y+CELLSIZE,0.0);\n    \n\t// read encoded values from dem tile texture and decode elevation values\n    float absElevation = decodeElevation(texture2D(u_texture, m_texCoord.xy));\n    neighbourRight.z = decodeElevation(texture2D(u_texture, vec2(m_texCoord.x+CELLSIZE, m_texCoord.y)));\n    neighbourBelow.z = decodeElevation(texture2D(u_texture, vec2(m_texCoord.x, m_texCoord.y-CELLSIZE)));\n  \n\t// transform x and y to meter coordinates for normal computation and add elevation value\n\tvec3 currentV = vec3(m_texCoord.x*u_tileSizeM,(1.0 - m_texCoord.y)*u_tileSizeM,absElevation);\n\n\n    // computation of hypsometric color\n\t// scaling of color ramp\n\tfloat colorMin = u_colorScale.x/MAX_ELEVATION;\n\tfloat colorMax = u_colorScale.y/MAX_ELEVATION;\n\tfloat relativeElevation = absElevation/MAX_ELEVATION;\n\tif(relativeElevation<=colorMin){\n\t\trelativeElevation = 0.0;\n\t} else if(relativeElevation>=colorMax){\n\t\trelativeElevation = 1.0;\n\t} else {\n\t\trelativeElevation = (relativeElevation - colorMin) / (colorMax - colorMin);\n\t}\n\t// read corresponding value from color ramp texture\n\tvec4 hypsoColor = abs(texture2D(u_colorRamp,vec2(0.5,relativeElevation)));\n\n\t// color for water surfaces in flat terrain\n\tif(currentV.z == absElevation && neighbourRight.z == absElevation && neighbourBelow.z == absElevation){\n\t\t\n\t\t// sealevel (0.0m) or below (i.e. negative no data values)\n\t\tif(absElevation <= 0.0){\n\t\t\thypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0);\t// set color to blue\n\n\t\t}\n#ifdef WATER_BODIES\n\t\t// if not on sea-level and inland waterBody flag is true\t\n\t\telse {\n\n\t\t\t// doublecheck if this pixel really belongs to a larger surface with help of remaining two neighbours\n\t\t\t//vec3 neighbourAbove = vec3(v_texCoord.x,v_texCoord.y-CELLSIZE/2.0,0.0);  \n\t\t\t//vec3 neighbourLeft = vec3(v_texCoord.x+CELLSIZE/2.0,v_texCoord.y,0.0);  \n\t\t\t//if(decodeElevation(texture2D(u_texture, neighbourAbove.xy)) == absElevation && decodeElevation(texture2D(u_texture, neighbourLeft.xy)) == absElevation){\n\t\t\t\thypsoColor = vec4(0.5058823529,0.7725490196,0.8470588235,1.0); \t// set color to blue\n\t\t\t//}\n\t\t}\n#endif\n\t} \n\n#ifdef TESTING\n\t//hypsoColor = decodeTextureColor(texture2D(u_texture, m_texCoord.xy));\n#endif\n\n// computation of hillshading\n#ifdef HILL_SHADING\n\t{\n\t\t// transform to meter coordinates for normal computation\n\t\tneighbourRight.xy *= u_tileSizeM;\n\t\tneighbourBelow.xy *= u_tileSizeM;\n\n\t\t// normal computation\n\t\tvec3 normal = normalize(cross(neighbourRight -currentV,neighbourBelow-currentV));\n\n\t\t// compute hillShade with help of u_light and normal and blend hypsocolor with hillShade\n\t\tfloat hillShade = clamp(u_ambient_light * 1.0+ max(dot(normal,normalize(u_light)),0.0),0.0,1.0);\n\t\tgl_FragColor = hypsoColor * vec4(hillShade,hillShade,hillShade,1.0);\n\t}\n#else\n\t// apply only hypsometric color\n\tgl_FragColor = hypsoColor;\n#endif\n\n\n\n// testing mode\n#ifdef TESTING\n\t{\n\n\t\tfloat lineWidth = 3.0 * CELLSIZE;\n\t\tif(m_texCoord.x >= 1.0-lineWidth){\n\t        gl_FragColor = vec4(0.0,0.0,1.0,1.0);\n\t\t}\n\t\tif(m_texCoord.x <= lineWidth){\n\t        gl_FragColor = vec4(1.0,0.0,0.0,1.0);\n\t\t}\n\t\tif(m_texCoord.y <= lineWidth){\n\t        gl_FragColor = vec4(0.0,1.0,0.0,1.0);\n\t\t}\n\t\tif(m_texCoord.y >= 1.0-lineWidth){\n\t        gl_FragColor = vec4(0.0,0.5,0.5,1.0);\n\t\t} \n\n\t\tif(mod(m_texCoord.x,65.0*CELLSIZE) < CELLSIZE){\n\t       gl_FragColor = vec4(0.9,0.9,0.9,0.1);\n\t\t}\n\n\t\tif(mod(m_texCoord.y,65.0*CELLSIZE) < CELLSIZE){\n\t       gl_FragColor = vec4(0.9,0.9,0.9,0.1);\n\t\t}\n\n\t}\n#endif\n}\n';
+
+
+/**
+ * @const
+ * @type {Array.<string>}
+ */
+ol.renderer.webgl.tilelayer.shader.Fragment.OPTIMIZED_SOURCES = [
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float o(vec4 u){return dot(u.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 q=vec3(k.x+l,1.-k.y,0.);vec3 r=vec3(k.x,1.-k.y+l,0.);float n=o(texture2D(a,k.xy));q.z=o(texture2D(a,vec2(k.x+l,k.y)));r.z=o(texture2D(a,vec2(k.x,k.y-l)));vec3 v=vec3(k.x*b,(1.-k.y)*b,n);float p=h.x/4900.;float s=h.y/4900.;float m=n/4900.;if(m<=p){m=0.;}else if(m>=s){m=1.;}else{m=(m-p)/(s-p);}vec4 t=abs(texture2D(g,vec2(.5,m)));if(v.z==n&&q.z==n&&r.z==n){if(n<=0.){t=vec4(.5058823529,.7725490196,.8470588235,1.);}}gl_FragColor=t;}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float o(vec4 u){return dot(u.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 r=vec3(k.x+l,1.-k.y,0.);vec3 s=vec3(k.x,1.-k.y+l,0.);float n=o(texture2D(a,k.xy));r.z=o(texture2D(a,vec2(k.x+l,k.y)));s.z=o(texture2D(a,vec2(k.x,k.y-l)));vec3 v=vec3(k.x*b,(1.-k.y)*b,n);float p=h.x/4900.;float t=h.y/4900.;float m=n/4900.;if(m<=p){m=0.;}else if(m>=t){m=1.;}else{m=(m-p)/(t-p);}vec4 q=abs(texture2D(g,vec2(.5,m)));if(v.z==n&&r.z==n&&s.z==n){if(n<=0.){q=vec4(.5058823529,.7725490196,.8470588235,1.);}else{q=vec4(.5058823529,.7725490196,.8470588235,1.);}}gl_FragColor=q;}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float q(vec4 w){return dot(w.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;uniform vec3 i;uniform float j;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 o=vec3(k.x+l,1.-k.y,0.);vec3 p=vec3(k.x,1.-k.y+l,0.);float n=q(texture2D(a,k.xy));o.z=q(texture2D(a,vec2(k.x+l,k.y)));p.z=q(texture2D(a,vec2(k.x,k.y-l)));vec3 r=vec3(k.x*b,(1.-k.y)*b,n);float s=h.x/4900.;float u=h.y/4900.;float m=n/4900.;if(m<=s){m=0.;}else if(m>=u){m=1.;}else{m=(m-s)/(u-s);}vec4 v=abs(texture2D(g,vec2(.5,m)));if(r.z==n&&o.z==n&&p.z==n){if(n<=0.){v=vec4(.5058823529,.7725490196,.8470588235,1.);}}{o.xy*=b;p.xy*=b;vec3 x=normalize(cross(o-r,p-r));float t=clamp(j*1.+max(dot(x,normalize(i)),0.),0.,1.);gl_FragColor=v*vec4(t,t,t,1.);}}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float q(vec4 w){return dot(w.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;uniform vec3 i;uniform float j;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 o=vec3(k.x+l,1.-k.y,0.);vec3 p=vec3(k.x,1.-k.y+l,0.);float n=q(texture2D(a,k.xy));o.z=q(texture2D(a,vec2(k.x+l,k.y)));p.z=q(texture2D(a,vec2(k.x,k.y-l)));vec3 r=vec3(k.x*b,(1.-k.y)*b,n);float s=h.x/4900.;float v=h.y/4900.;float m=n/4900.;if(m<=s){m=0.;}else if(m>=v){m=1.;}else{m=(m-s)/(v-s);}vec4 t=abs(texture2D(g,vec2(.5,m)));if(r.z==n&&o.z==n&&p.z==n){if(n<=0.){t=vec4(.5058823529,.7725490196,.8470588235,1.);}else{t=vec4(.5058823529,.7725490196,.8470588235,1.);}}{o.xy*=b;p.xy*=b;vec3 x=normalize(cross(o-r,p-r));float u=clamp(j*1.+max(dot(x,normalize(i)),0.),0.,1.);gl_FragColor=t*vec4(u,u,u,1.);}}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float p(vec4 v){return dot(v.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 r=vec3(k.x+l,1.-k.y,0.);vec3 s=vec3(k.x,1.-k.y+l,0.);float n=p(texture2D(a,k.xy));r.z=p(texture2D(a,vec2(k.x+l,k.y)));s.z=p(texture2D(a,vec2(k.x,k.y-l)));vec3 w=vec3(k.x*b,(1.-k.y)*b,n);float q=h.x/4900.;float t=h.y/4900.;float m=n/4900.;if(m<=q){m=0.;}else if(m>=t){m=1.;}else{m=(m-q)/(t-q);}vec4 u=abs(texture2D(g,vec2(.5,m)));if(w.z==n&&r.z==n&&s.z==n){if(n<=0.){u=vec4(.5058823529,.7725490196,.8470588235,1.);}}gl_FragColor=u;{float o=3.*l;if(k.x>=1.-o){gl_FragColor=vec4(0.,0.,1.,1.);}if(k.x<=o){gl_FragColor=vec4(1.,0.,0.,1.);}if(k.y<=o){gl_FragColor=vec4(0.,1.,0.,1.);}if(k.y>=1.-o){gl_FragColor=vec4(0.,.5,.5,1.);}if(mod(k.x,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}if(mod(k.y,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}}}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float p(vec4 v){return dot(v.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 s=vec3(k.x+l,1.-k.y,0.);vec3 t=vec3(k.x,1.-k.y+l,0.);float n=p(texture2D(a,k.xy));s.z=p(texture2D(a,vec2(k.x+l,k.y)));t.z=p(texture2D(a,vec2(k.x,k.y-l)));vec3 w=vec3(k.x*b,(1.-k.y)*b,n);float q=h.x/4900.;float u=h.y/4900.;float m=n/4900.;if(m<=q){m=0.;}else if(m>=u){m=1.;}else{m=(m-q)/(u-q);}vec4 r=abs(texture2D(g,vec2(.5,m)));if(w.z==n&&s.z==n&&t.z==n){if(n<=0.){r=vec4(.5058823529,.7725490196,.8470588235,1.);}else{r=vec4(.5058823529,.7725490196,.8470588235,1.);}}gl_FragColor=r;{float o=3.*l;if(k.x>=1.-o){gl_FragColor=vec4(0.,0.,1.,1.);}if(k.x<=o){gl_FragColor=vec4(1.,0.,0.,1.);}if(k.y<=o){gl_FragColor=vec4(0.,1.,0.,1.);}if(k.y>=1.-o){gl_FragColor=vec4(0.,.5,.5,1.);}if(mod(k.x,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}if(mod(k.y,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}}}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float r(vec4 x){return dot(x.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;uniform vec3 i;uniform float j;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 o=vec3(k.x+l,1.-k.y,0.);vec3 p=vec3(k.x,1.-k.y+l,0.);float n=r(texture2D(a,k.xy));o.z=r(texture2D(a,vec2(k.x+l,k.y)));p.z=r(texture2D(a,vec2(k.x,k.y-l)));vec3 s=vec3(k.x*b,(1.-k.y)*b,n);float t=h.x/4900.;float v=h.y/4900.;float m=n/4900.;if(m<=t){m=0.;}else if(m>=v){m=1.;}else{m=(m-t)/(v-t);}vec4 w=abs(texture2D(g,vec2(.5,m)));if(s.z==n&&o.z==n&&p.z==n){if(n<=0.){w=vec4(.5058823529,.7725490196,.8470588235,1.);}}{o.xy*=b;p.xy*=b;vec3 y=normalize(cross(o-s,p-s));float u=clamp(j*1.+max(dot(y,normalize(i)),0.),0.,1.);gl_FragColor=w*vec4(u,u,u,1.);}{float q=3.*l;if(k.x>=1.-q){gl_FragColor=vec4(0.,0.,1.,1.);}if(k.x<=q){gl_FragColor=vec4(1.,0.,0.,1.);}if(k.y<=q){gl_FragColor=vec4(0.,1.,0.,1.);}if(k.y>=1.-q){gl_FragColor=vec4(0.,.5,.5,1.);}if(mod(k.x,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}if(mod(k.y,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}}}',
+    'precision highp float;uniform sampler2D a;uniform float b;varying vec2 c;float r(vec4 x){return dot(x.rg,vec2(25.5,6528.))-1100.;}uniform sampler2D g;uniform vec2 h;uniform vec3 i;uniform float j;const highp float l=.00390625;void main(){vec2 k=c;if(k.y<=l){k=vec2(k.x,k.y+l);}if(k.x>=1.-l){k=vec2(k.x-.8*l,k.y);}vec3 o=vec3(k.x+l,1.-k.y,0.);vec3 p=vec3(k.x,1.-k.y+l,0.);float n=r(texture2D(a,k.xy));o.z=r(texture2D(a,vec2(k.x+l,k.y)));p.z=r(texture2D(a,vec2(k.x,k.y-l)));vec3 s=vec3(k.x*b,(1.-k.y)*b,n);float t=h.x/4900.;float w=h.y/4900.;float m=n/4900.;if(m<=t){m=0.;}else if(m>=w){m=1.;}else{m=(m-t)/(w-t);}vec4 u=abs(texture2D(g,vec2(.5,m)));if(s.z==n&&o.z==n&&p.z==n){if(n<=0.){u=vec4(.5058823529,.7725490196,.8470588235,1.);}else{u=vec4(.5058823529,.7725490196,.8470588235,1.);}}{o.xy*=b;p.xy*=b;vec3 y=normalize(cross(o-s,p-s));float v=clamp(j*1.+max(dot(y,normalize(i)),0.),0.,1.);gl_FragColor=u*vec4(v,v,v,1.);}{float q=3.*l;if(k.x>=1.-q){gl_FragColor=vec4(0.,0.,1.,1.);}if(k.x<=q){gl_FragColor=vec4(1.,0.,0.,1.);}if(k.y<=q){gl_FragColor=vec4(0.,1.,0.,1.);}if(k.y>=1.-q){gl_FragColor=vec4(0.,.5,.5,1.);}if(mod(k.x,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}if(mod(k.y,65.*l)<l){gl_FragColor=vec4(.9,.9,.9,.1);}}}'
+];
 
 
 
 /**
  * @constructor
  * @extends {ol.webgl.shader.Vertex}
+ * @param {number} index Index of the source of the variant.
  * @struct
  */
-ol.renderer.webgl.tilelayer.shader.Vertex = function() {
-  goog.base(this, ol.renderer.webgl.tilelayer.shader.Vertex.SOURCE);
+ol.renderer.webgl.tilelayer.shader.Vertex = function(index) {
+  goog.base(this, goog.DEBUG ?
+      ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_DEFINES[index] +
+          ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_SOURCE :
+      ol.renderer.webgl.tilelayer.shader.Vertex.OPTIMIZED_SOURCES[index]);
 };
 goog.inherits(ol.renderer.webgl.tilelayer.shader.Vertex, ol.webgl.shader.Vertex);
-goog.addSingletonGetter(ol.renderer.webgl.tilelayer.shader.Vertex);
 
 
 /**
+ * @param {number} variant Variant, a combination of
+ *     ol.renderer.webgl.tilelayer.shader.Variant flags.
+ * @return {ol.webgl.shader.Vertex} Vertex shader of the variant.
+ */
+ol.renderer.webgl.tilelayer.shader.Vertex.getVariant = function(variant) {
+  var index = ol.renderer.webgl.tilelayer.shader.Vertex.VARIANTS[variant];
+  var instances = ol.renderer.webgl.tilelayer.shader.Vertex.instances_;
+  if (!goog.isDef(instances[index])) {
+    instances[index] = new ol.renderer.webgl.tilelayer.shader.Vertex(index);
+  }
+  return instances[index];
+};
+
+
+/**
+ * @private
+ * @type {Array.<ol.webgl.shader.Vertex>}
+ */
+ol.renderer.webgl.tilelayer.shader.Vertex.instances_ = [];
+
+
+/**
+ * The index of the source of each variant.
  * @const
- * @type {string}
+ * @type {Array.<number>}
  */
-ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_SOURCE = '\n// texture with encoded elevation values\nuniform sampler2D u_texture;\n\n// length of one tile in meter at equator\nuniform float u_tileSizeM;\n\n// temporary values for transfer to fragment shader\nvarying vec2 v_texCoord;\n\nfloat decodeElevation(in vec4 colorChannels) {\n\t// decode input data elevation value\n \tfloat elevationM = ((colorChannels.r*255.0 + (colorChannels.g*255.0)*256.0)-11000.0)/10.0;\n    return elevationM;\n}\n\nvec4 decodeTextureColor(in vec4 colorChannels) {\n\t\t// decode input data color value\n\t\tint i1 = int(colorChannels.b*255.0);\n\t\tint i2 = int(colorChannels.a*255.0);\n\n        int r = 0;\n        int g = 0;\n        int b = 0;\n        \n        if (i1 >= 128) {\n            i1 -= 128;\n            r += 16;\n        }\n        if (i1 >= 64) {\n            i1 -= 64;\n            r += 8;\n        }\n        if (i1 >= 32) {\n            i1 -= 32;\n            r += 4;\n        }\n        if (i1 >= 16) {\n            i1 -= 16;\n            r += 2;\n        }\n        if (i1 >= 8) {\n            i1 -= 8;\n            r += 1;\n        }      \n        // read bits 3 to 1\n        if (i1 >= 4) {\n            i1 -= 4;\n            g += 32;\n        }\n        if (i1 >= 2) {\n            i1 -= 2;\n            g += 16;\n        }\n        if (i1 >= 1) {\n            g += 8;\n        }  \n        if (i2 >= 128) {\n            i2 -= 128;\n            g += 4;\n        }\n        if (i2 >= 64) {\n            i2 -= 64;\n            g += 2;\n        }\n        if (i2 >= 32) {\n            i2 -= 32;\n            g += 1;\n        }\n        b = i2;\n        return vec4(float(r*8)/255.0,float(g*4)/255.0,float(b*8)/255.0,1.0);\n}\n\n\n\n// vertex coordinates for computed mesh\nattribute vec2 a_position;\n\n// open layers tile structure\nuniform vec4 u_tileOffset;\n\n// current scale factor for plan oblique rendering\nuniform vec2 u_scaleFactor;\n\nvoid main(void) { \n\n\t// Orientation of coordinate system in vertex shader:\n\t// y\n\t// ^ \n\t// |\n\t// |\n\t// ------>\tx\n\n    // pass current vertex coordinates to fragment shader\n    v_texCoord = a_position;\n    \n    // compute y-flipped texture coordinates for further processing in fragment-shader\n    v_texCoord.y = 1.0 - v_texCoord.y;\n\n    // read and decode elevation for current vertex\n    float absElevation = decodeElevation(texture2D(u_texture, v_texCoord.xy));\n    \n    // shift vertex positions by given scale factor (dependend of the plan oblique inclination)\n    // direction of shift is always the top of the screen so it has to be adapted when the map view is rotated\n    // z value has to be inverted to get a left handed coordinate system and to make the depth test work\n    vec4 vertexPosition = vec4((a_position+(absElevation * u_scaleFactor.xy) / u_tileSizeM) * u_tileOffset.xy + u_tileOffset.zw, 1.0-abs(absElevation/u_tileSizeM), 1.0);\n\n\tgl_Position = vertexPosition;\n}\n\n';
+ol.renderer.webgl.tilelayer.shader.Vertex.VARIANTS = [0, 0, 0, 0, 0, 0, 0, 0];
 
 
 /**
  * @const
- * @type {string}
+ * @type {Array.<string>}
  */
-ol.renderer.webgl.tilelayer.shader.Vertex.OPTIMIZED_SOURCE = 'uniform sampler2D a;uniform float b;varying vec2 c;float decodeElevation(in vec4 colorChannels){float elevationM=((colorChannels.r*255.0+(colorChannels.g*255.0)*256.0)-11000.0)/10.0;return elevationM;}vec4 decodeTextureColor(in vec4 colorChannels){int i1=int(colorChannels.b*255.0);int i2=int(colorChannels.a*255.0);int r=0;int g=0;int b=0;if(i1>=128){i1-=128;r+=16;}if(i1>=64){i1-=64;r+=8;}if(i1>=32){i1-=32;r+=4;}if(i1>=16){i1-=16;r+=2;}if(i1>=8){i1-=8;r+=1;}if(i1>=4){i1-=4;g+=32;}if(i1>=2){i1-=2;g+=16;}if(i1>=1){g+=8;}if(i2>=128){i2-=128;g+=4;}if(i2>=64){i2-=64;g+=2;}if(i2>=32){i2-=32;g+=1;}b=i2;return vec4(float(r*8)/255.0,float(g*4)/255.0,float(b*8)/255.0,1.0);}attribute vec2 d;uniform vec4 e;uniform vec2 f;void main(void){c=d;c.y=1.0-c.y;float absElevation=decodeElevation(texture2D(a,c.xy));vec4 vertexPosition=vec4((d+(absElevation*f.xy)/b)*e.xy+e.zw,1.0-abs(absElevation/b),1.0);gl_Position=vertexPosition;}';
+ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_DEFINES = [
+    ''
+];
 
 
 /**
  * @const
  * @type {string}
  */
-ol.renderer.webgl.tilelayer.shader.Vertex.SOURCE = goog.DEBUG ?
-    ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_SOURCE :
-    ol.renderer.webgl.tilelayer.shader.Vertex.OPTIMIZED_SOURCE;
+ol.renderer.webgl.tilelayer.shader.Vertex.DEBUG_SOURCE = '\n// texture with encoded elevation values\nuniform sampler2D u_texture;\n\n// length of one tile in meter at equator\nuniform float u_tileSizeM;\n\n// temporary values for transfer to fragment shader\nvarying vec2 v_texCoord;\n\n// Decoders of the DEM tiles.  The R and G channels of a tile hold the\n// elevation in decimetres above -1100 m, and the B and A channels a colour\n// packed as RGB 565.  Both decoders run for every fragment, so they use only\n// arithmetic and no branches.\n\n// decode the elevation in meters from the R and G channels,\n// (r * 255 + g * 255 * 256 - 11000) / 10\nfloat decodeElevation(in vec4 colorChannels) {\n    return dot(colorChannels.rg, vec2(25.5, 6528.0)) - 1100.0;\n}\n\n// decode the colour packed as RGB 565 in the B and A channels\nvec4 decodeTextureColor(in vec4 colorChannels) {\n    // the bytes of the B and A channels, rounded to whole numbers\n    vec2 bytes = floor(colorChannels.ba * 255.0 + 0.5);\n    // red is in the upper 5 bits of B, green in the lower 3 bits of B and\n    // the upper 3 bits of A, and blue in the lower 5 bits of A\n    vec2 high = floor(bytes / vec2(8.0, 32.0));\n    vec2 low = bytes - high * vec2(8.0, 32.0);\n    vec3 color = vec3(high.x, low.x * 8.0 + high.y, low.y);\n    return vec4(color * vec3(8.0, 4.0, 8.0) / 255.0, 1.0);\n}\n\n\n\n// vertex coordinates for computed mesh\nattribute vec2 a_position;\n\n// open layers tile structure\nuniform vec4 u_tileOffset;\n\n// current scale factor for plan oblique rendering\nuniform vec2 u_scaleFactor;\n\nvoid main(void) { \n\n\t// Orientation of coordinate system in vertex shader:\n\t// y\n\t// ^ \n\t// |\n\t// |\n\t// ------>\tx\n\n    // pass current vertex coordinates to fragment shader\n    v_texCoord = a_position;\n    \n    // compute y-flipped texture coordinates for further processing in fragment-shader\n    v_texCoord.y = 1.0 - v_texCoord.y;\n\n    // read and decode elevation for current vertex\n    float absElevation = decodeElevation(texture2D(u_texture, v_texCoord.xy));\n    \n    // shift vertex positions by given scale factor (dependend of the plan oblique inclination)\n    // direction of shift is always the top of the screen so it has to be adapted when the map view is rotated\n    // z value has to be inverted to get a left handed coordinate system and to make the depth test work\n    vec4 vertexPosition = vec4((a_position+(absElevation * u_scaleFactor.xy) / u_tileSizeM) * u_tileOffset.xy + u_tileOffset.zw, 1.0-abs(absElevation/u_tileSizeM), 1.0);\n\n\tgl_Position = vertexPosition;\n}\n\n';
+
+
+/**
+ * @const
+ * @type {Array.<string>}
+ */
+ol.renderer.webgl.tilelayer.shader.Vertex.OPTIMIZED_SOURCES = [
+    'uniform sampler2D a;uniform float b;varying vec2 c;float l(vec4 m){return dot(m.rg,vec2(25.5,6528.))-1100.;}attribute vec2 d;uniform vec4 e;uniform vec2 f;void main(){c=d;c.y=1.-c.y;float k=l(texture2D(a,c.xy));vec4 n=vec4((d+(k*f.xy)/b)*e.xy+e.zw,1.-abs(k/b),1.);gl_Position=n;}'
+];
 
 
 
@@ -89,7 +186,7 @@ ol.renderer.webgl.tilelayer.shader.Locations = function(gl, program) {
    * @type {WebGLUniformLocation}
    */
   this.u_ambient_light = gl.getUniformLocation(
-      program, goog.DEBUG ? 'u_ambient_light' : 'l');
+      program, goog.DEBUG ? 'u_ambient_light' : 'j');
 
   /**
    * @type {WebGLUniformLocation}
@@ -103,17 +200,11 @@ ol.renderer.webgl.tilelayer.shader.Locations = function(gl, program) {
   this.u_colorScale = gl.getUniformLocation(
       program, goog.DEBUG ? 'u_colorScale' : 'h');
 
-  /**
-   * @type {WebGLUniformLocation}
-   */
-  this.u_hillShading = gl.getUniformLocation(
-      program, goog.DEBUG ? 'u_hillShading' : 'j');
-
   /**
    * @type {WebGLUniformLocation}
    */
   this.u_light = gl.getUniformLocation(
-      program, goog.DEBUG ? 'u_light' : 'k');
+      program, goog.DEBUG ? 'u_light' : 'i');
 
   /**
    * @type {WebGLUniformLocation}
@@ -121,12 +212,6 @@ ol.renderer.webgl.tilelayer.shader.Locations = function(gl, program) {
   this.u_scaleFactor = gl.getUniformLocation(
       program, goog.DEBUG ? 'u_scaleFactor' : 'f');
 
-  /**
-   * @type {WebGLUniformLocation}
-   */
-  this.u_testing = gl.getUniformLocation(
-      program, goog.DEBUG ? 'u_testing' : 'm');
-
   /**
    * @type {WebGLUniformLocation}
    */
@@ -145,12 +230,6 @@ ol.renderer.webgl.tilelayer.shader.Locations = function(gl, program) {
   this.u_tileSizeM = gl.getUniformLocation(
       program, goog.DEBUG ? 'u_tileSizeM' : 'b');
 
-  /**
-   * @type {WebGLUniformLocation}
-   */
-  this.u_waterBodies = gl.getUniformLocation(
-      program, goog.DEBUG ? 'u_waterBodies' : 'i');
-
   /**
    * @type {number}
    */
@@ -1,6 +1,5 @@
 goog.provide('ol.source.ImageStatic');
 
-goog.require('goog.events');
 goog.require('ol.Image');
 goog.require('ol.extent');
 goog.require('ol.proj');
@@ -1,6 +1,5 @@
 goog.provide('ol.tilegrid.Zoomify');
 
-goog.require('goog.math');
 goog.require('ol.TileCoord');
 goog.require('ol.proj');
 goog.require('ol.tilecoord');
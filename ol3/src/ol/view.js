@@ -1,7 +1,6 @@
 goog.provide('ol.View');
 goog.provide('ol.ViewHint');
 
-goog.require('goog.array');
 goog.require('goog.asserts');
 goog.require('ol');
 goog.require('ol.CenterConstraint');
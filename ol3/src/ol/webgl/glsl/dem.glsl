@@ -0,0 +1,22 @@
+// Decoders of the DEM tiles.  The R and G channels of a tile hold the
+// elevation in decimetres above -1100 m, and the B and A channels a colour
+// packed as RGB 565.  Both decoders run for every fragment, so they use only
+// arithmetic and no branches.
+
+// decode the elevation in meters from the R and G channels,
+// (r * 255 + g * 255 * 256 - 11000) / 10
+float decodeElevation(in vec4 colorChannels) {
+    return dot(colorChannels.rg, vec2(25.5, 6528.0)) - 1100.0;
+}
+
+// decode the colour packed as RGB 565 in the B and A channels
+vec4 decodeTextureColor(in vec4 colorChannels) {
+    // the bytes of the B and A channels, rounded to whole numbers
+    vec2 bytes = floor(colorChannels.ba * 255.0 + 0.5);
+    // red is in the upper 5 bits of B, green in the lower 3 bits of B and
+    // the upper 3 bits of A, and blue in the lower 5 bits of A
+    vec2 high = floor(bytes / vec2(8.0, 32.0));
+    vec2 low = bytes - high * vec2(8.0, 32.0);
+    vec3 color = vec3(high.x, low.x * 8.0 + high.y, low.y);
+    return vec4(color * vec3(8.0, 4.0, 8.0) / 255.0, 1.0);
+}
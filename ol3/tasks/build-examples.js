@@ -0,0 +1,221 @@
+/**
+ * This task compiles many examples together with the library in a single
+ * Closure Compiler run.  The library is compiled once into a shared module
+ * and each example into a module of its own that depends on it, so the cost
+ * of compiling the library is not paid once per example.
+ */
+var path = require('path');
+
+var async = require('async');
+var closure = require('closure-util');
+var fse = require('fs-extra');
+var fs = require('graceful-fs');
+var nomnom = require('nomnom');
+var exec = require('child_process').exec;
+
+var log = closure.log;
+var root = path.join(__dirname, '..');
+
+
+/**
+ * Read the batch configuration file.  Like the configuration files of
+ * build.js it has "src" and "compile" properties, and in addition an
+ * "examples" array of objects with the "id" and the "path" of each example.
+ * @param {string} configPath Path to config file.
+ * @param {function(Error, Object)} callback Callback.
+ */
+function readConfig(configPath, callback) {
+  fs.readFile(configPath, function(err, data) {
+    if (err) {
+      callback(err);
+      return;
+    }
+    var config;
+    try {
+      config = JSON.parse(String(data));
+    } catch (err2) {
+      callback(new Error('Trouble parsing config as JSON: ' + err2.message));
+      return;
+    }
+    if (!Array.isArray(config.examples) || !config.compile) {
+      callback(new Error('Config must have "examples" and "compile"'));
+      return;
+    }
+    callback(null, config);
+  });
+}
+
+
+/**
+ * Compile the library and the examples as modules.  The first module, "ol",
+ * contains the "js" files of the config and the library sources sorted in
+ * dependency order.  Every example is a module of its own that depends on
+ * "ol".  The compiler writes each module to a file in outputDir.
+ * @param {Object} config Batch configuration object.
+ * @param {string} outputDir Directory for the module files.
+ * @param {function(Error)} callback Called when the compiler is done.
+ */
+function compile(config, outputDir, callback) {
+  log.info('ol', 'Parsing dependencies');
+  closure.getDependencies({lib: config.src, cwd: root}, function(err, paths) {
+    if (err) {
+      callback(err);
+      return;
+    }
+    var options = {
+      compile: {},
+      cwd: root,
+      jvm: config.jvm
+    };
+    Object.keys(config.compile).forEach(function(key) {
+      options.compile[key] = config.compile[key];
+    });
+    // The module files are wrapped together when the examples are written,
+    // and the dependencies are already sorted.
+    delete options.compile.output_wrapper;
+    delete options.compile.manage_closure_dependencies;
+    var library = (config.compile.js || []).concat(paths);
+    options.compile.js = library.concat(config.examples.map(
+        function(example) {
+          return example.path;
+        }));
+    options.compile.module = ['ol:' + library.length].concat(
+        config.examples.map(function(example, i) {
+          return 'example' + i + ':1:ol';
+        }));
+    options.compile.module_output_path_prefix = outputDir + '/';
+    log.info('ol', 'Compiling ' + library.length + ' sources and ' +
+        config.examples.length + ' examples');
+    fse.mkdirs(outputDir, function(err) {
+      if (err) {
+        callback(err);
+        return;
+      }
+      closure.compile(options, function(err) {
+        callback(err);
+      });
+    });
+  });
+}
+
+
+/**
+ * Get the file header with the most recent Git tag.
+ * @param {function(Error, string)} callback Called with the header.
+ */
+function getHeader(callback) {
+  exec('git describe --tags', function(error, stdout, stderr) {
+    var header = '// OpenLayers 3. See http://openlayers.org/\n';
+    header += '// License: https://raw.githubusercontent.com/openlayers/' +
+        'ol3/master/LICENSE.md\n';
+    if (stdout !== '') {
+      header += '// Version: ' + stdout + '\n';
+    }
+    callback(null, header);
+  });
+}
+
+
+/**
+ * Write <id>.combined.js for every example to outputDir.  Each file contains
+ * the library module followed by the example's module, wrapped in the
+ * output wrapper of the config.  Files whose contents have not changed are
+ * not written again.
+ * @param {Object} config Batch configuration object.
+ * @param {string} outputDir Directory of the module files.
+ * @param {string} header File header.
+ * @param {function(Error)} callback Called when all files are written.
+ */
+function writeExamples(config, outputDir, header, callback) {
+  var wrapper = (config.compile.output_wrapper || '%output%').split('%output%');
+  fs.readFile(path.join(outputDir, 'ol.js'), function(err, library) {
+    if (err) {
+      callback(err);
+      return;
+    }
+    async.eachLimit(config.examples, 8, function(example, callback) {
+      var i = config.examples.indexOf(example);
+      var modulePath = path.join(outputDir, 'example' + i + '.js');
+      fs.readFile(modulePath, function(err, code) {
+        if (err) {
+          callback(err);
+          return;
+        }
+        var combined = header + wrapper[0] + library + code + wrapper[1];
+        var combinedPath = path.join(outputDir, example.id + '.combined.js');
+        fs.readFile(combinedPath, function(err, old) {
+          if (!err && String(old) === combined) {
+            callback(null);
+            return;
+          }
+          fse.outputFile(combinedPath, combined, callback);
+        });
+      });
+    }, callback);
+  });
+}
+
+
+/**
+ * Compile all examples of the batch configuration and write their
+ * <id>.combined.js files.
+ * @param {Object} config Batch configuration object.
+ * @param {string} outputDir Output directory.
+ * @param {function(Error)} callback Called when done.
+ */
+function main(config, outputDir, callback) {
+  async.waterfall([
+    compile.bind(null, config, outputDir),
+    getHeader,
+    writeExamples.bind(null, config, outputDir)
+  ], callback);
+}
+
+
+/**
+ * If running this module directly, read the config file and call the main
+ * function.
+ */
+if (require.main === module) {
+  var options = nomnom.options({
+    config: {
+      position: 0,
+      required: true,
+      help: 'Path to JSON batch config file'
+    },
+    output: {
+      position: 1,
+      required: true,
+      help: 'Output directory'
+    },
+    loglevel: {
+      abbr: 'l',
+      choices: ['silly', 'verbose', 'info', 'warn', 'error'],
+      default: 'info',
+      help: 'Log level',
+      metavar: 'LEVEL'
+    }
+  }).parse();
+
+  log.level = options.loglevel;
+
+  async.waterfall([
+    readConfig.bind(null, options.config),
+    function(config, callback) {
+      main(config, options.output, callback);
+    }
+  ], function(err) {
+    if (err) {
+      log.error(err.message);
+      process.exit(1);
+    } else {
+      process.exit(0);
+    }
+  });
+}
+
+
+/**
+ * Export main function.
+ */
+module.exports = main;
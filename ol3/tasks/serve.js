@@ -4,6 +4,7 @@
  * repository.
  */
 
+var http = require('http');
 var path = require('path');
 var url = require('url');
 
@@ -57,6 +58,60 @@ var createServer = exports.createServer = function(callback) {
 };
 
 
+/**
+ * Create a live reload server.  Pages that include the script served at
+ * /livereload.js subscribe to the /livereload event stream and are reloaded
+ * whenever something POSTs to /livereload, which `./build.py --watch` does
+ * after each successful rebuild.
+ * @param {number} port Port the server will listen on.
+ * @return {http.Server} The server.
+ */
+var createLiveReloadServer = exports.createLiveReloadServer = function(port) {
+  var clients = [];
+  var client = '(function() {\n' +
+      '  var source = new EventSource(\'//\' + window.location.hostname +\n' +
+      '      \':' + port + '/livereload\');\n' +
+      '  source.onmessage = function() {\n' +
+      '    window.location.reload();\n' +
+      '  };\n' +
+      '})();\n';
+  return http.createServer(function(req, res) {
+    var pathname = url.parse(req.url).pathname;
+    if (pathname === '/livereload.js') {
+      res.writeHead(200, {'Content-Type': 'application/javascript'});
+      res.end(client);
+    } else if (pathname === '/livereload' && req.method === 'GET') {
+      res.writeHead(200, {
+        'Access-Control-Allow-Origin': '*',
+        'Cache-Control': 'no-cache',
+        'Content-Type': 'text/event-stream'
+      });
+      res.write('\n');
+      clients.push(res);
+      req.on('close', function() {
+        clients.splice(clients.indexOf(res), 1);
+      });
+    } else if (pathname === '/livereload' && req.method === 'POST') {
+      var body = '';
+      req.on('data', function(chunk) {
+        body += chunk;
+      });
+      req.on('end', function() {
+        log.info('serve', 'Reloading ' + clients.length + ' page(s)');
+        clients.forEach(function(client) {
+          client.write('data: ' + (body.replace(/\n/g, ' ') || '{}') + '\n\n');
+        });
+        res.writeHead(204);
+        res.end();
+      });
+    } else {
+      res.writeHead(404);
+      res.end();
+    }
+  });
+};
+
+
 /**
  * If running this module directly start the server.
  */
@@ -68,6 +123,11 @@ if (require.main === module) {
       help: 'Port for incoming connections',
       metavar: 'PORT'
     },
+    livereload: {
+      default: 35729,
+      help: 'Port for live reload notifications, 0 to disable',
+      metavar: 'PORT'
+    },
     loglevel: {
       abbr: 'l',
       choices: ['silly', 'verbose', 'info', 'warn', 'error'],
@@ -95,6 +155,13 @@ if (require.main === module) {
       log.error('serve', 'Server failed to start: ' + err.message);
       process.exit(1);
     });
+    if (options.livereload) {
+      var port = Number(options.livereload);
+      createLiveReloadServer(port).listen(port, function() {
+        log.info('serve', 'Live reload on http://localhost:' + port +
+            '/livereload.js');
+      });
+    }
 
   });
 }
@@ -449,7 +449,6 @@ describe('ol.feature.createFeatureStyleFunction()', function() {
 });
 
 
-goog.require('goog.events');
 goog.require('goog.object');
 goog.require('ol.Feature');
 goog.require('ol.feature');
@@ -170,5 +170,4 @@ describe('ol.geom.Point', function() {
 });
 
 
-goog.require('ol.extent');
 goog.require('ol.geom.Point');
@@ -1,6 +1,5 @@
 goog.provide('ol.test.layer.Vector');
 
-goog.require('ol.feature');
 
 describe('ol.layer.Vector', function() {
 
@@ -151,7 +151,6 @@ describe('ol.render.webgl.ImageReplay', function() {
   });
 });
 
-goog.require('ol.extent');
 goog.require('ol.geom.MultiPoint');
 goog.require('ol.geom.Point');
 goog.require('ol.render.webgl.ImageReplay');
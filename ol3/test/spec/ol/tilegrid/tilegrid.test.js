@@ -698,7 +698,6 @@ describe('ol.tilegrid.TileGrid', function() {
 
 });
 
-goog.require('ol.Coordinate');
 goog.require('ol.extent');
 goog.require('ol.extent.Corner');
 goog.require('ol.proj');
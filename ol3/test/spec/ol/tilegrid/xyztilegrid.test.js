@@ -162,7 +162,6 @@ describe('ol.tilegrid.XYZ', function() {
 });
 
 
-goog.require('ol.TileCoord');
 goog.require('ol.TileRange');
 goog.require('ol.tilegrid.TileGrid');
 goog.require('ol.tilegrid.XYZ');
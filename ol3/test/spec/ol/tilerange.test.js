@@ -129,5 +129,4 @@ describe('ol.TileRange', function() {
 
 });
 
-goog.require('ol.TileCoord');
 goog.require('ol.TileRange');
@@ -94,5 +94,4 @@ describe('ol.TileUrlFunction', function() {
 
 });
 
-goog.require('ol.TileCoord');
 goog.require('ol.TileUrlFunction');